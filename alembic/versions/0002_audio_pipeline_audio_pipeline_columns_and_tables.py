@@ -0,0 +1,109 @@
+"""audio pipeline columns and tables
+
+Song columns for content-addressed storage, tiered analysis, similarity
+embeddings, loudness and fingerprints, plus the audio job queue, the analysis
+cache and the fingerprint index.
+
+Databases that ran the new code before this migration already have the new
+tables (init_db creates missing tables, never missing columns), so tables and
+columns that exist are skipped.
+
+Revision ID: 0002_audio_pipeline
+Revises: 0001_baseline
+Create Date: 2026-10-18 02:36:09.407097
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_audio_pipeline'
+down_revision: Union[str, Sequence[str], None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    song_columns = {column["name"] for column in inspector.get_columns("song")}
+
+    if 'analysiscacheentry' not in tables:
+        op.create_table('analysiscacheentry',
+        sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('analyzer_version', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('tier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('features', sa.JSON(), nullable=True),
+        sa.Column('embedding', sa.LargeBinary(), nullable=True),
+        sa.Column('fingerprint', sa.LargeBinary(), nullable=True),
+        sa.Column('hits', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('content_hash', 'analyzer_version', 'tier')
+        )
+    if 'audiojob' not in tables:
+        op.create_table('audiojob',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('song_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('run_after', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['song_id'], ['song.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_audiojob_kind'), 'audiojob', ['kind'], unique=False)
+        op.create_index(op.f('ix_audiojob_run_after'), 'audiojob', ['run_after'], unique=False)
+        op.create_index(op.f('ix_audiojob_song_id'), 'audiojob', ['song_id'], unique=False)
+        op.create_index(op.f('ix_audiojob_status'), 'audiojob', ['status'], unique=False)
+    if 'fingerprintentry' not in tables:
+        op.create_table('fingerprintentry',
+        sa.Column('hash', sa.Integer(), nullable=False),
+        sa.Column('song_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['song_id'], ['song.id'], ),
+        sa.PrimaryKeyConstraint('hash', 'song_id')
+        )
+        op.create_index(op.f('ix_fingerprintentry_song_id'), 'fingerprintentry', ['song_id'], unique=False)
+    for column in (
+        sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('analysis_tier', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('embedding', sa.LargeBinary(), nullable=True),
+        sa.Column('loudness_lufs', sa.Float(), nullable=True),
+        sa.Column('true_peak_dbtp', sa.Float(), nullable=True),
+        sa.Column('replay_gain_db', sa.Float(), nullable=True),
+        sa.Column('fingerprint', sa.LargeBinary(), nullable=True),
+    ):
+        if column.name not in song_columns:
+            op.add_column('song', column)
+    if 'ix_song_content_hash' not in {index["name"] for index in inspector.get_indexes("song")}:
+        op.create_index(op.f('ix_song_content_hash'), 'song', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_song_content_hash'), table_name='song')
+    op.drop_column('song', 'fingerprint')
+    op.drop_column('song', 'replay_gain_db')
+    op.drop_column('song', 'true_peak_dbtp')
+    op.drop_column('song', 'loudness_lufs')
+    op.drop_column('song', 'embedding')
+    op.drop_column('song', 'analysis_tier')
+    op.drop_column('song', 'content_hash')
+    op.drop_index(op.f('ix_fingerprintentry_song_id'), table_name='fingerprintentry')
+    op.drop_table('fingerprintentry')
+    op.drop_index(op.f('ix_audiojob_status'), table_name='audiojob')
+    op.drop_index(op.f('ix_audiojob_song_id'), table_name='audiojob')
+    op.drop_index(op.f('ix_audiojob_run_after'), table_name='audiojob')
+    op.drop_index(op.f('ix_audiojob_kind'), table_name='audiojob')
+    op.drop_table('audiojob')
+    op.drop_table('analysiscacheentry')
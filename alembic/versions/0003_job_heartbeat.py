@@ -0,0 +1,35 @@
+"""audio job heartbeat
+
+The worker refreshes audiojob.heartbeat_at while a job runs, so only jobs whose
+heartbeat stopped are requeued. Skipped when init_db already created the column
+with a new audiojob table.
+
+Revision ID: 0003_job_heartbeat
+Revises: 0002_audio_pipeline
+Create Date: 2026-10-18 02:52:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_job_heartbeat'
+down_revision: Union[str, Sequence[str], None] = '0002_audio_pipeline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("audiojob")}
+    if 'heartbeat_at' not in columns:
+        op.add_column('audiojob', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('audiojob', 'heartbeat_at')
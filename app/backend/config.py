@@ -101,10 +101,87 @@ class Settings(BaseSettings):
 
     # Application Settings
     debug: bool = Field(default=False, env="DEBUG")
+    debug_metrics_enabled: bool = Field(default=False, env="DEBUG_METRICS_ENABLED") # /debug/metrics, for logged-in users
     environment: str = Field(default="development", env="ENVIRONMENT")
     api_host: str = Field(default="localhost", env="API_HOST")
     api_port: int = Field(default=8002, env="API_PORT")
 
+    # Streaming Settings
+    hot_track_cache_max_bytes: int = Field(default=512 * 1024 * 1024, env="HOT_TRACK_CACHE_MAX_BYTES")
+    hot_track_cache_max_file_bytes: int = Field(default=64 * 1024 * 1024, env="HOT_TRACK_CACHE_MAX_FILE_BYTES")
+    hot_track_cache_admit_after: int = Field(default=2, env="HOT_TRACK_CACHE_ADMIT_AFTER")
+
+    # Upload Settings
+    resumable_upload_max_size: int = Field(default=500 * 1024 * 1024, env="RESUMABLE_UPLOAD_MAX_SIZE")
+    resumable_upload_ttl_seconds: int = Field(default=24 * 3600, env="RESUMABLE_UPLOAD_TTL_SECONDS")
+    artwork_workers: int = Field(default=2, env="ARTWORK_WORKERS")
+
+    # Concurrency & Monitoring Settings
+    blocking_workers: int = Field(default=8, env="BLOCKING_WORKERS")
+    loop_lag_threshold_ms: int = Field(default=100, env="LOOP_LAG_THRESHOLD_MS")
+    loop_lag_interval_ms: int = Field(default=250, env="LOOP_LAG_INTERVAL_MS")
+
+    # Audio Analysis Settings
+    # API processes on one host elect a single worker through a lock file, disable where a standalone worker runs
+    analysis_worker_enabled: bool = Field(default=True, env="ANALYSIS_WORKER_ENABLED")
+    analysis_concurrency: int = Field(default=0, env="ANALYSIS_CONCURRENCY") # 0 = one per spare CPU core
+    analysis_max_attempts: int = Field(default=3, env="ANALYSIS_MAX_ATTEMPTS")
+    analysis_poll_interval_seconds: float = Field(default=2.0, env="ANALYSIS_POLL_INTERVAL_SECONDS")
+    analysis_job_timeout_seconds: int = Field(default=900, env="ANALYSIS_JOB_TIMEOUT_SECONDS")
+    analysis_heartbeat_seconds: float = Field(default=30.0, env="ANALYSIS_HEARTBEAT_SECONDS")
+    analysis_streaming_min_seconds: int = Field(default=900, env="ANALYSIS_STREAMING_MIN_SECONDS") # stream tracks at least this long
+    analysis_stream_block_seconds: float = Field(default=30.0, env="ANALYSIS_STREAM_BLOCK_SECONDS")
+    analysis_cache_enabled: bool = Field(default=True, env="ANALYSIS_CACHE_ENABLED")
+
+    # YouTube API Client Settings
+    youtube_api_base_url: str = Field(default="https://www.googleapis.com/youtube/v3", env="YOUTUBE_API_BASE_URL")
+    youtube_http_pool_size: int = Field(default=20, env="YOUTUBE_HTTP_POOL_SIZE")
+    youtube_http_keepalive_seconds: float = Field(default=30.0, env="YOUTUBE_HTTP_KEEPALIVE_SECONDS")
+    youtube_http_dns_ttl_seconds: int = Field(default=300, env="YOUTUBE_HTTP_DNS_TTL_SECONDS")
+    youtube_http_connect_timeout_seconds: float = Field(default=3.0, env="YOUTUBE_HTTP_CONNECT_TIMEOUT_SECONDS")
+    youtube_http_timeout_seconds: float = Field(default=10.0, env="YOUTUBE_HTTP_TIMEOUT_SECONDS") # per call
+    youtube_cache_max_entries: int = Field(default=2000, env="YOUTUBE_CACHE_MAX_ENTRIES") # 0 = no response cache
+    youtube_search_cache_ttl_seconds: int = Field(default=900, env="YOUTUBE_SEARCH_CACHE_TTL_SECONDS")
+    youtube_trending_cache_ttl_seconds: int = Field(default=1800, env="YOUTUBE_TRENDING_CACHE_TTL_SECONDS")
+    youtube_cache_stale_seconds: int = Field(default=3600, env="YOUTUBE_CACHE_STALE_SECONDS") # served while refreshing
+
+    # YouTube Audio URL Settings
+    youtube_audio_url_cache_max_entries: int = Field(default=5000, env="YOUTUBE_AUDIO_URL_CACHE_MAX_ENTRIES")
+    youtube_audio_url_expiry_margin_seconds: int = Field(default=600, env="YOUTUBE_AUDIO_URL_EXPIRY_MARGIN_SECONDS") # not handed out this close to expiry
+    youtube_audio_url_default_ttl_seconds: int = Field(default=3600, env="YOUTUBE_AUDIO_URL_DEFAULT_TTL_SECONDS") # URLs without an expire parameter
+    youtube_audio_url_min_refresh_seconds: int = Field(default=60, env="YOUTUBE_AUDIO_URL_MIN_REFRESH_SECONDS") # between forced re-resolves
+    youtube_audio_url_refresh_interval_seconds: int = Field(default=900, env="YOUTUBE_AUDIO_URL_REFRESH_INTERVAL_SECONDS") # 0 = no background refresh
+    youtube_audio_url_refresh_batch: int = Field(default=50, env="YOUTUBE_AUDIO_URL_REFRESH_BATCH") # per sweep
+    youtube_extract_workers: int = Field(default=3, env="YOUTUBE_EXTRACT_WORKERS") # yt_dlp processes
+    youtube_extract_queue_size: int = Field(default=12, env="YOUTUBE_EXTRACT_QUEUE_SIZE") # waiting beyond this gets a 503
+    youtube_extract_socket_timeout_seconds: int = Field(default=15, env="YOUTUBE_EXTRACT_SOCKET_TIMEOUT_SECONDS")
+
+    # YouTube Relay Settings
+    youtube_relay_enabled: bool = Field(default=False, env="YOUTUBE_RELAY_ENABLED")
+    youtube_relay_cache_max_bytes: int = Field(default=2 * 1024 * 1024 * 1024, env="YOUTUBE_RELAY_CACHE_MAX_BYTES")
+    youtube_relay_block_bytes: int = Field(default=1024 * 1024, env="YOUTUBE_RELAY_BLOCK_BYTES")
+    youtube_relay_fetch_blocks: int = Field(default=8, env="YOUTUBE_RELAY_FETCH_BLOCKS") # per upstream request
+    youtube_relay_read_timeout_seconds: float = Field(default=15.0, env="YOUTUBE_RELAY_READ_TIMEOUT_SECONDS")
+
+    # Transcoding Settings
+    transcode_enabled: bool = Field(default=True, env="TRANSCODE_ENABLED")
+    ffmpeg_path: str = Field(default="ffmpeg", env="FFMPEG_PATH")
+    hls_segment_seconds: int = Field(default=6, env="HLS_SEGMENT_SECONDS") # 0 = no segmented delivery
+
+    # Loudness Normalization Settings
+    loudness_target_lufs: float = Field(default=-18.0, env="LOUDNESS_TARGET_LUFS") # ReplayGain 2.0 reference level
+    loudness_peak_ceiling_dbtp: float = Field(default=-1.0, env="LOUDNESS_PEAK_CEILING_DBTP")
+    youtube_assumed_lufs: float = Field(default=-14.0, env="YOUTUBE_ASSUMED_LUFS") # YouTube streams aren't measured
+
+    # Similarity Search Settings
+    similarity_index_ttl_seconds: int = Field(default=300, env="SIMILARITY_INDEX_TTL_SECONDS")
+    similarity_ann_min_songs: int = Field(default=500_000, env="SIMILARITY_ANN_MIN_SONGS") # approximate index from this size
+    similarity_ann_probes: int = Field(default=8, env="SIMILARITY_ANN_PROBES")
+
+    # Duplicate Detection Settings
+    fingerprint_max_bit_error_rate: float = Field(default=0.3, env="FINGERPRINT_MAX_BIT_ERROR_RATE") # unrelated audio scores ~0.5
+    fingerprint_min_hits: int = Field(default=16, env="FINGERPRINT_MIN_HITS") # shared index hashes before verifying
+
     # Security Settings
     bcrypt_rounds: int = Field(default=12, env="BCRYPT_ROUNDS")
     min_password_length: int = Field(default=8, env="MIN_PASSWORD_LENGTH")
@@ -1,6 +1,8 @@
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
 from pydantic import EmailStr
+from sqlalchemy import Column, JSON
 from sqlmodel import Field, SQLModel, Relationship
 
 
@@ -31,6 +33,7 @@ class Song(SongBase, table=True):
     artwork_path: Optional[str] = Field(default=None)
     uploaded_by: Optional[int] = Field(default=None, foreign_key="user.id")
     file_path: Optional[str] = Field(default=None)
+    content_hash: Optional[str] = Field(default=None, index=True) # sha256 of the audio bytes
 
     # YouTube integration fields
     youtube_id: Optional[str] = Field(default=None, index=True)
@@ -49,6 +52,12 @@ class Song(SongBase, table=True):
     energy: Optional[float] = Field(default=None)
     danceability: Optional[float] = Field(default=None)
     duration: Optional[float] = Field(default=None)
+    analysis_tier: Optional[str] = Field(default=None) # 'excerpt', 'full'
+    embedding: Optional[bytes] = Field(default=None) # packed float32 similarity vector
+    loudness_lufs: Optional[float] = Field(default=None) # integrated loudness, ITU-R BS.1770
+    true_peak_dbtp: Optional[float] = Field(default=None)
+    replay_gain_db: Optional[float] = Field(default=None) # playback gain to the loudness target
+    fingerprint: Optional[bytes] = Field(default=None) # packed uint16 chroma codes, see services/fingerprints.py
 
     playlists: List["Playlist"] = Relationship(back_populates="songs", link_model=PlaylistSongLink)
     liked_by: List["User"] = Relationship(back_populates="liked_songs", link_model=LikedSongLink)
@@ -75,4 +84,39 @@ class User(UserBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     playlists: List["Playlist"] = Relationship(back_populates="user")
     liked_songs: List["Song"] = Relationship(back_populates="liked_by", link_model=LikedSongLink)
-    uploaded_songs: List["Song"] = Relationship(back_populates="uploader")
\ No newline at end of file
+    uploaded_songs: List["Song"] = Relationship(back_populates="uploader")
+
+# Background job models
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class AudioJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    song_id: int = Field(foreign_key="song.id", index=True)
+    kind: str = Field(default="analysis", index=True) # 'analysis', 'excerpt'
+    status: str = Field(default="queued", index=True) # 'queued', 'running', 'done', 'failed'
+    priority: int = Field(default=0)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    last_error: Optional[str] = Field(default=None)
+    run_after: datetime = Field(default_factory=utcnow, index=True)
+    created_at: datetime = Field(default_factory=utcnow)
+    started_at: Optional[datetime] = Field(default=None)
+    heartbeat_at: Optional[datetime] = Field(default=None) # refreshed by the worker while the job runs
+    finished_at: Optional[datetime] = Field(default=None)
+
+# Analysis cache models
+class AnalysisCacheEntry(SQLModel, table=True):
+    content_hash: str = Field(primary_key=True) # sha256 of the audio bytes
+    analyzer_version: str = Field(primary_key=True)
+    tier: str = Field(primary_key=True) # 'excerpt', 'full'
+    features: Dict = Field(default_factory=dict, sa_column=Column(JSON))
+    embedding: Optional[bytes] = Field(default=None)
+    fingerprint: Optional[bytes] = Field(default=None)
+    hits: int = Field(default=0)
+    created_at: datetime = Field(default_factory=utcnow)
+
+# Fingerprint index models
+class FingerprintEntry(SQLModel, table=True):
+    hash: int = Field(primary_key=True) # two consecutive fingerprint codes
+    song_id: int = Field(foreign_key="song.id", primary_key=True, index=True)
@@ -4,7 +4,7 @@ from fastapi import Depends, APIRouter, HTTPException, status
 from pydantic import BaseModel
 from sqlmodel import Session
 
-from app.backend.services.youtube_audio import youtube_audio_service
+from app.backend.services.youtube_audio import youtube_audio_service, ExtractionBusy
 from app.backend.services.dependencies import get_current_user
 from app.backend.services.youtube_service import youtube_service
 from app.backend.services.youtube_song_service import youtube_song_service
@@ -46,7 +46,11 @@ async def add_youtube_song_to_playlist(
         # Get audio url first
         audio_url = request.youtube_track.youtube_audio_url
         if not audio_url:
-            audio_url = await youtube_service.get_youtube_audio_url(request.youtube_track.youtube_id)
+            try:
+                audio_url = await youtube_audio_service.get_audio_url(request.youtube_track.youtube_id)
+            except ExtractionBusy:
+                # The player resolves it on first play
+                audio_url = None
 
         # Create or get the YouTube song
         youtube_track_dict = request.youtube_track.model_dump()
@@ -86,7 +90,11 @@ async def add_youtube_song_to_liked(
         # Get audio URL first
         audio_url = youtube_track.youtube_audio_url
         if not audio_url:
-            audio_url = await youtube_audio_service.get_audio_url(youtube_track.youtube_id)
+            try:
+                audio_url = await youtube_audio_service.get_audio_url(youtube_track.youtube_id)
+            except ExtractionBusy:
+                # The player resolves it on first play
+                audio_url = None
 
         # Create or get YouTube song
         youtube_track_dict = youtube_track.model_dump()
@@ -143,14 +151,20 @@ async def get_trending_music(
 @router.get("/youtube/audio/{youtube_id}")
 async def get_youtube_audio_url(
         youtube_id: str,
+        refresh: bool = False,
         current_user = Depends(get_current_user)
 ) :
+    """Direct audio stream URL, pass refresh=true when the previous one was refused"""
     try:
-        audio_url = await youtube_audio_service.get_audio_url(youtube_id)
+        audio_url = await youtube_audio_service.get_audio_url(youtube_id, refresh=refresh)
         if audio_url:
             return {"audio_url" : audio_url}
         else:
             raise HTTPException(status_code=404, detail="Audio stream not found")
+    except ExtractionBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get audio from: {str(e)}")
 
@@ -2,101 +2,168 @@ import os
 import re
 import shutil
 import token
-from io import BytesIO
 from pathlib import Path
 
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks, Form, Request
-from fastapi.responses import FileResponse, StreamingResponse
-import aiofiles
-from PIL import Image
-from sqlmodel import select, Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Query, Response
+from sqlmodel import select, Session, case, delete
 
+from app.backend.config import settings
 from app.backend.db import get_db
-from app.backend.models.models import Song, User
+from app.backend.models.models import AudioJob, Song, User
 from app.backend.schemas.song import SongRead
 from app.backend.services.dependencies import get_current_user
 
 from app.backend.services.audio_processing import audio_service, logger
+from app.backend.services.analysis_queue import enqueue_tiered_analysis, enqueue_transcode, TIER_EXCERPT
+from app.backend.services.artwork import artwork_service
+from app.backend.services.audio_store import audio_store
+from app.backend.services.audio_streaming import build_file_response
+from app.backend.services.blocking import run_blocking
+from app.backend.services.deduplication import choose_canonical, duplicate_group, merge_songs
+from app.backend.services.fingerprints import fingerprint_index
+from app.backend.services.hot_track_cache import hot_track_cache
+from app.backend.services.similarity import similarity_index
+from app.backend.services.transcoding import transcoder, QUALITIES, ORIGINAL
+from app.backend.services.upload_storage import save_upload_stream, UploadTooLarge
+from app.backend.services.youtube_audio import ExtractionBusy
+from app.backend.services.youtube_relay import youtube_relay, UpstreamError
+from app.backend.services.waveforms import waveform_store, WAVEFORM_LEVELS, FORMAT_VERSION as WAVEFORM_FORMAT_VERSION
 
 # Upload configuration
 UPLOAD_DIR = Path("uploads/audio")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-IMAGE_DIR = Path("uploads/images")
-IMAGE_DIR.mkdir(parents=True, exist_ok=True)
-
 ALLOWED_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
 MAX_IMAGE_SIZE = 10 * 1024 * 1024 # 10 MB MAY INCREASE THIS!
 
 ALLOWED_EXTENSIONS = {".mp3", ".wav", ".flac", ".m4a", ".ogg", ".mp4", ".aac"}
 MAX_FILE_SIZE = 50 * 1024 * 1024 # 50MB
+# Whole multipart body of /upload: the audio, the artwork and the form fields around them
+MAX_UPLOAD_BODY_SIZE = MAX_FILE_SIZE + MAX_IMAGE_SIZE + 1024 * 1024
+
+# Stored files never change under the same name, so browsers and edge caches may keep them
+AUDIO_CACHE_CONTROL = "public, max-age=86400"
+ARTWORK_CACHE_CONTROL = "public, max-age=604800"
+WAVEFORM_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Segments and VOD playlists never change once cut; the multivariant playlist gains variants as they are made
+HLS_SEGMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+HLS_MASTER_CACHE_CONTROL = "public, max-age=60"
+HLS_MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".mp4": "audio/mp4", ".m4s": "audio/mp4"}
+
+# Accepted values of /stream's quality parameter
+STREAM_QUALITY_PATTERN = f"^({'|'.join([*QUALITIES, ORIGINAL])})$"
+
+# Extra candidates fetched for /similar to make up for filtered duplicates
+SIMILAR_SLACK = 5
+
+# Song fields filled in by audio analysis
+ANALYSIS_FIELDS = (
+    "tempo", "musical_key", "genre", "mood", "energy", "danceability", "analysis_tier", "embedding",
+    "loudness_lufs", "true_peak_dbtp", "replay_gain_db", "fingerprint",
+)
 
 router = APIRouter(prefix="/api/songs", tags=["Songs"])
 
 
 @router.get("/{song_id}/stream")
-async def stream_audio(song_id: int, request: Request, db: Session = Depends(get_db)):
-    """Stream audio file with support for range requests (seeking)"""
+def stream_audio(
+        song_id: int,
+        request: Request,
+        quality: Optional[str] = Query(None, pattern=STREAM_QUALITY_PATTERN, description="low, medium, high or original"),
+        db: Session = Depends(get_db),
+):
+    """Stream audio file with support for range requests (seeking).
+
+    Without `quality` (or with 'original') this is always the uploaded file. A
+    rendition is only sent when `quality` asks for one, its codec picked from
+    Accept; 404 until the song's renditions are ready.
+    """
+    # Plain def: the stat/mmap/DB work runs in the threadpool, the body is still sent async
 
     song = db.get(Song, song_id)
     if not song or not song.file_path:
         raise HTTPException(status_code=404, detail="Song/Audio not found")
 
-    file_path = Path(song.file_path)
+    if quality is not None and quality != ORIGINAL:
+        selected = transcoder.select(song.content_hash, quality, request.headers.get("accept", ""))
+        if selected is None:
+            raise HTTPException(status_code=404, detail="Rendition not available yet, stream the original")
+        file_path, rendition = selected
+        media_type = rendition.media_type
+        headers = {"Vary": "Accept", "X-Rendition": rendition.name}
+    else:
+        # The same bytes whatever the client, so a range read never splices two encodings
+        file_path = Path(song.file_path)
+        media_type = get_audio_mime_type(file_path.suffix)
+        headers = {"X-Rendition": ORIGINAL}
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Audio file not found on disk")
 
-    # Get file info
-    file_size = file_path.stat().st_size
-
-    # Handle range requests for audio seeking
-    range_header = request.headers.get("Range")
-    # Parse range header (e.g., "bytes=0-1023)
-    range_match = re.match(r"bytes=(\d+)-(\d*)", range_header)
-    if range_match:
-        start = int(range_match.group(1))
-        end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
-
-        if start > file_size:
-            raise HTTPException(status_code=400, detail="Range out of range")
-
-        end = min(end, file_size - 1)
-        content_length = end - start + 1
-
-        def iter_file():
-            with open(file_path, "rb") as f:
-                f.seek(start)
-                remaining = content_length
-                chunk_size = 8192
-                while remaining:
-                    chunk = f.read(min(chunk_size, remaining))
-                    if not chunk:
-                        break
-                    remaining -= len(chunk)
-                    yield chunk
-        headers ={
-            "Content-Range": f"bytes {start}-{end}/{file_size}",
-            "Accept-Ranges": "bytes",
-            "Content-Length": str(content_length),
-            "Content-Type": get_audio_mime_type(file_path.suffix)
-        }
-
-        return StreamingResponse(iter_file(), status_code=200, headers=headers)
-
-    def iter_file():
-        with open(file_path, "rb") as f:
-            chunk_size = 8192
-            while chunk := f.read(chunk_size):
-                yield chunk
-    headers = {
-        "Accept-Ranges": "bytes",
-        "Content-Length": str(file_size),
-        "Content-Type": get_audio_mime_type(file_path.suffix)
-    }
+    # Validators, conditional GET and range requests for seeking (e.g., "bytes=0-1023")
+    return build_file_response(
+        request.headers,
+        file_path,
+        media_type=media_type,
+        cache_control=AUDIO_CACHE_CONTROL,
+        headers=headers,
+        hot_cache=hot_track_cache,
+    )
 
-    return StreamingResponse(iter_file(), headers=headers)
+@router.get("/{song_id}/hls/master.m3u8")
+def get_hls_master_playlist(song_id: int, db: Session = Depends(get_db)):
+    """Segmented delivery: HLS playlist listing every bitrate, for players that switch quality themselves"""
+    song = db.get(Song, song_id)
+    if not song: raise HTTPException(status_code=404, detail="Song not found")
+
+    playlist = transcoder.master_playlist(song.content_hash) if song.content_hash else None
+    if playlist is None:
+        raise HTTPException(status_code=404, detail="Segments not available yet, use /stream")
+    return Response(
+        content=playlist,
+        media_type=HLS_MEDIA_TYPES[".m3u8"],
+        headers={"Cache-Control": HLS_MASTER_CACHE_CONTROL},
+    )
+
+@router.get("/{song_id}/hls/{rendition}/{file_name}")
+def get_hls_file(song_id: int, rendition: str, file_name: str, request: Request, db: Session = Depends(get_db)):
+    """Media playlist, init segment or audio segment of one HLS rendition"""
+    song = db.get(Song, song_id)
+    if not song: raise HTTPException(status_code=404, detail="Song not found")
+
+    path = transcoder.hls_file(song.content_hash, rendition, file_name) if song.content_hash else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return build_file_response(
+        request.headers,
+        path,
+        media_type=HLS_MEDIA_TYPES[path.suffix],
+        cache_control=HLS_SEGMENT_CACHE_CONTROL,
+        hot_cache=hot_track_cache,
+    )
+
+@router.get("/{song_id}/relay")
+async def relay_youtube_audio(song_id: int, request: Request, db: Session = Depends(get_db)):
+    """YouTube audio proxied through the backend, with range support (YOUTUBE_RELAY_ENABLED).
+
+    A stable URL in place of the expiring googlevideo one. Relayed bytes are
+    cached on disk, so replays of popular tracks are served locally.
+    """
+    if not settings.youtube_relay_enabled:
+        raise HTTPException(status_code=404, detail="Relay is disabled")
+    song = await run_blocking(db.get, Song, song_id)
+    if not song or not song.youtube_id:
+        raise HTTPException(status_code=404, detail="YouTube song not found")
+
+    try:
+        return await youtube_relay.response(song.youtube_id, request.headers)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Audio stream not found")
+    except ExtractionBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except UpstreamError as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
 def get_audio_mime_type(extension: str) -> str:
     """Get appropriate MIME type for audio files"""
@@ -113,7 +180,6 @@ def get_audio_mime_type(extension: str) -> str:
 
 @router.post("/upload", response_model=SongRead)
 async def upload_audio_file(
-        background_tasks: BackgroundTasks,
         file: UploadFile = File(...), # Audio file
         artwork: Optional[UploadFile] = File(None),
         title: Optional[str] = Form(None),
@@ -130,60 +196,145 @@ async def upload_audio_file(
     if file_extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
 
-    # Check file size
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE:
+    # Stream file to disk, checking the size as it arrives, then file it under its content hash
+    temp_path = audio_store.temp_path(file_extension)
+    try:
+        file_size, content_hash = await save_upload_stream(file, temp_path, MAX_FILE_SIZE)
+    except UploadTooLarge:
         raise HTTPException(status_code=400, detail="File too large (max 50mb)")
 
-    # Generate unique filename
-    import uuid
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = UPLOAD_DIR / unique_filename
-
-    # Save file
-    async with aiofiles.open(file_path, "wb") as f:
-        await f.write(contents)
-
-    # Handle artwork upload
+    # Handle artwork upload, before the audio goes into the store so a bad image leaves nothing behind
     artwork_path = None
     if artwork and artwork.filename:
         artwork_extension = Path(artwork.filename).suffix.lower()
         if artwork_extension not in ALLOWED_IMAGE_EXTENSIONS:
-            if file_path.exists():
-                file_path.unlink()
+            await run_blocking(temp_path.unlink, missing_ok=True)
             raise HTTPException(status_code=400, detail=f"Unsupported image type. Allowed {', '.join(ALLOWED_IMAGE_EXTENSIONS)}")
 
         artwork_contents = await artwork.read()
         if len(artwork_contents) > MAX_IMAGE_SIZE:
-            if file_path.exists():
-                file_path.unlink()
+            await run_blocking(temp_path.unlink, missing_ok=True)
             raise HTTPException(status_code=400, detail="Image too large (max 10mb)")
 
-        # Save and resize artwork
-        artwork_filename = f"{uuid.uuid4()}{artwork_extension}"
-        artwork_path = IMAGE_DIR / artwork_filename
-
-        # Resize to standard size (500X500)
+        # Render every size/format variant once, in the artwork worker pool
         try:
-            image = Image.open(BytesIO(artwork_contents))
-            image = image.convert("RGB")
-            image = image.resize((500, 500), Image.Resampling.LANCZOS)
-            image.save(artwork_path, 'JPEG', quality=85)
+            artwork_path = await artwork_service.create_variants(artwork_contents)
         except Exception as e:
+            await run_blocking(temp_path.unlink, missing_ok=True)
             raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
 
+    # Tag parsing (mutagen) and DB writes stay off the event loop
+    song = await run_blocking(
+        create_song_from_upload,
+        db,
+        temp_path=temp_path,
+        extension=file_extension,
+        original_filename=file.filename,
+        content_hash=content_hash,
+        uploaded_by=current_user.id,
+        title=title,
+        artist=artist,
+        album=album,
+        artwork_path=artwork_path,
+    )
+    logger.info(f"Stored upload {song.file_path} ({file_size} bytes)")
+
+    # Queue audio analysis, unless identical audio was already analysed
+    if not await run_blocking(reuse_existing_analysis, db, song):
+        await run_blocking(enqueue_tiered_analysis, db, song)
+    await run_blocking(enqueue_transcode, db, song)
+
+    return song
+
+@router.get("/content/{content_hash}")
+def check_content(content_hash: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Pre-upload check: has the caller already uploaded audio with this sha256?
+
+    Only the caller's own uploads count. Knowing a hash is no proof of having
+    the audio, so anyone else's copy has to be uploaded again (the store still
+    keeps a single file).
+    """
+    content_hash = content_hash.lower()
+    return {
+        "content_hash": content_hash,
+        "exists": _has_uploaded_content(db, current_user, content_hash) and audio_store.find(content_hash) is not None,
+    }
+
+def _has_uploaded_content(db: Session, user: User, content_hash: str) -> bool:
+    stmt = select(Song.id).where(Song.content_hash == content_hash, Song.uploaded_by == user.id).limit(1)
+    return db.exec(stmt).first() is not None
+
+@router.post("/content/{content_hash}", response_model=SongRead, status_code=status.HTTP_201_CREATED)
+def create_song_from_content(
+        content_hash: str,
+        title: Optional[str] = Form(None),
+        artist: Optional[str] = Form(None),
+        album: Optional[str] = Form(None),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db),
+):
+    """Add a song for audio the caller has uploaded before, skipping the upload entirely"""
+    content_hash = content_hash.lower()
+    if not _has_uploaded_content(db, current_user, content_hash):
+        raise HTTPException(status_code=404, detail="Content not found, upload the file instead")
+
+    with audio_store.lock(content_hash):
+        # Looked up again under the lock, a concurrent release may have removed it
+        file_path = audio_store.find(content_hash)
+        if file_path is None:
+            raise HTTPException(status_code=404, detail="Content not found, upload the file instead")
+        song = create_song_from_file(
+            db,
+            file_path=file_path,
+            original_filename=file_path.name,
+            content_hash=content_hash,
+            uploaded_by=current_user.id,
+            title=title,
+            artist=artist,
+            album=album,
+        )
+
+    if not reuse_existing_analysis(db, song):
+        enqueue_tiered_analysis(db, song)
+    enqueue_transcode(db, song)
+
+    return song
+
+def create_song_from_upload(db: Session, temp_path: Path, extension: str, content_hash: str, **song_fields) -> Song:
+    """File a fully written upload in the audio store and create its Song row.
+
+    Both happen under the store's lock for the hash, so a concurrent release
+    can't delete the blob between the store deduplicating against it and the
+    new row referencing it.
+    """
+    with audio_store.lock(content_hash):
+        file_path = audio_store.commit(temp_path, content_hash, extension)
+        return create_song_from_file(db, file_path=file_path, content_hash=content_hash, **song_fields)
+
+def create_song_from_file(
+        db: Session,
+        file_path: Path,
+        original_filename: str,
+        content_hash: Optional[str],
+        uploaded_by: int,
+        title: Optional[str] = None,
+        artist: Optional[str] = None,
+        album: Optional[str] = None,
+        artwork_path: Optional[Path] = None,
+) -> Song:
+    """Create the Song row for a stored audio file, filling gaps from its tags"""
     # Extract metadata from audio file if no manual data provided
     duration = 0
     if not title or not artist or not album:
         try:
             metadata = audio_service.extract_metadata(str(file_path))
-            title = title or metadata.get('title', Path(file.filename).stem)
+            title = title or metadata.get('title', Path(original_filename).stem)
             artist = artist or metadata.get('artist', 'Unknown Artist')
             album = album or metadata.get('album', 'Unknown Album')
             duration = metadata.get('duration', 0)
         except Exception as e:
             logger.warning(f"Could not extract metadata: {e}")
-            title = title or Path(file.filename).stem
+            title = title or Path(original_filename).stem
             artist = artist or 'Unknown Artist'
             album = album or 'Unknown Album'
 
@@ -193,51 +344,45 @@ async def upload_audio_file(
         artist=artist,
         album=album,
         file_path=str(file_path),
-        uploaded_by=current_user.id,
+        uploaded_by=uploaded_by,
         artwork_path=str(artwork_path) if artwork_path else None,
         duration=duration,
+        content_hash=content_hash,
     )
 
     db.add(song)
     db.commit()
     db.refresh(song)
-
-    # Process audio in background
-    background_tasks.add_task(process_audio_analysis, song.id, str(file_path), db)
-
     return song
 
-async def process_audio_analysis(song_id: int, file_path: str, db: Session):
-    """Background task to analyze audio and update database"""
-    try:
-        # Perform audio analysis
-        analysis_result = await audio_service.analyze_audio_async(file_path)
-
-        if analysis_result['success']:
-            features = analysis_result['features']
-
-            # Update song with analysis results
-            song = db.get(Song, song_id)
+def reuse_existing_analysis(db: Session, song: Song) -> bool:
+    """Copy analysis results from an already analysed song with identical audio.
 
-            if song:
-                song.tempo = features.get('tempo')
-                song.musical_key = features.get('musical_key')
-                song.genre = features.get('genre')
-                song.mood = features.get('mood')
-                song.energy = features.get('energy')
-                song.danceability = features.get('danceability')
-                if not song.duration:
-                    song.duration = features.get('duration')
+    Returns True only when the copied results came from a full analysis.
+    """
+    if not song.content_hash:
+        return False
 
-                db.add(song)
-                db.commit()
+    stmt = select(Song).where(
+        Song.content_hash == song.content_hash,
+        Song.id != song.id,
+        Song.tempo != None,
+    ).order_by(case((Song.analysis_tier == TIER_EXCERPT, 1), else_=0))
+    source = db.exec(stmt).first()
+    if not source:
+        return False
 
-                logger.info(f"Analysis result for {song_id}: {str(analysis_result)}")
-            else:
-                logger.error(f"Audio analysis failed for song {song_id}: {str(analysis_result)}")
-    except Exception as e:
-        logger.error(f"Error in background audio processing for song {song_id}: {str(e)}")
+    for field in ANALYSIS_FIELDS:
+        setattr(song, field, getattr(source, field))
+    if not song.duration:
+        song.duration = source.duration
 
+    db.add(song)
+    fingerprint_index.index_song(db, song.id, song.fingerprint)
+    db.commit()
+    db.refresh(song)
+    logger.info(f"Reused analysis of song {source.id} for song {song.id}")
+    return source.analysis_tier != TIER_EXCERPT
 
 @router.get("/{song_id}/analysis", response_model=dict)
 def get_song_analysis(song_id: int, db: Session = Depends(get_db)):
@@ -254,11 +399,80 @@ def get_song_analysis(song_id: int, db: Session = Depends(get_db)):
         "energy": song.energy,
         "danceability": song.danceability,
         "duration": song.duration,
+        "analysis_tier": song.analysis_tier,
+        "loudness_lufs": song.loudness_lufs,
+        "true_peak_dbtp": song.true_peak_dbtp,
+        "replay_gain_db": song.replay_gain_db,
     }
 
 
+@router.get("/{song_id}/similar", response_model=List[SongRead])
+def get_similar_songs(
+        song_id: int,
+        limit: int = Query(10, ge=1, le=100),
+        db: Session = Depends(get_db),
+):
+    """Songs that sound most alike, by cosine similarity of their analysis embeddings"""
+    song = db.get(Song, song_id)
+    if not song: raise HTTPException(status_code=404, detail="Song not found")
+    if song.embedding is None:
+        raise HTTPException(status_code=409, detail="Song has not been analysed yet")
+
+    similarity_index.ensure_fresh()
+    # Over-fetch a little, copies of the same audio are dropped below
+    matches = similarity_index.similar(song, limit + SIMILAR_SLACK)
+
+    found = {s.id: s for s in db.exec(select(Song).where(Song.id.in_([i for i, _ in matches]))).all()}
+    similar = [
+        found[i] for i, _ in matches
+        if i in found and not (song.content_hash and found[i].content_hash == song.content_hash)
+    ]
+    return similar[:limit]
+
+
+@router.get("/{song_id}/duplicates", response_model=List[SongRead])
+def get_duplicate_songs(song_id: int, db: Session = Depends(get_db)):
+    """Other songs holding the same recording, found by audio fingerprint, closest first"""
+    song = db.get(Song, song_id)
+    if not song: raise HTTPException(status_code=404, detail="Song not found")
+    if song.fingerprint is None:
+        raise HTTPException(status_code=409, detail="Song has not been analysed yet")
+
+    return [duplicate for duplicate, _ in fingerprint_index.duplicates(db, song)]
+
+
+@router.post("/{song_id}/duplicates/merge", response_model=dict)
+def merge_duplicate_songs(song_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Merge the caller's copies of a song into one row keeping every playlist entry and like.
+
+    Only the caller's own uploads are merged; other users' copies of the
+    recording are left alone, the same rule the dedupe_songs script follows.
+    """
+    song = db.get(Song, song_id)
+    if not song: raise HTTPException(status_code=404, detail="Song not found")
+    if song.uploaded_by != current_user.id:
+        raise HTTPException(status_code=403, detail="Only songs you uploaded can be merged")
+    if song.fingerprint is None:
+        raise HTTPException(status_code=409, detail="Song has not been analysed yet")
+
+    group = duplicate_group(db, song)
+    keep = choose_canonical(group)
+    duplicates = [s for s in group if s.id != keep.id]
+    merged_ids = [s.id for s in duplicates]
+    if duplicates:
+        for file_path in merge_songs(db, keep, duplicates):
+            audio_store.release(db, file_path)
+
+    return {"song_id": keep.id, "merged": merged_ids}
+
+
 @router.get("/{song_id}/artwork")
-async def get_song_artwork(song_id: int, db: Session = Depends(get_db)):
+def get_song_artwork(
+        song_id: int,
+        request: Request,
+        size: Optional[int] = Query(None, gt=0, le=2048, description="Edge length in px the client will display"),
+        db: Session = Depends(get_db),
+):
     song = db.get(Song, song_id)
     if not song or not song.artwork_path:
         raise HTTPException(status_code=404, detail="Artwork not found")
@@ -266,7 +480,66 @@ async def get_song_artwork(song_id: int, db: Session = Depends(get_db)):
     if not os.path.exists(song.artwork_path):
         raise HTTPException(status_code=404, detail="Artwork file not found")
 
-    return FileResponse(song.artwork_path, media_type='image/jpeg')
+    # Pick the smallest variant that covers the requested size, WebP if accepted
+    variant_path, media_type = artwork_service.select_variant(
+        song.artwork_path, size, request.headers.get("accept", "")
+    )
+
+    return build_file_response(
+        request.headers,
+        variant_path,
+        media_type=media_type,
+        cache_control=ARTWORK_CACHE_CONTROL,
+        headers={"Vary": "Accept"},
+    )
+
+@router.get("/{song_id}/waveform")
+def get_song_waveform(
+        song_id: int,
+        request: Request,
+        points: int = Query(1024, ge=16, le=WAVEFORM_LEVELS[-1], description="Min/max pairs wanted"),
+        db: Session = Depends(get_db),
+):
+    """Precomputed waveform peaks: `points` int8 (min, max) pairs, interleaved.
+
+    Fewer points come back for tracks analysed at a lower resolution, see X-Waveform-Points.
+    """
+    song = db.get(Song, song_id)
+    if not song: raise HTTPException(status_code=404, detail="Song not found")
+
+    result = waveform_store.peaks(song.content_hash, points) if song.content_hash else None
+    if result is None:
+        raise HTTPException(status_code=404, detail="Waveform not available yet")
+    peaks, actual_points = result
+
+    # Peaks are derived from the audio bytes alone, so they never change for a content hash
+    headers = {
+        "Cache-Control": WAVEFORM_CACHE_CONTROL,
+        "ETag": f'"{song.content_hash[:32]}-{WAVEFORM_FORMAT_VERSION}-{actual_points}"',
+        "X-Waveform-Points": str(actual_points),
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=peaks.tobytes(), media_type="application/octet-stream", headers=headers)
+
+@router.delete("/{song_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_song(song_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    song = db.get(Song, song_id)
+    if not song or song.uploaded_by != current_user.id:
+        raise HTTPException(status_code=404, detail="Song not found")
+
+    file_path = song.file_path
+    song.playlists.clear()
+    song.liked_by.clear()
+    # Finished jobs stay in the table, and their song_id would block the delete
+    db.exec(delete(AudioJob).where(AudioJob.song_id == song.id))
+    fingerprint_index.remove_song(db, song.id)
+    db.delete(song)
+    db.commit()
+
+    # Drop the stored audio once no other song shares it
+    audio_store.release(db, file_path)
+    return
 
 @router.get("", response_model=List[SongRead])
 def list_songs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -0,0 +1,136 @@
+import os
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlmodel import Session
+
+from app.backend.config import settings
+from app.backend.db import get_db
+from app.backend.models.models import User
+from app.backend.routes.songs import ALLOWED_EXTENSIONS, create_song_from_upload, reuse_existing_analysis
+from app.backend.schemas.song import SongRead
+from app.backend.schemas.upload import UploadSessionCreate, UploadSessionRead
+from app.backend.services.analysis_queue import enqueue_tiered_analysis, enqueue_transcode
+from app.backend.services.audio_store import audio_store
+from app.backend.services.blocking import run_blocking
+from app.backend.services.dependencies import get_current_user
+from app.backend.services.resumable_upload import resumable_upload_service, UploadSession, UploadSessionError
+
+router = APIRouter(prefix="/api/songs/uploads", tags=["Uploads"])
+
+
+def _session_read(session: UploadSession) -> UploadSessionRead:
+    return UploadSessionRead(
+        upload_id=session.upload_id,
+        filename=session.filename,
+        total_size=session.total_size,
+        chunk_size=session.chunk_size,
+        total_chunks=session.total_chunks,
+        received_offset=resumable_upload_service.received_offset(session),
+        missing_chunks=resumable_upload_service.missing_chunks(session),
+        expires_at=os.path.getmtime(resumable_upload_service.staging_dir / session.upload_id)
+                   + resumable_upload_service.ttl_seconds,
+    )
+
+
+def _get_owned_session(upload_id: str, current_user: User) -> UploadSession:
+    session = resumable_upload_service.get_session(upload_id)
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+@router.post("", response_model=UploadSessionRead, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+        upload_in: UploadSessionCreate,
+        current_user: User = Depends(get_current_user),
+):
+    """Start a resumable upload. Chunks are then PUT by index and the upload finalized"""
+    file_extension = Path(upload_in.filename).suffix.lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
+
+    if upload_in.total_size > settings.resumable_upload_max_size:
+        raise HTTPException(status_code=400, detail=f"File too large (max {settings.resumable_upload_max_size} bytes)")
+
+    try:
+        session = resumable_upload_service.create_session(
+            user_id=current_user.id,
+            filename=upload_in.filename,
+            total_size=upload_in.total_size,
+            chunk_size=upload_in.chunk_size,
+            title=upload_in.title,
+            artist=upload_in.artist,
+            album=upload_in.album,
+        )
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return _session_read(session)
+
+
+@router.get("/{upload_id}", response_model=UploadSessionRead)
+def get_upload_session(upload_id: str, current_user: User = Depends(get_current_user)):
+    """Where to resume from: the contiguous offset received so far and any missing chunks"""
+    return _session_read(_get_owned_session(upload_id, current_user))
+
+
+@router.put("/{upload_id}/chunks/{index}", response_model=UploadSessionRead)
+async def upload_chunk(
+        upload_id: str,
+        index: int,
+        request: Request,
+        current_user: User = Depends(get_current_user),
+):
+    """Upload one chunk as the raw request body"""
+    session = await run_blocking(_get_owned_session, upload_id, current_user)
+    try:
+        await resumable_upload_service.write_chunk(session, index, request.stream())
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await run_blocking(_session_read, session)
+
+
+@router.post("/{upload_id}/complete", response_model=SongRead, status_code=status.HTTP_201_CREATED)
+async def complete_upload(
+        upload_id: str,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db),
+):
+    """Assemble the chunks and hand the file to the normal metadata/analysis flow"""
+    session = await run_blocking(_get_owned_session, upload_id, current_user)
+
+    file_extension = Path(session.filename).suffix.lower()
+    temp_path = audio_store.temp_path(file_extension)
+    try:
+        _, content_hash = await resumable_upload_service.finalize(session, temp_path)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    song = await run_blocking(
+        create_song_from_upload,
+        db,
+        temp_path=temp_path,
+        extension=file_extension,
+        original_filename=session.filename,
+        content_hash=content_hash,
+        uploaded_by=current_user.id,
+        title=session.title,
+        artist=session.artist,
+        album=session.album,
+    )
+
+    # Queue audio analysis, unless identical audio was already analysed
+    if not await run_blocking(reuse_existing_analysis, db, song):
+        await run_blocking(enqueue_tiered_analysis, db, song)
+    await run_blocking(enqueue_transcode, db, song)
+
+    return song
+
+
+@router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+def abort_upload(upload_id: str, current_user: User = Depends(get_current_user)):
+    session = _get_owned_session(upload_id, current_user)
+    resumable_upload_service.discard(session.upload_id)
+    return
@@ -33,6 +33,10 @@ class SongRead(SongBase):
     energy: Optional[float] = None
     danceability: Optional[float] = None
     duration: Optional[float] = None
+    analysis_tier: Optional[str] = None
+    loudness_lufs: Optional[float] = None
+    true_peak_dbtp: Optional[float] = None
+    replay_gain_db: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -46,3 +50,7 @@ class AudioAnalysis(BaseModel):
     energy: Optional[float] = None
     danceability: Optional[float] = None
     duration: Optional[float] = None
+    analysis_tier: Optional[str] = None
+    loudness_lufs: Optional[float] = None
+    true_peak_dbtp: Optional[float] = None
+    replay_gain_db: Optional[float] = None
@@ -0,0 +1,21 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_size: int = Field(..., gt=0)
+    chunk_size: Optional[int] = None
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+
+class UploadSessionRead(BaseModel):
+    upload_id: str
+    filename: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    received_offset: int
+    missing_chunks: List[int]
+    expires_at: float
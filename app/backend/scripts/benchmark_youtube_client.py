@@ -0,0 +1,150 @@
+"""Per-search latency of the YouTube client: a new ClientSession per call vs the shared pool.
+
+Usage:
+    python -m app.backend.scripts.benchmark_youtube_client [--searches N] [--concurrency C]
+
+A local stub of the YouTube Data API (search + videos) is started on localhost,
+so the numbers isolate client overhead: DNS lookup and TCP connection setup,
+which the old code paid twice per search. Connections opened are counted with a
+trace hook in both arms, warm-up excluded. Against the real API TLS handshakes
+and network round trips make each new connection far more expensive.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from app.backend.services.youtube_service import youtube_service
+
+STUB_RESULTS = 20
+
+
+def _stub_video(video_id: str) -> Dict:
+    return {
+        "id": video_id,
+        "snippet": {
+            "title": f"Artist {video_id} - Song {video_id}",
+            "channelTitle": "Stub Channel",
+            "description": "Stub video " * 10,
+            "thumbnails": {"hqdefault": {"url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"}},
+        },
+        "contentDetails": {"duration": "PT3M30S"},
+        "statistics": {"viewCount": "12345"},
+    }
+
+
+async def _stub_search(request: web.Request) -> web.Response:
+    count = int(request.query.get("maxResults", STUB_RESULTS))
+    return web.json_response({"items": [{"id": {"videoId": f"v{i}"}} for i in range(count)]})
+
+
+async def _stub_videos(request: web.Request) -> web.Response:
+    ids = request.query.get("id", "").split(",")
+    return web.json_response({"items": [_stub_video(video_id) for video_id in ids if video_id]})
+
+
+async def start_stub() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/search", _stub_search)
+    app.router.add_get("/videos", _stub_videos)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", 0).start()
+    return runner
+
+
+def connection_counter(counts: Dict) -> aiohttp.TraceConfig:
+    """TraceConfig counting the connections sessions using it open"""
+    async def created(session, context, params) -> None:
+        counts["connections"] += 1
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_end.append(created)
+    return trace
+
+
+async def search_with_new_sessions(base_url: str, query: str, trace: aiohttp.TraceConfig) -> List[Dict]:
+    """The previous client: a fresh ClientSession (connector, DNS, TCP) for each API call"""
+    params = {"part": "snippet", "q": f"{query} music", "type": "video", "maxResults": STUB_RESULTS, "key": "stub"}
+    async with aiohttp.ClientSession(trace_configs=[trace]) as session:
+        async with session.get(f"{base_url}/search", params=params) as response:
+            data = await response.json()
+    video_ids = [item["id"]["videoId"] for item in data["items"]]
+    params = {"part": "snippet,contentDetails,statistics", "id": ",".join(video_ids), "key": "stub"}
+    async with aiohttp.ClientSession(trace_configs=[trace]) as session:
+        async with session.get(f"{base_url}/videos", params=params) as response:
+            data = await response.json()
+    return youtube_service.format_videos(data["items"])
+
+
+async def measure(search, searches: int, concurrency: int) -> np.ndarray:
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            results = await search(f"query {i}")
+            durations.append(time.perf_counter() - started)
+            assert len(results) == STUB_RESULTS
+
+    await asyncio.gather(*(one(i) for i in range(searches)))
+    return np.array(durations) * 1000
+
+
+def report(name: str, durations: np.ndarray) -> str:
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+    return f"  {name:<14} {p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {durations.mean():>8.2f}"
+
+
+async def run(searches: int, concurrency: int) -> None:
+    runner = await start_stub()
+    port = runner.addresses[0][1]
+    base_url = f"http://localhost:{port}"
+    youtube_service.base_url = base_url
+    youtube_service.api_key = "stub"
+    # Measure the client, not the response cache
+    youtube_service.search_cache.max_entries = 0
+    fresh_counts = {"connections": 0}
+    trace = connection_counter(fresh_counts)
+    await youtube_service.start()
+    try:
+        # Warm up both paths (imports, first JSON parse) before timing, and leave
+        # their connections out of the counts
+        await search_with_new_sessions(base_url, "warmup", trace)
+        fresh_counts["connections"] = 0
+        pooled_before = youtube_service.connections_created
+        await youtube_service.search_music("warmup", STUB_RESULTS)
+        pooled_warm = youtube_service.connections_created - pooled_before
+
+        fresh = await measure(lambda q: search_with_new_sessions(base_url, q, trace), searches, concurrency)
+        pooled_before = youtube_service.connections_created
+        pooled = await measure(lambda q: youtube_service.search_music(q, STUB_RESULTS), searches, concurrency)
+        pooled_opened = youtube_service.connections_created - pooled_before
+
+        print(f"\n{searches} searches (search + videos calls each), concurrency {concurrency}, stub at {base_url}")
+        print(f"  {'client':<14} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+        print(report("new sessions", fresh))
+        print(report("shared pool", pooled))
+        print(f"  connections opened: new sessions {fresh_counts['connections']}, "
+              f"shared pool {pooled_opened} (+{pooled_warm} during warm-up)")
+        print(f"  per-search overhead saved (p50): {np.median(fresh) - np.median(pooled):.2f} ms")
+    finally:
+        await youtube_service.close()
+        await runner.cleanup()
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.searches, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
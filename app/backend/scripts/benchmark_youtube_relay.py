@@ -0,0 +1,132 @@
+"""Exercise the YouTube relay against a local stand-in for googlevideo.
+
+Usage:
+    python -m app.backend.scripts.benchmark_youtube_relay [--size-mb N] [--latency-ms MS] [--seeks N]
+
+The stand-in serves random bytes with Range support after an artificial
+per-request delay, and refuses the first URL it is given with a 403 the way an
+expired googlevideo URL is refused. The relay runs with a temporary block cache:
+a cold pass fetches upstream, a warm pass is answered from disk, then random
+seeks read a mix of both. Every response body is checked against the source.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+from aiohttp import web
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+
+from app.backend.config import settings
+from app.backend.services.youtube_relay import RelayCache, youtube_relay
+
+VIDEO_ID = "standin0001"
+
+
+def stand_in(data: bytes, latency: float, counts: dict) -> web.Application:
+    """googlevideo-like server: single byte ranges, 403 for URLs marked stale"""
+    async def videoplayback(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        if request.query.get("sig") == "stale":
+            return web.Response(status=403)
+        counts["requests"] += 1
+        range_header = request.headers.get("Range", "")
+        if not range_header.startswith("bytes="):
+            return web.Response(body=data, content_type="audio/webm")
+        start, _, end = range_header[len("bytes="):].partition("-")
+        start, end = int(start), min(int(end or len(data) - 1), len(data) - 1)
+        return web.Response(
+            status=206,
+            body=data[start:end + 1],
+            content_type="audio/webm",
+            headers={"Content-Range": f"bytes {start}-{end}/{len(data)}"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/videoplayback", videoplayback)
+    return app
+
+
+async def relay_endpoint(request: Request):
+    return await youtube_relay.response(request.path_params["youtube_id"], request.headers)
+
+
+async def timed_get(client: httpx.AsyncClient, headers: Optional[dict] = None) -> (httpx.Response, float):
+    started = time.perf_counter()
+    response = await client.get(f"/relay/{VIDEO_ID}", headers=headers or {})
+    return response, time.perf_counter() - started
+
+
+async def run(size_mb: float, latency_ms: float, seeks: int) -> None:
+    data = os.urandom(int(size_mb * 1024 * 1024))
+    upstream = {"requests": 0}
+    runner = web.AppRunner(stand_in(data, latency_ms / 1000, upstream), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", 0).start()
+    base_url = f"http://localhost:{runner.addresses[0][1]}/videoplayback?id={VIDEO_ID}"
+
+    resolved = {"url": f"{base_url}&sig=stale"}
+
+    async def resolver(youtube_id: str, refresh: bool = False) -> str:
+        # The first URL handed out has "expired", like a stored googlevideo URL
+        if refresh:
+            resolved["url"] = f"{base_url}&sig=fresh"
+        return resolved["url"]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        youtube_relay.cache = RelayCache(Path(cache_dir), settings.youtube_relay_block_bytes, max_bytes=1 << 40)
+        youtube_relay.resolver = resolver
+        app = Starlette(routes=[Route("/relay/{youtube_id}", relay_endpoint)])
+        transport = httpx.ASGITransport(app=app)
+        rows: List[str] = []
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://relay") as client:
+                for name in ("cold (upstream)", "warm (disk)"):
+                    before = upstream["requests"]
+                    response, seconds = await timed_get(client)
+                    assert response.status_code == 200 and response.content == data, name
+                    rows.append(f"  {name:<16} {seconds * 1000:>9.1f} {len(data) / seconds / 2**20:>9.1f} "
+                                f"{upstream['requests'] - before:>9} {response.headers.get('x-relay-cache')}")
+
+                # Seeks into a partially cached track: new cache, random ranges
+                youtube_relay.cache = RelayCache(Path(cache_dir) / "seeks", settings.youtube_relay_block_bytes, 1 << 40)
+                rng = random.Random(0)
+                before = upstream["requests"]
+                started = time.perf_counter()
+                for _ in range(seeks):
+                    start = rng.randrange(len(data))
+                    end = min(len(data) - 1, start + rng.randrange(64 * 1024, 2 * 1024 * 1024))
+                    response, _ = await timed_get(client, {"Range": f"bytes={start}-{end}"})
+                    assert response.status_code == 206 and response.content == data[start:end + 1]
+                seconds = time.perf_counter() - started
+                rows.append(f"  {f'seek (of {seeks})':<16} {seconds * 1000 / max(seeks, 1):>9.1f} {'':>9} "
+                            f"{upstream['requests'] - before:>9} partial")
+        finally:
+            await youtube_relay.close()
+            await runner.cleanup()
+
+        print(f"\n{size_mb} MB track, {latency_ms:.0f} ms upstream latency, "
+              f"{settings.youtube_relay_block_bytes // 1024} KB blocks, {settings.youtube_relay_fetch_blocks} per fetch")
+        print(f"  {'pass':<16} {'ms':>9} {'MB/s':>9} {'upstream':>9}")
+        print("\n".join(rows))
+        print(f"  relay: {youtube_relay.stats()}")
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--seeks", type=int, default=20)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.size_mb, args.latency_ms, args.seeks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""Bulk (re)analysis of the catalogue and bulk import of music folders.
+
+Usage:
+    python -m app.backend.scripts.bulk_analyze reanalyze [--only-missing]
+    python -m app.backend.scripts.bulk_analyze import /path/to/music [--user-id N]
+    python -m app.backend.scripts.bulk_analyze loudness [--only-missing]
+
+Files are processed on a process pool (metadata + full analysis). Results are
+written to the database in batches, and after every batch a checkpoint file
+records how far the run got, so an interrupted run picks up where it stopped.
+Use --restart to ignore an existing checkpoint.
+
+`import` skips files whose content is already in the catalogue, so re-running it
+over the same folder only adds what is new. Songs whose analysis fails get an
+analysis job, and the analysis worker retries them with backoff.
+
+`loudness` backfills only the loudness columns: each file is decoded once at
+its native rate and run through the meter, no spectral analysis.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlmodel import Session, select
+
+from app.backend.config import settings
+from app.backend.db import engine, init_db
+from app.backend.models.models import AudioJob, Song
+from app.backend.routes.songs import ALLOWED_EXTENSIONS
+from app.backend.services.analysis_queue import (
+    analysis_values, loudness_values, ANALYSIS, QUEUED, RUNNING, TIER_FULL, TRANSCODE, TRANSCODE_PRIORITY,
+    _init_worker_process,
+)
+from app.backend.services.audio_processing import audio_service
+from app.backend.services.audio_store import audio_store
+from app.backend.services.fingerprints import fingerprint_index
+from app.backend.services.transcoding import transcoder
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def reanalyze_song(song_id: int, file_path: str, content_hash: Optional[str]) -> Dict:
+    """Worker: full analysis of one stored song"""
+    result = audio_service._analyze_audio_sync(file_path, content_hash)
+    return {
+        "key": song_id,
+        "bytes": _file_size(file_path),
+        "features": result['features'] if result['success'] else None,
+        "error": None if result['success'] else result['message'],
+        "cached": result['cached'],
+    }
+
+
+def measure_song_loudness(song_id: int, file_path: str) -> Dict:
+    """Worker: loudness measurement of one stored song"""
+    try:
+        loudness = audio_service.measure_loudness(file_path)
+    except Exception as e:
+        return {"key": song_id, "bytes": 0, "features": None, "error": str(e), "cached": False}
+    return {"key": song_id, "bytes": _file_size(file_path), "features": loudness, "error": None, "cached": False}
+
+
+def import_file(path: str) -> Dict:
+    """Worker: copy one file into the audio store, read its tags and analyse it"""
+    try:
+        stored_path, content_hash, size = _store_file(Path(path))
+    except OSError as e:
+        return {"key": path, "bytes": 0, "features": None, "error": str(e), "cached": False}
+
+    metadata = audio_service.extract_metadata(str(stored_path))
+    result = audio_service._analyze_audio_sync(str(stored_path), content_hash)
+    return {
+        "key": path,
+        "bytes": size,
+        "stored_path": str(stored_path),
+        "content_hash": content_hash,
+        "metadata": metadata,
+        "features": result['features'] if result['success'] else None,
+        "error": None if result['success'] else result['message'],
+        "cached": result['cached'],
+    }
+
+
+def _store_file(source: Path) -> Tuple[Path, str, int]:
+    """Copy into the content-addressed store, hashing on the way"""
+    extension = source.suffix.lower()
+    temp_path = audio_store.temp_path(extension)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(source, "rb") as src, open(temp_path, "wb") as dst:
+            while data := src.read(COPY_CHUNK_SIZE):
+                hasher.update(data)
+                dst.write(data)
+                size += len(data)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return audio_store.commit(temp_path, hasher.hexdigest(), extension), hasher.hexdigest(), size
+
+
+def _queue_retries(db: Session, song_ids: List[int]) -> None:
+    """Hand songs whose analysis failed to the analysis worker, unless a job is already pending"""
+    if not song_ids:
+        return
+    pending = set(db.exec(
+        select(AudioJob.song_id).where(
+            AudioJob.song_id.in_(song_ids), AudioJob.kind == ANALYSIS, AudioJob.status.in_([QUEUED, RUNNING]),
+        )
+    ).all())
+    jobs = [
+        {"song_id": song_id, "kind": ANALYSIS, "max_attempts": settings.analysis_max_attempts}
+        for song_id in song_ids if song_id not in pending
+    ]
+    if jobs:
+        db.execute(insert(AudioJob), jobs)
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class Checkpoint:
+    """Last key whose result is committed, persisted as JSON"""
+
+    def __init__(self, path: Path, mode: str, restart: bool):
+        self.path = path
+        self.mode = mode
+        self.last_key = None
+        if path.exists() and not restart:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("mode") != mode:
+                raise SystemExit(f"{path} belongs to a '{data.get('mode')}' run, use another --checkpoint")
+            self.last_key = data.get("last_key")
+
+    def save(self, last_key) -> None:
+        self.last_key = last_key
+        temp = self.path.with_suffix(".tmp")
+        temp.write_text(json.dumps({"mode": self.mode, "last_key": last_key}), encoding="utf-8")
+        os.replace(temp, self.path)
+
+
+class Throughput:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files = 0
+        self.failed = 0
+        self.cached = 0
+        self.bytes = 0
+
+    def add(self, result: Dict) -> None:
+        self.files += 1
+        self.bytes += result["bytes"]
+        if result["error"]:
+            self.failed += 1
+        if result["cached"]:
+            self.cached += 1
+
+    def report(self, total: int) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (
+            f"{self.files}/{total} files ({self.failed} failed, {self.cached} from cache) in {elapsed:.1f}s: "
+            f"{self.files / elapsed:.2f} files/s, {self.bytes / elapsed / (1024 * 1024):.2f} MB/s"
+        )
+
+
+def run(tasks: List[Tuple], worker, write_batch, checkpoint: Checkpoint, workers: int, batch_size: int) -> Throughput:
+    """Fan tasks out to the pool and commit results in order, checkpointing after each batch"""
+    throughput = Throughput()
+    batch: List[Dict] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_process) as executor:
+        # map() yields results in submission order, so a checkpoint never skips an unfinished task
+        for result in executor.map(worker, *zip(*tasks), chunksize=4):
+            throughput.add(result)
+            if result["error"]:
+                logger.warning(f"{result['key']}: {result['error']}")
+            batch.append(result)
+            if len(batch) >= batch_size:
+                write_batch(batch)
+                checkpoint.save(batch[-1]["key"])
+                logger.info(throughput.report(len(tasks)))
+                batch = []
+        if batch:
+            write_batch(batch)
+            checkpoint.save(batch[-1]["key"])
+    return throughput
+
+
+def reanalyze(args, checkpoint: Checkpoint) -> Tuple[List[Tuple], Callable[[List[Dict]], None]]:
+    stmt = select(Song.id, Song.file_path, Song.content_hash).where(Song.file_path != None).order_by(Song.id)
+    if args.only_missing:
+        stmt = stmt.where((Song.analysis_tier == None) | (Song.analysis_tier != TIER_FULL))
+    if checkpoint.last_key is not None:
+        stmt = stmt.where(Song.id > checkpoint.last_key)
+    with Session(engine) as db:
+        tasks = [tuple(row) for row in db.exec(stmt).all()]
+
+    def write_batch(batch: List[Dict]) -> None:
+        rows = [{"id": r["key"], **analysis_values(r["features"], TIER_FULL)} for r in batch if r["features"]]
+        failed = [r["key"] for r in batch if r["error"]]
+        if rows or failed:
+            with Session(engine) as db:
+                if rows:
+                    db.execute(update(Song), rows)
+                    fingerprint_index.index_songs(db, [(row["id"], row["fingerprint"]) for row in rows])
+                _queue_retries(db, failed)
+                db.commit()
+
+    return tasks, write_batch
+
+
+def backfill_loudness(args, checkpoint: Checkpoint) -> Tuple[List[Tuple], Callable[[List[Dict]], None]]:
+    stmt = select(Song.id, Song.file_path).where(Song.file_path != None).order_by(Song.id)
+    if args.only_missing:
+        stmt = stmt.where(Song.loudness_lufs == None)
+    if checkpoint.last_key is not None:
+        stmt = stmt.where(Song.id > checkpoint.last_key)
+    with Session(engine) as db:
+        tasks = [tuple(row) for row in db.exec(stmt).all()]
+
+    def write_batch(batch: List[Dict]) -> None:
+        rows = [
+            {"id": r["key"], **loudness_values(r["features"]["loudness_lufs"], r["features"]["true_peak_dbtp"])}
+            for r in batch if r["features"]
+        ]
+        if rows:
+            with Session(engine) as db:
+                db.execute(update(Song), rows)
+                db.commit()
+
+    return tasks, write_batch
+
+
+def import_directory(args, checkpoint: Checkpoint) -> Tuple[List[Tuple], Callable[[List[Dict]], None]]:
+    root = Path(args.directory)
+    if not root.is_dir():
+        raise SystemExit(f"{root} is not a directory")
+
+    paths = sorted(str(p) for p in root.rglob("*") if p.is_file() and p.suffix.lower() in ALLOWED_EXTENSIONS)
+    if checkpoint.last_key is not None:
+        paths = [p for p in paths if p > checkpoint.last_key]
+    tasks = [(path,) for path in paths]
+
+    def write_batch(batch: List[Dict]) -> None:
+        rows = []
+        sources = []
+        for r in batch:
+            if "stored_path" not in r:
+                continue
+            sources.append(r["key"])
+            metadata = r["metadata"]
+            row = {
+                "title": metadata.get("title") or Path(r["key"]).stem,
+                "artist": metadata.get("artist") or "Unknown Artist",
+                "album": metadata.get("album") or "Unknown Album",
+                "file_path": r["stored_path"],
+                "content_hash": r["content_hash"],
+                "uploaded_by": args.user_id,
+                "duration": metadata.get("duration") or (r["features"] or {}).get("duration"),
+            }
+            if r["features"]:
+                row.update(analysis_values(r["features"], TIER_FULL))
+            rows.append(row)
+        if rows:
+            with audio_store.lock_many(row["content_hash"] for row in rows), Session(engine) as db:
+                # Content already in the catalogue (an earlier run, or the same file twice) is skipped
+                seen = set(db.exec(
+                    select(Song.content_hash).where(Song.content_hash.in_([row["content_hash"] for row in rows]))
+                ).all())
+                new_rows, new_sources = [], []
+                for row, source in zip(rows, sources):
+                    if row["content_hash"] not in seen:
+                        seen.add(row["content_hash"])
+                        new_rows.append(row)
+                        new_sources.append(source)
+                rows, sources = new_rows, new_sources
+                if not rows:
+                    return
+                # A song deleted since a worker stored its file may have released that blob, store it again
+                for row, source in zip(rows, sources):
+                    if not os.path.exists(row["file_path"]):
+                        row["file_path"] = str(_store_file(Path(source))[0])
+                ids = db.scalars(insert(Song).returning(Song.id, sort_by_parameter_order=True), rows).all()
+                fingerprint_index.index_songs(db, [(i, row.get("fingerprint")) for i, row in zip(ids, rows)])
+                _queue_retries(db, [i for i, row in zip(ids, rows) if "analysis_tier" not in row])
+                # Renditions are left to the analysis worker, which may run elsewhere
+                jobs = [
+                    {"song_id": i, "kind": TRANSCODE, "priority": TRANSCODE_PRIORITY,
+                     "max_attempts": settings.analysis_max_attempts}
+                    for i, row in zip(ids, rows)
+                    if transcoder.enabled and not transcoder.has_renditions(row["content_hash"])
+                ]
+                if jobs:
+                    db.execute(insert(AudioJob), jobs)
+                db.commit()
+
+    return tasks, write_batch
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="analysis processes")
+    parser.add_argument("--batch-size", type=int, default=100, help="results per database write and checkpoint")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: bulk_<mode>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    reanalyze_parser = subparsers.add_parser("reanalyze", help="re-run analysis for songs in the database")
+    reanalyze_parser.add_argument("--only-missing", action="store_true", help="skip songs with a full analysis")
+
+    import_parser = subparsers.add_parser("import", help="import and analyse every audio file under a directory")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--user-id", type=int, default=None, help="record the songs as uploaded by this user")
+
+    loudness_parser = subparsers.add_parser("loudness", help="measure loudness of songs in the database")
+    loudness_parser.add_argument("--only-missing", action="store_true", help="skip songs already measured")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    init_db()
+    audio_service.cache.purge_stale()
+
+    checkpoint = Checkpoint(Path(args.checkpoint or f"bulk_{args.mode}.checkpoint.json"), args.mode, args.restart)
+    if checkpoint.last_key is not None:
+        logger.info(f"Resuming after {checkpoint.last_key}")
+
+    if args.mode == "reanalyze":
+        tasks, write_batch = reanalyze(args, checkpoint)
+        worker = reanalyze_song
+    elif args.mode == "loudness":
+        tasks, write_batch = backfill_loudness(args, checkpoint)
+        worker = measure_song_loudness
+    else:
+        tasks, write_batch = import_directory(args, checkpoint)
+        worker = import_file
+
+    if not tasks:
+        logger.info("Nothing to do")
+        return
+
+    throughput = run(tasks, worker, write_batch, checkpoint, args.workers, args.batch_size)
+    logger.info(f"Done: {throughput.report(len(tasks))}")
+
+
+if __name__ == "__main__":
+    main()
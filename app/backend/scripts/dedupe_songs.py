@@ -0,0 +1,87 @@
+"""Find songs holding the same recording and merge each group into one row.
+
+Usage:
+    python -m app.backend.scripts.dedupe_songs [--dry-run] [--reindex]
+
+Duplicates are found through the audio fingerprint index, so only analysed
+songs take part (run `bulk_analyze reanalyze` first for older rows). Playlist
+entries and likes of merged songs move to the kept song, and stored audio no
+longer referenced by any song is released. Like the merge endpoint, only
+songs with the same uploader are merged (songs without one, imports and YouTube
+rows, merge among themselves); copies uploaded by different users are kept.
+--reindex rebuilds the fingerprint
+index from the fingerprints stored on each song before searching.
+"""
+import argparse
+import logging
+from typing import Iterable, Optional, Set
+
+from sqlmodel import Session, select
+
+from app.backend.db import engine, init_db
+from app.backend.models.models import Song
+from app.backend.services.audio_store import audio_store
+from app.backend.services.deduplication import choose_canonical, duplicate_group, merge_songs
+from app.backend.services.fingerprints import fingerprint_index
+
+logger = logging.getLogger(__name__)
+
+REINDEX_BATCH_SIZE = 500
+
+
+def reindex() -> None:
+    with Session(engine) as db:
+        rows = db.exec(select(Song.id, Song.fingerprint).where(Song.fingerprint != None).order_by(Song.id)).all()
+        for start in range(0, len(rows), REINDEX_BATCH_SIZE):
+            fingerprint_index.index_songs(db, [tuple(row) for row in rows[start:start + REINDEX_BATCH_SIZE]])
+            db.commit()
+    logger.info(f"Indexed {len(rows)} fingerprints")
+
+
+def dedupe(dry_run: bool) -> None:
+    with Session(engine) as db:
+        song_ids = db.exec(select(Song.id).where(Song.fingerprint != None).order_by(Song.id)).all()
+
+    merged: Set[int] = set()
+    groups = 0
+    for song_id in song_ids:
+        if song_id in merged:
+            continue
+        with Session(engine) as db:
+            song = db.get(Song, song_id)
+            if song is None:
+                continue
+            group = [s for s in duplicate_group(db, song) if s.id not in merged]
+            if len(group) == 1:
+                continue
+
+            keep = choose_canonical(group)
+            duplicates = [s for s in group if s.id != keep.id]
+            groups += 1
+            merged.update(s.id for s in duplicates)
+            logger.info(f"{keep.id} '{keep.artist} - {keep.title}' <- {[s.id for s in duplicates]}")
+            if dry_run:
+                continue
+
+            for file_path in merge_songs(db, keep, duplicates):
+                audio_store.release(db, file_path)
+
+    action = "would merge" if dry_run else "merged"
+    logger.info(f"Done: {groups} duplicate groups, {action} {len(merged)} songs")
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report the duplicate groups")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the fingerprint index first")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    init_db()
+
+    if args.reindex:
+        reindex()
+    dedupe(args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import multiprocessing.util
+import os
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, func, delete
+
+from app.backend.db import engine
+from app.backend.models.models import AnalysisCacheEntry
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Hit counts are written in batches, once this many are pending or this long after the last write
+HIT_FLUSH_COUNT = 20
+HIT_FLUSH_SECONDS = 60.0
+
+
+def file_sha256(file_path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while data := f.read(HASH_CHUNK_SIZE):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+class AnalysisCache:
+    """Analysis results keyed by (audio sha256, analyzer version, tier).
+
+    Stored in the database so every worker process and the bulk CLI share it.
+    Entries from other analyzer versions are never returned and are removed
+    by purge_stale(). Lookups and stores never raise: a broken cache only
+    costs a recomputation.
+
+    Hits are counted in the table, so the numbers are the same whichever
+    process reports them. A lookup only reads; its hit is added to the entry
+    in a later batched write (flush_hits).
+    """
+
+    def __init__(self, analyzer_version: str, enabled: bool = True):
+        self.analyzer_version = analyzer_version
+        self.enabled = enabled
+        self._pending_hits: "Counter[Tuple[str, str]]" = Counter()
+        self._last_flush = time.monotonic()
+        self._exit_flush_pid = None
+
+    def get(self, content_hash: str, tier: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        try:
+            with Session(engine) as db:
+                entry = db.get(AnalysisCacheEntry, (content_hash, self.analyzer_version, tier))
+                if entry is None:
+                    return None
+                features = dict(entry.features)
+                features['embedding'] = entry.embedding
+                features['fingerprint'] = entry.fingerprint
+        except Exception as e:
+            logger.warning(f"Analysis cache lookup failed: {e}")
+            return None
+
+        self._pending_hits[(content_hash, tier)] += 1
+        if self._exit_flush_pid != os.getpid():
+            # Pool worker processes skip atexit, multiprocessing's exit finalizers still run
+            multiprocessing.util.Finalize(self, self.flush_hits, exitpriority=10)
+            self._exit_flush_pid = os.getpid()
+        if (sum(self._pending_hits.values()) >= HIT_FLUSH_COUNT
+                or time.monotonic() - self._last_flush >= HIT_FLUSH_SECONDS):
+            self.flush_hits()
+        return features
+
+    def flush_hits(self) -> None:
+        """Add the hits counted since the last flush to their entries, one statement per entry"""
+        pending, self._pending_hits = self._pending_hits, Counter()
+        self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            with Session(engine) as db:
+                for (content_hash, tier), count in pending.items():
+                    db.execute(
+                        update(AnalysisCacheEntry)
+                        .where(
+                            AnalysisCacheEntry.content_hash == content_hash,
+                            AnalysisCacheEntry.analyzer_version == self.analyzer_version,
+                            AnalysisCacheEntry.tier == tier,
+                        )
+                        .values(hits=AnalysisCacheEntry.hits + count)
+                    )
+                db.commit()
+        except Exception as e:
+            logger.warning(f"Analysis cache hit count update failed: {e}")
+
+    def put(self, content_hash: str, tier: str, features: Dict) -> None:
+        if not self.enabled:
+            return
+        entry = AnalysisCacheEntry(
+            content_hash=content_hash,
+            analyzer_version=self.analyzer_version,
+            tier=tier,
+            features={k: v for k, v in features.items() if k not in ('embedding', 'fingerprint')},
+            embedding=features.get('embedding'),
+            fingerprint=features.get('fingerprint'),
+        )
+        try:
+            with Session(engine) as db:
+                db.add(entry)
+                db.commit()
+        except IntegrityError:
+            # Another worker analysed the same audio concurrently, its entry is as good as ours
+            pass
+        except Exception as e:
+            logger.warning(f"Analysis cache store failed: {e}")
+
+    def purge_stale(self) -> int:
+        """Drop entries written by other analyzer versions"""
+        with Session(engine) as db:
+            result = db.exec(
+                delete(AnalysisCacheEntry).where(AnalysisCacheEntry.analyzer_version != self.analyzer_version)
+            )
+            db.commit()
+        if result.rowcount:
+            logger.info(f"Purged {result.rowcount} analysis cache entries from old analyzer versions")
+        return result.rowcount
+
+    def stats(self, db: Session) -> Dict:
+        """Lifetime totals from the table, across every process (hits lag by up to one flush batch per process)"""
+        entries, total_hits = db.exec(
+            select(func.count(), func.coalesce(func.sum(AnalysisCacheEntry.hits), 0))
+            .where(AnalysisCacheEntry.analyzer_version == self.analyzer_version)
+        ).one()
+        return {
+            "analyzer_version": self.analyzer_version,
+            "entries": entries,
+            "hits": total_hits,
+            # Every stored entry started as a miss
+            "hit_rate": round(total_hits / (total_hits + entries), 3) if entries else None,
+        }
@@ -0,0 +1,421 @@
+import asyncio
+import fcntl
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, select, func
+
+from app.backend.config import settings
+from app.backend.db import engine
+from app.backend.models.models import AudioJob, Song, utcnow
+from app.backend.services.audio_processing import audio_service, TIER_EXCERPT, TIER_FULL
+from app.backend.services.blocking import run_blocking
+from app.backend.services.fingerprints import fingerprint_index
+from app.backend.services.loudness import normalization_gain
+from app.backend.services.transcoding import transcoder
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Job kinds
+ANALYSIS = "analysis"
+EXCERPT = "excerpt"
+TRANSCODE = "transcode"
+
+# Excerpt jobs jump ahead of full analyses so new uploads get features quickly
+EXCERPT_PRIORITY = 10
+# Renditions come before the full analysis too, until then clients stream the original
+TRANSCODE_PRIORITY = 5
+
+# Base delay before retrying a failed job, doubled on every attempt
+RETRY_BACKOFF_SECONDS = 30
+
+# A running job whose worker missed this many heartbeats is assumed dead and requeued
+HEARTBEAT_MISSES = 4
+
+# One worker per host: the API processes and the standalone worker all try to take this lock
+WORKER_LOCK_PATH = Path("uploads/.analysis_worker.lock")
+
+# kind -> (analysis function, tier it produces)
+JOB_ANALYZERS = {
+    ANALYSIS: (audio_service._analyze_audio_sync, TIER_FULL),
+    EXCERPT: (audio_service._analyze_excerpts_sync, TIER_EXCERPT),
+}
+
+
+def enqueue_analysis(db: Session, song_id: int, priority: int = 0, kind: str = ANALYSIS) -> AudioJob:
+    """Persist an analysis job for a song, reusing one that is already pending"""
+    stmt = select(AudioJob).where(
+        AudioJob.song_id == song_id,
+        AudioJob.kind == kind,
+        AudioJob.status.in_([QUEUED, RUNNING]),
+    )
+    existing = db.exec(stmt).first()
+    if existing:
+        return existing
+
+    job = AudioJob(
+        song_id=song_id,
+        kind=kind,
+        priority=priority,
+        max_attempts=settings.analysis_max_attempts,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def enqueue_tiered_analysis(db: Session, song: Song) -> AudioJob:
+    """Quick excerpt pass first (unless the song already has features), then the full pass"""
+    if song.tempo is None:
+        enqueue_analysis(db, song.id, priority=EXCERPT_PRIORITY, kind=EXCERPT)
+    return enqueue_analysis(db, song.id)
+
+
+def enqueue_transcode(db: Session, song: Song) -> Optional[AudioJob]:
+    """Queue the streaming renditions of a song's audio, unless they exist or transcoding is off"""
+    if not transcoder.enabled or not song.content_hash or transcoder.has_renditions(song.content_hash):
+        return None
+    return enqueue_analysis(db, song.id, priority=TRANSCODE_PRIORITY, kind=TRANSCODE)
+
+
+def analysis_values(features: Dict, tier: str = TIER_FULL) -> Dict:
+    """Song column values for an analysis result"""
+    values = {
+        'analysis_tier': tier,
+        'tempo': features.get('tempo'),
+        'musical_key': features.get('musical_key'),
+        'genre': features.get('genre'),
+        'mood': features.get('mood'),
+        'energy': features.get('energy'),
+        'danceability': features.get('danceability'),
+        'embedding': features.get('embedding'),
+    }
+    # Excerpts don't measure loudness or fingerprint, keep whatever an earlier full pass stored
+    if tier == TIER_FULL:
+        values.update(loudness_values(features.get('loudness_lufs'), features.get('true_peak_dbtp')))
+        values['fingerprint'] = features.get('fingerprint')
+    return values
+
+
+def loudness_values(loudness_lufs: Optional[float], true_peak_dbtp: Optional[float]) -> Dict:
+    """Song column values for a loudness measurement, with the playback gain for the configured target"""
+    return {
+        'loudness_lufs': loudness_lufs,
+        'true_peak_dbtp': true_peak_dbtp,
+        'replay_gain_db': normalization_gain(
+            loudness_lufs, true_peak_dbtp, settings.loudness_target_lufs, settings.loudness_peak_ceiling_dbtp,
+        ),
+    }
+
+
+def store_analysis(db: Session, song_id: int, features: Dict, tier: str = TIER_FULL) -> bool:
+    """Write analysis output onto the song row, without committing.
+
+    An excerpt result only lands on a row that has no full result, checked in
+    the UPDATE itself so a full pass finishing meanwhile can't be overwritten.
+    Returns False if the row was left alone.
+    """
+    values = analysis_values(features, tier)
+    values['duration'] = func.coalesce(func.nullif(Song.duration, 0), features.get('duration'))
+    stmt = update(Song).where(Song.id == song_id)
+    if tier == TIER_EXCERPT:
+        stmt = stmt.where(Song.analysis_tier.is_distinct_from(TIER_FULL))
+    return db.execute(stmt.values(**values)).rowcount > 0
+
+
+def claim_jobs(db: Session, limit: int) -> List[int]:
+    """Mark up to `limit` runnable jobs as running and return their ids.
+
+    FOR UPDATE SKIP LOCKED lets several workers poll the same table without
+    handing the same job out twice (ignored on SQLite, which has one writer).
+    """
+    stmt = (
+        select(AudioJob)
+        .where(AudioJob.status == QUEUED, AudioJob.run_after <= utcnow())
+        .order_by(AudioJob.priority.desc(), AudioJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    jobs = db.exec(stmt).all()
+    now = utcnow()
+    for job in jobs:
+        job.status = RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        db.add(job)
+    db.commit()
+    return [job.id for job in jobs]
+
+
+def heartbeat_jobs(db: Session, job_ids: List[int]) -> None:
+    """Mark running jobs as still being worked on"""
+    db.execute(
+        update(AudioJob)
+        .where(AudioJob.id.in_(job_ids), AudioJob.status == RUNNING)
+        .values(heartbeat_at=utcnow())
+    )
+    db.commit()
+
+
+def requeue_stale_jobs(db: Session, stale_seconds: float) -> int:
+    """Put jobs back in the queue whose worker died mid-run (crash, deploy).
+
+    A job is only stale once its heartbeat is `stale_seconds` old, however long it
+    has been running, so a slow job that is still being worked on stays put.
+    """
+    cutoff = utcnow() - timedelta(seconds=stale_seconds)
+    last_seen = func.coalesce(AudioJob.heartbeat_at, AudioJob.started_at)
+    stmt = select(AudioJob).where(AudioJob.status == RUNNING, last_seen < cutoff)
+    jobs = db.exec(stmt).all()
+    for job in jobs:
+        job.status = QUEUED if job.attempts < job.max_attempts else FAILED
+        job.last_error = "Worker stopped while running the job"
+        db.add(job)
+    db.commit()
+    if jobs:
+        logger.warning(f"Requeued {len(jobs)} stale analysis jobs")
+    return len(jobs)
+
+
+def queue_stats(db: Session) -> Dict:
+    """Queue depth per state and jobs finished over the last minute"""
+    counts = dict(db.exec(select(AudioJob.status, func.count()).group_by(AudioJob.status)).all())
+    finished_last_minute = db.exec(
+        select(func.count())
+        .select_from(AudioJob)
+        .where(AudioJob.status == DONE, AudioJob.finished_at >= utcnow() - timedelta(minutes=1))
+    ).one()
+    return {
+        "queued": counts.get(QUEUED, 0),
+        "running": counts.get(RUNNING, 0),
+        "done": counts.get(DONE, 0),
+        "failed": counts.get(FAILED, 0),
+        "done_last_minute": finished_last_minute,
+    }
+
+
+def _finish_job(db: Session, job: AudioJob, error: Optional[str]) -> None:
+    job_id = job.id
+    job.finished_at = utcnow()
+    if error is None:
+        job.status = DONE
+        job.last_error = None
+    elif job.attempts < job.max_attempts:
+        job.status = QUEUED
+        job.last_error = error
+        job.run_after = utcnow() + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+    else:
+        job.status = FAILED
+        job.last_error = error
+    db.add(job)
+    try:
+        db.commit()
+    except StaleDataError:
+        # The song was deleted while the job ran, and its jobs with it
+        db.rollback()
+        logger.info(f"Job {job_id} was deleted while it ran")
+
+
+def execute_job(job_id: int) -> bool:
+    """Run one job to completion. Runs in a worker process with its own session"""
+    with Session(engine) as db:
+        job = db.get(AudioJob, job_id)
+        if job is None:
+            return False
+
+        song = db.get(Song, job.song_id)
+        if song is None or not song.file_path:
+            _finish_job(db, job, "Song or audio file no longer exists")
+            return False
+
+        if job.kind == TRANSCODE:
+            return _run_transcode(db, job, song)
+
+        if job.kind not in JOB_ANALYZERS:
+            _finish_job(db, job, f"Unknown job kind {job.kind!r}")
+            return False
+        analyze, tier = JOB_ANALYZERS[job.kind]
+
+        # The full pass got there first, a quick estimate would only overwrite it
+        if tier == TIER_EXCERPT and song.analysis_tier == TIER_FULL:
+            _finish_job(db, job, None)
+            return True
+
+        try:
+            result = analyze(song.file_path, song.content_hash)
+        except Exception as e:
+            result = {'success': False, 'message': str(e)}
+
+        if not result['success']:
+            logger.error(f"Audio analysis failed for song {song.id}: {result['message']}")
+            _finish_job(db, job, result['message'])
+            return False
+
+        if not store_analysis(db, song.id, result['features'], tier):
+            # The full pass finished while this excerpt ran
+            _finish_job(db, job, None)
+            return True
+        if tier == TIER_FULL:
+            fingerprint_index.index_song(db, song.id, result['features'].get('fingerprint'))
+        _finish_job(db, job, None)
+        summary = {k: v for k, v in result['features'].items() if k not in ('embedding', 'fingerprint')}
+        logger.info(f"{tier.capitalize()} analysis result for {song.id}: {summary}")
+        return True
+
+
+def _run_transcode(db: Session, job: AudioJob, song: Song) -> bool:
+    try:
+        created = transcoder.transcode(song.file_path, song.content_hash)
+    except Exception as e:
+        logger.error(f"Transcoding failed for song {song.id}: {e}")
+        _finish_job(db, job, str(e))
+        return False
+
+    _finish_job(db, job, None)
+    logger.info(f"Transcoded song {song.id}: {', '.join(created) or 'renditions already present'}")
+    return True
+
+
+def _init_worker_process() -> None:
+    # Connections inherited through fork belong to the parent, never reuse them
+    engine.dispose(close=False)
+
+
+class AnalysisWorker:
+    """Polls the job table and runs analysis jobs on a process pool.
+
+    Runs inside an API process (started from the lifespan) or standalone with
+    `python -m app.backend.services.analysis_queue`. run_exclusive() lets only
+    one process per host run it; any number of hosts can share one database.
+    While jobs run their heartbeat is refreshed, and jobs whose heartbeat
+    stops (the worker died) are requeued by whichever worker notices.
+    """
+
+    def __init__(self, concurrency: int, poll_interval: float, heartbeat_interval: float):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pool_broken = False
+        self.active = False
+        self.running: Set[int] = set()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def run_exclusive(self, lock_path: Path = WORKER_LOCK_PATH) -> None:
+        """run() once this process holds the host's worker lock, waiting while another process has it"""
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        # Closing the file (cancellation, or the process dying) releases the lock
+        with open(lock_path, "a") as handle:
+            while True:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(self.heartbeat_interval)
+            await self.run()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.executor = self._new_pool()
+        self.active = True
+        logger.info(f"Analysis worker started with {self.concurrency} processes")
+        try:
+            await run_blocking(audio_service.cache.purge_stale)
+        except Exception as e:
+            logger.warning(f"Analysis cache purge failed: {e}")
+        last_heartbeat = float("-inf")
+        try:
+            while True:
+                try:
+                    if self.pool_broken:
+                        # A worker process died (e.g. OOM-killed), its jobs get requeued as stale
+                        logger.error("Analysis process pool broke, starting a new one")
+                        self.executor.shutdown(wait=False, cancel_futures=True)
+                        self.executor = self._new_pool()
+                        self.pool_broken = False
+
+                    if loop.time() - last_heartbeat >= self.heartbeat_interval:
+                        if self.running:
+                            await run_blocking(self._with_session, heartbeat_jobs, list(self.running))
+                        await run_blocking(
+                            self._with_session, requeue_stale_jobs, self.heartbeat_interval * HEARTBEAT_MISSES
+                        )
+                        last_heartbeat = loop.time()
+
+                    free_slots = self.concurrency - self.in_flight
+                    job_ids = []
+                    if free_slots > 0:
+                        job_ids = await run_blocking(self._with_session, claim_jobs, free_slots)
+                    for job_id in job_ids:
+                        self._submit(loop, job_id)
+                except Exception as e:
+                    logger.error(f"Analysis worker poll failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            self.active = False
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def _submit(self, loop: asyncio.AbstractEventLoop, job_id: int) -> None:
+        self.in_flight += 1
+        self.running.add(job_id)
+        future = loop.run_in_executor(self.executor, execute_job, job_id)
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    def _on_done(self, job_id: int, future: asyncio.Future) -> None:
+        self.in_flight -= 1
+        self.running.discard(job_id)
+        if future.cancelled():
+            return
+        if isinstance(future.exception(), BrokenProcessPool):
+            self.pool_broken = True
+        if future.exception() is not None or not future.result():
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.concurrency, initializer=_init_worker_process)
+
+    @staticmethod
+    def _with_session(func, *args):
+        with Session(engine) as db:
+            return func(db, *args)
+
+
+# Global instance
+analysis_worker = AnalysisWorker(
+    concurrency=settings.analysis_concurrency or max(1, (os.cpu_count() or 2) - 1),
+    poll_interval=settings.analysis_poll_interval_seconds,
+    heartbeat_interval=settings.analysis_heartbeat_seconds,
+)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(analysis_worker.run_exclusive())
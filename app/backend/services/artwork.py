@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from app.backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = Path("uploads/images")
+IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Square edge lengths generated for every cover, smallest first
+ARTWORK_SIZES = (64, 160, 320, 640)
+
+# extension -> (PIL format, MIME type, save options)
+ARTWORK_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def render_artwork_variants(image_bytes: bytes, output_dir: str) -> List[str]:
+    """Decode a cover once and write every size in every format (runs in a worker process)"""
+    image = Image.open(BytesIO(image_bytes))
+    # Let the JPEG decoder skip detail we'd throw away anyway
+    image.draft("RGB", (ARTWORK_SIZES[-1], ARTWORK_SIZES[-1]))
+    image = image.convert("RGB")
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+
+    written = []
+    # Largest first, each smaller size is resampled from the previous one
+    current = image
+    for size in reversed(ARTWORK_SIZES):
+        current = current.resize((size, size), Image.Resampling.LANCZOS)
+        for extension, (image_format, _, options) in ARTWORK_FORMATS.items():
+            path = output / f"{size}.{extension}"
+            current.save(path, image_format, **options)
+            written.append(str(path))
+    return written
+
+
+class ArtworkService:
+    """Precomputes resized artwork variants and picks the right one per request"""
+
+    def __init__(self, max_workers: int):
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    async def create_variants(self, image_bytes: bytes) -> Path:
+        """Render all variants into a new directory, returns the full-size JPEG path"""
+        output_dir = IMAGE_DIR / uuid.uuid4().hex
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(self.executor, render_artwork_variants, image_bytes, str(output_dir))
+        except Exception:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise
+        return output_dir / f"{ARTWORK_SIZES[-1]}.jpg"
+
+    def select_variant(self, artwork_path: str, size: Optional[int], accept: str) -> Tuple[Path, str]:
+        """Smallest variant covering `size` (largest if None), WebP when the client accepts it.
+
+        Covers uploaded before variants existed are a single JPEG and served as is.
+        """
+        path = Path(artwork_path)
+        variant_dir = path.parent
+        if variant_dir == IMAGE_DIR or not (variant_dir / f"{ARTWORK_SIZES[-1]}.jpg").exists():
+            return path, "image/jpeg"
+
+        chosen_size = ARTWORK_SIZES[-1]
+        if size is not None:
+            chosen_size = next((s for s in ARTWORK_SIZES if s >= size), ARTWORK_SIZES[-1])
+
+        extension = "webp" if "image/webp" in (accept or "") else "jpg"
+        variant = variant_dir / f"{chosen_size}.{extension}"
+        if not variant.exists():
+            extension = "jpg"
+            variant = variant_dir / f"{chosen_size}.jpg"
+        return variant, ARTWORK_FORMATS[extension][1]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global instance
+artwork_service = ArtworkService(max_workers=settings.artwork_workers)
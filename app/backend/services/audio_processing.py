@@ -2,100 +2,386 @@
 
 import librosa
 import numpy as np
+import scipy.signal
+import soundfile as sf
+import soxr
 from mutagen import File as MutagenFile
 import logging
-from typing import Dict
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.backend.config import settings
+from app.backend.services.analysis_cache import AnalysisCache, file_sha256
+from app.backend.services.fingerprints import FingerprintAccumulator
+from app.backend.services.loudness import LoudnessMeter
+from app.backend.services.waveforms import PeakAccumulator, waveform_store
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever feature extraction changes output, cached results of older versions are then ignored
+ANALYZER_VERSION = "6"
+
+# Analysis tiers, which pass produced a set of features
+TIER_EXCERPT = "excerpt"
+TIER_FULL = "full"
+
+# All analysis runs on mono audio at this rate, whatever the source format
+ANALYSIS_SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 256
+# Mean square of the STFT's Hann window, scales windowed frame power back to signal power
+WINDOW_POWER = float(np.mean(scipy.signal.get_window("hann", N_FFT, fftbins=True) ** 2))
+# Excerpt tier: this many seconds around each relative position
+EXCERPT_SECONDS = 10.0
+EXCERPT_POSITIONS = (0.25, 0.5, 0.75)
+# Length of the similarity embedding: 13 MFCC means, 13 MFCC stds, 12 chroma, centroid, energy, tempo
+EMBEDDING_DIM = 41
+# Onset frames per tempogram block, bounds tempo estimation memory on long tracks
+TEMPOGRAM_BLOCK_FRAMES = 4096
+
 class AudioProcessingService:
     def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=2)
-
-    async def analyze_audio_async(self, file_path: str) -> Dict:
-        """ASYNC WRAPPER FOR AUDIO ANALYSIS"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._analyze_audio_sync,
-            file_path,
-        )
+        self.cache = AnalysisCache(ANALYZER_VERSION, enabled=settings.analysis_cache_enabled)
 
-    def _analyze_audio_sync(self, file_path: str) -> Dict:
+    def _analyze_audio_sync(self, file_path: str, content_hash: Optional[str] = None) -> Dict:
         """SYNCHRONOUS AUDIO ANALYSIS USING LIBROSA"""
+        return self._run_analysis(file_path, TIER_FULL, self._extract_features_full, content_hash)
+
+    def _analyze_excerpts_sync(self, file_path: str, content_hash: Optional[str] = None) -> Dict:
+        """Fast first pass over a few short excerpts, refined later by the full analysis"""
+        return self._run_analysis(file_path, TIER_EXCERPT, self._extract_features_excerpts, content_hash)
+
+    def _run_analysis(self, file_path: str, tier: str, extract: Callable[[str], Dict],
+                      content_hash: Optional[str] = None) -> Dict:
+        """Analyse a file, or reuse the cached result for identical audio (content_hash is
+        computed from the file when the caller doesn't have it)"""
         try:
-            logger.info(f"Starting audio analysis for: {file_path}")
+            content_hash = content_hash or file_sha256(file_path)
+            # A full result is only complete with its waveform, recompute if that went missing
+            if self.cache.enabled and (tier != TIER_FULL or waveform_store.exists(content_hash)):
+                cached = self.cache.get(content_hash, tier)
+                if cached is not None:
+                    logger.info(f"Audio analysis cache hit for: {file_path}")
+                    return {
+                        'success': True,
+                        'features': cached,
+                        'message': 'Analysis loaded from cache',
+                        'cached': True,
+                    }
 
-            # Load audio file
-            y, sr = librosa.load(file_path, sr=None)
-            duration = librosa.get_duration(y=y, sr=sr)
-
-            # Extract features
-            features = {}
-
-            #1. Tempo (BPM)
-            tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-            features["tempo"] = float(tempo)
-
-            # 2. key detection
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            key = self._detect_key(chroma)
-            features['musical_key'] = key
-
-            # 3. Energy
-            rms = librosa.feature.rms(y=y)[0]
-            energy = float(np.mean(rms))
-            features['energy'] = min(energy * 10, 1.0) # Normalise to 0-1
-
-            #4. Spectral features for genre/mood prediction
-            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-            spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-
-            # 5. Genre prediction (simple rule-based)
-            genre = self._predict_genre(
-                tempo=features["tempo"],
-                energy=features["energy"],
-                spectral_centroids=spectral_centroids,
-                mfccs=mfccs,
-            )
-            features["genre"] = genre
-
-            # 6. Mood Prediction
-            mood = self._predict_mood(
-                energy=features["energy"],
-                tempo=features["tempo"],
-                key=key
-            )
-            features['mood'] = mood
-
-            # 7. Danceability
-            danceability = self._calculate_danceability(
-                tempo=features["tempo"],
-                energy=features["energy"],
-            )
-            features['danceability'] = danceability
-
-            # Additional metadata
-            features['duration'] = float(duration)
-            features['sample_rate'] = int(sr)
+            logger.info(f"Starting audio analysis for: {file_path}")
+            features = extract(file_path)
+            waveform = features.pop('waveform', None)
+            if waveform is not None:
+                waveform_store.save(content_hash, waveform)
+            if self.cache.enabled:
+                self.cache.put(content_hash, tier, features)
 
             logger.info(f"Audio analysis complete for: {file_path}")
             return {
                 'success': True,
                 'features': features,
-                'message': 'Analysis completed successfully'
+                'message': 'Analysis completed successfully',
+                'cached': False,
             }
         except Exception as e:
             logger.error(f"Error analyzing audio: {str(e)}")
             return {
                 'success': False,
                 'features': {},
-                'message': f'Analysis failed: {str(e)}'
+                'message': f'Analysis failed: {str(e)}',
+                'cached': False,
             }
 
+    def _extract_features_full(self, file_path: str) -> Dict:
+        if self._should_stream(file_path):
+            return self._extract_features_streaming(file_path)
+
+        # Decode once, straight to mono at the analysis rate
+        y, sr = librosa.load(file_path, sr=ANALYSIS_SAMPLE_RATE, mono=True)
+        features = self._extract_features(y, sr)
+        # Loudness needs the native rate and channels, metered block by block so the
+        # full-resolution signal is never held in memory
+        features.update(self.measure_loudness(file_path))
+        return features
+
+    def measure_loudness(self, file_path: str) -> Dict:
+        """Only integrated loudness and true peak, for backfilling songs analysed before they existed"""
+        try:
+            with sf.SoundFile(file_path) as audio:
+                meter = LoudnessMeter(audio.samplerate, audio.channels)
+                block_frames = max(1, int(settings.analysis_stream_block_seconds * audio.samplerate))
+                for block in audio.blocks(blocksize=block_frames, dtype="float32", always_2d=True):
+                    meter.add(block)
+        except sf.LibsndfileError:
+            y, native_sr = librosa.load(file_path, sr=None, mono=False)
+            meter = LoudnessMeter(native_sr, 1 if y.ndim == 1 else y.shape[0])
+            meter.add(y.T)
+        return meter.result()
+
+    def _extract_features(self, y: np.ndarray, sr: int) -> Dict:
+        """Compute every feature from one shared STFT and mel spectrogram"""
+        power = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)) ** 2
+        mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=sr))
+
+        #1. Tempo (BPM)
+        onset_envelope = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=HOP_LENGTH)
+        tempo = self._estimate_tempo(onset_envelope, sr)
+
+        # 2. key detection
+        # Tuning barely moves between frames, every other one is plenty and halves piptrack's memory
+        tuning = librosa.estimate_tuning(S=power[:, ::2], sr=sr, n_fft=N_FFT, bins_per_octave=12)
+        chroma = librosa.feature.chroma_stft(S=power, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH, tuning=tuning)
+
+        # 3. Energy
+        rms = self._frame_rms(power)
+
+        #4. Spectral features for genre/mood prediction
+        # Remaining features want magnitudes, reuse the power buffer
+        spectral_centroids = self._frame_centroids(np.sqrt(power, out=power), sr)
+        mfccs = librosa.feature.mfcc(S=mel_db, n_mfcc=13)
+
+        features = self._summarize_features(
+            tempo=tempo,
+            chroma=chroma,
+            energy=float(np.mean(rms)),
+            spectral_centroids=spectral_centroids,
+            mfccs=mfccs,
+            duration=float(len(y) / sr),
+            sr=sr,
+        )
+
+        # 9. Fingerprint for duplicate detection
+        fingerprint = FingerprintAccumulator()
+        fingerprint.add(chroma)
+        features['fingerprint'] = fingerprint.encode()
+
+        # 10. Waveform peaks for the player
+        peaks = PeakAccumulator(len(y))
+        peaks.add(y)
+        features['waveform'] = peaks.encode()
+        return features
+
+    def _extract_features_streaming(self, file_path: str) -> Dict:
+        """Same features as _extract_features, decoded and analysed block by block.
+
+        Only running sums and the onset envelope (a few KB per minute) outlive a
+        block, so peak memory depends on the block length, not the track length.
+        """
+        info = sf.info(file_path)
+        accumulator = StreamingFeatures(ANALYSIS_SAMPLE_RATE, fingerprint=True)
+        resampler = soxr.ResampleStream(info.samplerate, ANALYSIS_SAMPLE_RATE, 1, dtype="float32")
+        block_frames = max(1, int(settings.analysis_stream_block_seconds * info.samplerate))
+        peaks = PeakAccumulator(int(info.frames * ANALYSIS_SAMPLE_RATE / info.samplerate))
+        meter = LoudnessMeter(info.samplerate, info.channels)
+
+        # Analysis frames straddle block boundaries, carry the unconsumed tail over
+        pending = np.zeros(0, dtype=np.float32)
+        with sf.SoundFile(file_path) as audio:
+            while True:
+                block = audio.read(block_frames, dtype="float32", always_2d=True)
+                last = audio.tell() >= audio.frames or len(block) == 0
+                meter.add(block)
+                samples = resampler.resample_chunk(block.mean(axis=1), last=last)
+                peaks.add(samples)
+                pending = np.concatenate([pending, samples])
+
+                if len(pending) >= N_FFT:
+                    n_frames = 1 + (len(pending) - N_FFT) // HOP_LENGTH
+                    used = N_FFT + (n_frames - 1) * HOP_LENGTH
+                    accumulator.add(pending[:used])
+                    pending = pending[n_frames * HOP_LENGTH:]
+                if last:
+                    break
+
+        tempo = self._estimate_tempo(accumulator.onset_envelope(), ANALYSIS_SAMPLE_RATE)
+        features = self._summarize_features(
+            tempo=tempo,
+            chroma=accumulator.chroma_mean()[:, np.newaxis],
+            energy=accumulator.mean_rms(),
+            spectral_centroids=np.array([accumulator.mean_centroid()]),
+            mfccs=accumulator.mfcc_mean()[:, np.newaxis],
+            mfcc_std=accumulator.mfcc_std(),
+            duration=float(info.frames / info.samplerate),
+            sr=ANALYSIS_SAMPLE_RATE,
+        )
+        features.update(meter.result())
+        features['fingerprint'] = accumulator.fingerprint.encode()
+        features['waveform'] = peaks.encode()
+        return features
+
+    def _extract_features_excerpts(self, file_path: str) -> Dict:
+        """Features from EXCERPT_SECONDS-long excerpts spread over the track.
+
+        Only the excerpts are decoded (seeking where the format allows), so the
+        cost is the same for a 3 minute song and a 2 hour mix.
+        """
+        duration = self._probe_duration(file_path)
+        if duration is None or duration <= EXCERPT_SECONDS * len(EXCERPT_POSITIONS):
+            excerpts = [(0.0, None)]
+        else:
+            excerpts = [(duration * position - EXCERPT_SECONDS / 2, EXCERPT_SECONDS) for position in EXCERPT_POSITIONS]
+
+        accumulator = StreamingFeatures(ANALYSIS_SAMPLE_RATE)
+        decoded_seconds = 0.0
+        for start, length in excerpts:
+            y = self._read_excerpt(file_path, start, length)
+            if len(y) < N_FFT:
+                continue
+            accumulator.start_segment()
+            accumulator.add(y)
+            decoded_seconds += len(y) / ANALYSIS_SAMPLE_RATE
+
+        if accumulator.n_frames == 0:
+            raise ValueError("Audio is too short to analyse")
+
+        tempo = self._estimate_tempo(accumulator.onset_envelope(), ANALYSIS_SAMPLE_RATE)
+        return self._summarize_features(
+            tempo=tempo,
+            chroma=accumulator.chroma_mean()[:, np.newaxis],
+            energy=accumulator.mean_rms(),
+            spectral_centroids=np.array([accumulator.mean_centroid()]),
+            mfccs=accumulator.mfcc_mean()[:, np.newaxis],
+            mfcc_std=accumulator.mfcc_std(),
+            duration=float(duration if duration is not None else decoded_seconds),
+            sr=ANALYSIS_SAMPLE_RATE,
+        )
+
+    def _read_excerpt(self, file_path: str, start: float, length: Optional[float]) -> np.ndarray:
+        """Mono analysis-rate samples from start, to the end of the file if length is None"""
+        try:
+            with sf.SoundFile(file_path) as audio:
+                audio.seek(int(start * audio.samplerate))
+                frames = -1 if length is None else int(length * audio.samplerate)
+                block = audio.read(frames, dtype="float32", always_2d=True)
+                return soxr.resample(block.mean(axis=1), audio.samplerate, ANALYSIS_SAMPLE_RATE)
+        except sf.LibsndfileError:
+            # Formats libsndfile can't read go through librosa's fallback decoder
+            y, _ = librosa.load(file_path, sr=ANALYSIS_SAMPLE_RATE, mono=True, offset=start, duration=length)
+            return y
+
+    def _probe_duration(self, file_path: str) -> Optional[float]:
+        try:
+            return sf.info(file_path).duration
+        except sf.LibsndfileError:
+            return self.extract_metadata(file_path).get('duration') or None
+
+    def _should_stream(self, file_path: str) -> bool:
+        """Stream long tracks that libsndfile can decode incrementally"""
+        try:
+            return sf.info(file_path).duration >= settings.analysis_streaming_min_seconds
+        except Exception:
+            # Not a libsndfile format (m4a, aac...), only a full decode can read it
+            return False
+
+    def _summarize_features(self, tempo: float, chroma, energy: float, spectral_centroids,
+                            mfccs, duration: float, sr: int, mfcc_std: Optional[np.ndarray] = None) -> Dict:
+        """Turn frame-level statistics into the stored analysis fields.
+
+        mfcc_std is for callers that only pass per-track MFCC means.
+        """
+        features = {}
+        features["tempo"] = tempo
+
+        key = self._detect_key(chroma)
+        features['musical_key'] = key
+
+        features['energy'] = min(energy * 10, 1.0) # Normalise to 0-1
+
+        # 5. Genre prediction (simple rule-based)
+        genre = self._predict_genre(
+            tempo=features["tempo"],
+            energy=features["energy"],
+            spectral_centroids=spectral_centroids,
+            mfccs=mfccs,
+        )
+        features["genre"] = genre
+
+        # 6. Mood Prediction
+        mood = self._predict_mood(
+            energy=features["energy"],
+            tempo=features["tempo"],
+            key=key
+        )
+        features['mood'] = mood
+
+        # 7. Danceability
+        danceability = self._calculate_danceability(
+            tempo=features["tempo"],
+            energy=features["energy"],
+        )
+        features['danceability'] = danceability
+
+        # 8. Similarity embedding
+        features['embedding'] = self._embedding(
+            tempo=tempo,
+            chroma_mean=np.mean(chroma, axis=1),
+            energy=energy,
+            centroid_mean=float(np.mean(spectral_centroids)),
+            mfcc_mean=np.mean(mfccs, axis=1),
+            mfcc_std=np.std(mfccs, axis=1) if mfcc_std is None else mfcc_std,
+        ).tobytes()
+
+        # Additional metadata
+        features['duration'] = duration
+        features['sample_rate'] = int(sr)
+        return features
+
+    @staticmethod
+    def _embedding(tempo: float, chroma_mean: np.ndarray, energy: float, centroid_mean: float,
+                   mfcc_mean: np.ndarray, mfcc_std: np.ndarray) -> np.ndarray:
+        """Fixed-length float32 timbre/harmony/rhythm summary, EMBEDDING_DIM values.
+
+        Dimensions have different scales; the similarity index standardises them.
+        """
+        chroma_profile = chroma_mean / max(float(np.sum(chroma_mean)), 1e-9)
+        return np.concatenate([
+            mfcc_mean,
+            mfcc_std,
+            chroma_profile,
+            [np.log1p(centroid_mean), energy, tempo / 100.0],
+        ]).astype(np.float32)
+
+    @staticmethod
+    def _frame_rms(power: np.ndarray) -> np.ndarray:
+        """Frame RMS straight from the spectrum, matching time-domain librosa.feature.rms(y=...)
+
+        Parseval gives the mean square of the windowed frame, dividing by the
+        window's own mean square undoes the Hann taper.
+        """
+        edge_power = 0.5 * (power[0] + power[-1])
+        return np.sqrt(2 * (power[1:-1].sum(axis=0) + edge_power) / (N_FFT ** 2 * WINDOW_POWER))
+
+    @staticmethod
+    def _frame_centroids(magnitude: np.ndarray, sr: int) -> np.ndarray:
+        frequencies = librosa.fft_frequencies(sr=sr, n_fft=N_FFT).astype(magnitude.dtype)
+        frame_totals = magnitude.sum(axis=0)
+        return np.divide(
+            frequencies @ magnitude, frame_totals,
+            out=np.zeros_like(frame_totals), where=frame_totals > 0,
+        )
+
+    def _estimate_tempo(self, onset_envelope: np.ndarray, sr: int) -> float:
+        """Same estimate as librosa.beat.beat_track, but the autocorrelation tempogram
+        is averaged block by block instead of materialised for the whole track"""
+        if not onset_envelope.any():
+            return 0.0
+
+        win_length = librosa.time_to_frames(8.0, sr=sr, hop_length=HOP_LENGTH).item()
+        window = scipy.signal.get_window("hann", win_length, fftbins=True)[:, np.newaxis]
+        n_frames = onset_envelope.shape[-1]
+        padded = np.pad(onset_envelope, win_length // 2, mode="linear_ramp", end_values=0)
+        frames = librosa.util.frame(padded, frame_length=win_length, hop_length=1)[:, :n_frames]
+
+        tempogram_sum = np.zeros(win_length)
+        for start in range(0, n_frames, TEMPOGRAM_BLOCK_FRAMES):
+            block = frames[:, start:start + TEMPOGRAM_BLOCK_FRAMES] * window
+            autocorrelation = librosa.autocorrelate(block, axis=0)
+            tempogram_sum += librosa.util.normalize(autocorrelation, norm=np.inf, axis=0).sum(axis=1)
+
+        mean_tempogram = (tempogram_sum / n_frames)[:, np.newaxis]
+        tempo = librosa.feature.tempo(tg=mean_tempogram, sr=sr, hop_length=HOP_LENGTH, aggregate=None)
+        return float(tempo[0])
+
     def _detect_key(self, chroma) -> str:
         """SIMPLE KEY DETECTION BASED ON CHROMA FEATURES"""
         # Avg chroma across time
@@ -212,5 +498,75 @@ class AudioProcessingService:
             logger.error(f"Error extracting metadata: {str(e)}")
             return {}
 
+class StreamingFeatures:
+    """Running feature statistics over consecutive blocks of analysis-rate audio.
+
+    Each block must hold whole STFT frames (center=False) and start one hop
+    after the previous block's last frame.
+    """
+
+    def __init__(self, sr: int, fingerprint: bool = False):
+        self.sr = sr
+        self.n_frames = 0
+        self.tuning: Optional[float] = None
+        self.chroma_sum = np.zeros(12)
+        self.mfcc_sum = np.zeros(13)
+        self.mfcc_square_sum = np.zeros(13)
+        self.rms_sum = 0.0
+        self.centroid_sum = 0.0
+        self.onset_blocks: List[np.ndarray] = []
+        self.last_mel_frame: Optional[np.ndarray] = None
+        # Only meaningful over contiguous audio, so excerpts don't ask for it
+        self.fingerprint = FingerprintAccumulator() if fingerprint else None
+
+    def start_segment(self) -> None:
+        """The next block doesn't continue the previous one (e.g. a new excerpt)"""
+        self.last_mel_frame = None
+
+    def add(self, samples: np.ndarray) -> None:
+        power = np.abs(librosa.stft(samples, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)) ** 2
+        mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=self.sr))
+
+        # Onset strength needs the previous frame, which may sit in the previous block
+        previous = mel_db[:, :1] if self.last_mel_frame is None else self.last_mel_frame
+        flux = np.diff(np.concatenate([previous, mel_db], axis=1), axis=1)
+        self.onset_blocks.append(np.maximum(0.0, flux).mean(axis=0).astype(np.float32))
+        self.last_mel_frame = mel_db[:, -1:]
+
+        if self.tuning is None:
+            # Estimated once from the first block and kept, so chroma stays comparable across blocks
+            self.tuning = librosa.estimate_tuning(S=power, sr=self.sr, n_fft=N_FFT, bins_per_octave=12)
+        chroma = librosa.feature.chroma_stft(S=power, sr=self.sr, n_fft=N_FFT, tuning=self.tuning)
+        self.chroma_sum += chroma.sum(axis=1)
+        if self.fingerprint is not None:
+            self.fingerprint.add(chroma)
+        self.rms_sum += float(AudioProcessingService._frame_rms(power).sum())
+        mfccs = librosa.feature.mfcc(S=mel_db, n_mfcc=13)
+        self.mfcc_sum += mfccs.sum(axis=1)
+        self.mfcc_square_sum += (mfccs.astype(np.float64) ** 2).sum(axis=1)
+
+        magnitude = np.sqrt(power, out=power)
+        self.centroid_sum += float(AudioProcessingService._frame_centroids(magnitude, self.sr).sum())
+        self.n_frames += power.shape[1]
+
+    def onset_envelope(self) -> np.ndarray:
+        return np.concatenate(self.onset_blocks) if self.onset_blocks else np.zeros(0, dtype=np.float32)
+
+    def chroma_mean(self) -> np.ndarray:
+        return self.chroma_sum / max(1, self.n_frames)
+
+    def mfcc_mean(self) -> np.ndarray:
+        return self.mfcc_sum / max(1, self.n_frames)
+
+    def mfcc_std(self) -> np.ndarray:
+        mean = self.mfcc_mean()
+        return np.sqrt(np.maximum(self.mfcc_square_sum / max(1, self.n_frames) - mean ** 2, 0.0))
+
+    def mean_rms(self) -> float:
+        return self.rms_sum / max(1, self.n_frames)
+
+    def mean_centroid(self) -> float:
+        return self.centroid_sum / max(1, self.n_frames)
+
 # Global instance
 audio_service = AudioProcessingService()
\ No newline at end of file
@@ -0,0 +1,126 @@
+import fcntl
+import logging
+import os
+import uuid
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from sqlmodel import Session, select, func
+
+from app.backend.models.models import Song
+from app.backend.services.hot_track_cache import hot_track_cache
+from app.backend.services.transcoding import transcoder
+from app.backend.services.waveforms import waveform_store
+
+logger = logging.getLogger(__name__)
+
+
+class ContentAddressedAudioStore:
+    """Audio files stored once per distinct content, named by their sha256.
+
+    Layout: <root>/<first two hex chars>/<sha256><extension>. Songs share a blob by
+    pointing their file_path at it; the number of Song rows referencing a path is
+    its reference count, and the blob is deleted when that drops to zero.
+
+    Adding a song for a blob (commit or find, then the Song insert) and
+    releasing one both run under lock(content_hash), so a release can't count
+    zero references and delete a blob a new song is about to point at.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.incoming_dir = root / ".incoming"
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        self.locks_dir = root / ".locks"
+        self.locks_dir.mkdir(parents=True, exist_ok=True)
+
+    def temp_path(self, extension: str) -> Path:
+        """Where to write an upload before its hash is known (same filesystem as the store)"""
+        return self.incoming_dir / f"{uuid.uuid4()}{extension}"
+
+    def find(self, content_hash: str) -> Optional[Path]:
+        if not self._is_valid_hash(content_hash):
+            return None
+        shard = self.root / content_hash[:2]
+        if not shard.is_dir():
+            return None
+        return next(shard.glob(f"{content_hash}.*"), None)
+
+    @contextmanager
+    def lock(self, content_hash: str) -> Iterator[None]:
+        """Exclusive lock on a content hash, shared by every process using the store.
+
+        Not reentrant. Striped over the first two hex chars, so there are at
+        most 256 lock files and unrelated hashes rarely wait on each other.
+        """
+        with self._stripe_lock(content_hash[:2]):
+            yield
+
+    @contextmanager
+    def lock_many(self, content_hashes: Iterable[str]) -> Iterator[None]:
+        """lock() on several hashes at once, taken in a fixed order so two holders can't deadlock"""
+        with ExitStack() as stack:
+            for stripe in sorted({content_hash[:2] for content_hash in content_hashes}):
+                stack.enter_context(self._stripe_lock(stripe))
+            yield
+
+    @contextmanager
+    def _stripe_lock(self, stripe: str) -> Iterator[None]:
+        with open(self.locks_dir / f"{stripe}.lock", "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def commit(self, temp_path: Path, content_hash: str, extension: str) -> Path:
+        """Move a fully written temp file into the store, or drop it if the content already exists.
+
+        Call under lock(content_hash), held until the Song pointing at the result is committed.
+        """
+        existing = self.find(content_hash)
+        if existing is not None:
+            temp_path.unlink(missing_ok=True)
+            logger.info(f"Deduplicated upload against {existing}")
+            return existing
+
+        target = self.root / content_hash[:2] / f"{content_hash}{extension}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, target)
+        return target
+
+    def ref_count(self, db: Session, file_path: str) -> int:
+        stmt = select(func.count()).select_from(Song).where(Song.file_path == file_path)
+        return db.exec(stmt).one()
+
+    def release(self, db: Session, file_path: Optional[str]) -> bool:
+        """Delete a stored file once no Song references it. Returns True if it was removed"""
+        if not file_path:
+            return False
+        path = Path(file_path)
+        with self.lock(path.stem):
+            # Counted under the lock, a song being added for this blob is either committed or waits
+            if self.ref_count(db, file_path) > 0:
+                return False
+            return self._remove(path)
+
+    def _remove(self, path: Path) -> bool:
+        hot_track_cache.invalidate(path)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        if self._is_valid_hash(path.stem):
+            waveform_store.delete(path.stem)
+            transcoder.delete(path.stem)
+        logger.info(f"Removed unreferenced audio file {path}")
+        return True
+
+    @staticmethod
+    def _is_valid_hash(content_hash: str) -> bool:
+        return len(content_hash) == 64 and all(c in "0123456789abcdef" for c in content_hash)
+
+
+# Global instance
+audio_store = ContentAddressedAudioStore(Path("uploads/audio"))
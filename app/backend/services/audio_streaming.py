@@ -0,0 +1,331 @@
+import logging
+import os
+import re
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import List, Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.backend.services.hot_track_cache import HotTrackCache
+
+logger = logging.getLogger(__name__)
+
+# Single byte range spec, e.g. "0-1023", "1024-" or "-500" (suffix range)
+RANGE_SPEC_PATTERN = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+# More ranges than this in one request is treated as abuse and ignored
+MAX_RANGES = 16
+
+# Chunk sizes used when the server can't do zero-copy sends
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+# ASGI extensions that let the server push the file itself (sendfile)
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+PATHSEND_EXTENSION = "http.response.pathsend"
+
+ByteRange = Tuple[int, int]
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header can't be served for the given file size"""
+
+    def __init__(self, file_size: int):
+        super().__init__(f"Requested range not satisfiable (size {file_size})")
+        self.file_size = file_size
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[List[ByteRange]]:
+    """Parse a Range header into sorted, merged, inclusive (start, end) pairs.
+
+    Returns None when the header is missing, malformed or not in bytes - in all
+    of those cases the full file should be sent (RFC 7233).
+    """
+    if not range_header:
+        return None
+
+    units, _, range_set = range_header.partition("=")
+    if units.strip().lower() != "bytes" or not range_set:
+        return None
+
+    specs = range_set.split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = RANGE_SPEC_PATTERN.match(spec)
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+
+        if match.group(1) == "":
+            # Suffix range: the last N bytes of the file
+            suffix_length = int(match.group(2))
+            if suffix_length > 0 and file_size > 0:
+                ranges.append((max(0, file_size - suffix_length), file_size - 1))
+            continue
+
+        start = int(match.group(1))
+        if match.group(2) and int(match.group(2)) < start:
+            return None
+        if start < file_size:
+            end = int(match.group(2)) if match.group(2) else file_size - 1
+            ranges.append((start, min(end, file_size - 1)))
+
+    # Only unsatisfiable when none of the requested ranges overlap the file
+    if not ranges:
+        raise RangeNotSatisfiable(file_size)
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def file_validators(stat_result: os.stat_result) -> Tuple[str, str]:
+    """Build (ETag, Last-Modified) for a file from its size and mtime"""
+    etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    return etag, last_modified
+
+
+def _etag_matches(header_value: str, etag: str, weak: bool) -> bool:
+    if header_value.strip() == "*":
+        return True
+    for candidate in header_value.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header_value: str, stat_result: os.stat_result) -> bool:
+    try:
+        since = parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates only have second precision
+    return int(stat_result.st_mtime) <= since.timestamp()
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, stat_result: os.stat_result) -> bool:
+    """Whether a GET can be answered with 304 (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag, weak=True)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        return _not_modified_since(if_modified_since, stat_result)
+    return False
+
+
+def if_range_allows(request_headers: Mapping[str, str], etag: str, last_modified: str) -> bool:
+    """Whether the Range header should be honoured given an If-Range validator"""
+    if_range = request_headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # If-Range requires a strong comparison
+        return if_range == etag
+    return if_range == last_modified
+
+
+def adaptive_chunk_size(content_length: int) -> int:
+    """Pick a read size for the chunked fallback: bigger bodies get bigger chunks"""
+    chunk_size = min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, content_length // 16))
+    # Keep reads aligned to 64KB so they line up with the page cache
+    return chunk_size - (chunk_size % MIN_CHUNK_SIZE)
+
+
+class RangeFileResponse(Response):
+    """File response that serves a whole file, a single byte range or several
+    ranges as multipart/byteranges.
+
+    When the ASGI server supports the zerocopysend extension the body is handed
+    to the kernel with sendfile; pathsend is used for whole-file responses. With a
+    `buffer` (a memory-mapped copy of the file) ranges are sent as memoryview
+    slices. Other servers get the file in large, adaptive chunks read off the
+    event loop.
+    """
+
+    def __init__(
+            self,
+            path: Path,
+            stat_result: os.stat_result,
+            byte_ranges: Optional[List[ByteRange]] = None,
+            media_type: Optional[str] = None,
+            headers: Optional[dict] = None,
+            buffer: Optional[memoryview] = None,
+    ):
+        self.path = Path(path).resolve()
+        self.file_size = stat_result.st_size
+        self.buffer = buffer
+        self.media_type = media_type
+        self.background = None
+        self.ranges = byte_ranges or [(0, self.file_size - 1)]
+        self.status_code = 206 if byte_ranges else 200
+        self.part_headers: List[bytes] = []
+        self.boundary = None
+
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+
+        if byte_ranges and len(byte_ranges) > 1:
+            self.boundary = secrets.token_hex(12)
+            self.headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+            self.part_headers = [
+                (
+                    f"--{self.boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{self.file_size}\r\n\r\n"
+                ).encode("latin-1")
+                for start, end in byte_ranges
+            ]
+            self.closing = f"--{self.boundary}--\r\n".encode("latin-1")
+            content_length = (
+                    sum(end - start + 1 for start, end in byte_ranges)
+                    + sum(len(header) + 2 for header in self.part_headers)
+                    + len(self.closing)
+            )
+        elif byte_ranges:
+            start, end = byte_ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.file_size}"
+            content_length = end - start + 1
+        else:
+            content_length = self.file_size
+
+        self.content_length = content_length
+        self.headers["content-length"] = str(content_length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope["method"].upper() == "HEAD" or self.content_length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if ZEROCOPY_EXTENSION in extensions:
+            send_range = self._send_zerocopy
+        elif self.buffer is not None:
+            await self._send_ranges(send, self._send_buffer, None)
+            return
+        elif self.boundary is None and PATHSEND_EXTENSION in extensions and self.status_code == 200:
+            await send({"type": PATHSEND_EXTENSION, "path": str(self.path)})
+            return
+        else:
+            send_range = self._send_chunked
+
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await self._send_ranges(send, send_range, f)
+
+    async def _send_ranges(self, send: Send, send_range, f) -> None:
+        if self.boundary is None:
+            start, end = self.ranges[0]
+            await send_range(send, f, start, end - start + 1, more_body=False)
+            return
+
+        for header, (start, end) in zip(self.part_headers, self.ranges):
+            await send({"type": "http.response.body", "body": header, "more_body": True})
+            await send_range(send, f, start, end - start + 1, more_body=True)
+            await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        await send({"type": "http.response.body", "body": self.closing, "more_body": False})
+
+    async def _send_buffer(self, send: Send, f, offset: int, count: int, more_body: bool) -> None:
+        """Send slices of the mapped file, no copies on our side"""
+        end = offset + count
+        while offset < end:
+            chunk_end = min(offset + MAX_CHUNK_SIZE, end)
+            await send({
+                "type": "http.response.body",
+                "body": self.buffer[offset:chunk_end],
+                "more_body": more_body or chunk_end < end,
+            })
+            offset = chunk_end
+
+    async def _send_zerocopy(self, send: Send, f, offset: int, count: int, more_body: bool) -> None:
+        """Let the server sendfile() straight from our file descriptor"""
+        await send({
+            "type": ZEROCOPY_EXTENSION,
+            "file": f.wrapped,
+            "offset": offset,
+            "count": count,
+            "more_body": more_body,
+        })
+
+    async def _send_chunked(self, send: Send, f, offset: int, count: int, more_body: bool) -> None:
+        chunk_size = adaptive_chunk_size(count)
+        remaining = count
+
+        await f.seek(offset)
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                # File shrank underneath us, stop rather than hang the client
+                logger.warning(f"Short read while streaming {self.path}")
+                break
+            remaining -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body or remaining > 0})
+
+        if remaining > 0 and not more_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def build_file_response(
+        request_headers: Mapping[str, str],
+        path: Path,
+        media_type: str,
+        cache_control: str,
+        headers: Optional[dict] = None,
+        hot_cache: Optional[HotTrackCache] = None,
+) -> Response:
+    """Serve a file honouring conditional GET (ETag/Last-Modified) and Range requests.
+
+    Returns a 304 when the client's copy is still valid, a 416 when no requested
+    range overlaps the file, and otherwise a RangeFileResponse - backed by the
+    memory-mapped copy in `hot_cache` when the file is hot.
+    """
+    stat_result = path.stat()
+    etag, last_modified = file_validators(stat_result)
+    response_headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control,
+        **(headers or {}),
+    }
+
+    if is_not_modified(request_headers, etag, stat_result):
+        return Response(status_code=304, headers=response_headers)
+
+    byte_ranges = None
+    if if_range_allows(request_headers, etag, last_modified):
+        try:
+            byte_ranges = parse_range_header(request_headers.get("range"), stat_result.st_size)
+        except RangeNotSatisfiable as e:
+            return Response(
+                status_code=416,
+                headers={**response_headers, "Content-Range": f"bytes */{e.file_size}"},
+            )
+
+    buffer = hot_cache.get(path, stat_result) if hot_cache is not None else None
+    return RangeFileResponse(
+        path,
+        stat_result,
+        byte_ranges,
+        media_type=media_type,
+        headers=response_headers,
+        buffer=buffer,
+    )
@@ -0,0 +1,39 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from app.backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BlockingExecutor:
+    """Bounded thread pool for CPU-bound or blocking calls made from async routes.
+
+    Separate from the default executor so a burst of uploads can't starve the
+    threads anyio uses for sync endpoints, and vice versa.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blocking")
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global instance
+blocking_executor = BlockingExecutor(max_workers=settings.blocking_workers)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run func(*args, **kwargs) on the bounded blocking pool"""
+    return await blocking_executor.run(func, *args, **kwargs)
@@ -0,0 +1,61 @@
+import logging
+from typing import List, Optional, Sequence
+
+from sqlalchemy import update
+from sqlmodel import Session, select, delete
+
+from app.backend.models.models import AudioJob, LikedSongLink, PlaylistSongLink, Song
+from app.backend.services.audio_processing import TIER_FULL
+from app.backend.services.fingerprints import fingerprint_index
+
+logger = logging.getLogger(__name__)
+
+def duplicate_group(db: Session, song: Song) -> List[Song]:
+    """The song and its fingerprint duplicates that may be merged with it.
+
+    Merging deletes rows, so only songs with the same uploader are grouped (rows
+    without one, imports and YouTube songs, group among themselves). Another
+    user's copy of the recording is left to that user.
+    """
+    return [song] + [
+        duplicate for duplicate, _ in fingerprint_index.duplicates(db, song)
+        if duplicate.uploaded_by == song.uploaded_by
+    ]
+
+
+def choose_canonical(songs: Sequence[Song]) -> Song:
+    """The song a duplicate group is merged into: stored audio first, then a full analysis, then the oldest"""
+    return min(songs, key=lambda song: (song.file_path is None, song.analysis_tier != TIER_FULL, song.id))
+
+
+def merge_songs(db: Session, keep: Song, duplicates: Sequence[Song]) -> List[Optional[str]]:
+    """Move the playlist entries and likes of `duplicates` to `keep`, then delete them.
+
+    Commits. Returns the duplicates' file paths so the caller can release them
+    from the audio store.
+    """
+    file_paths = []
+    for duplicate in duplicates:
+        # A playlist (or user) already holding `keep` just loses the duplicate's entry
+        playlists = db.exec(select(PlaylistSongLink.playlist_id).where(PlaylistSongLink.song_id == keep.id)).all()
+        db.exec(delete(PlaylistSongLink).where(
+            PlaylistSongLink.song_id == duplicate.id, PlaylistSongLink.playlist_id.in_(playlists)
+        ))
+        db.execute(update(PlaylistSongLink).where(PlaylistSongLink.song_id == duplicate.id).values(song_id=keep.id))
+
+        users = db.exec(select(LikedSongLink.user_id).where(LikedSongLink.song_id == keep.id)).all()
+        db.exec(delete(LikedSongLink).where(LikedSongLink.song_id == duplicate.id, LikedSongLink.user_id.in_(users)))
+        db.execute(update(LikedSongLink).where(LikedSongLink.song_id == duplicate.id).values(song_id=keep.id))
+
+        db.exec(delete(AudioJob).where(AudioJob.song_id == duplicate.id))
+        fingerprint_index.remove_song(db, duplicate.id)
+        file_paths.append(duplicate.file_path)
+
+    # Links were moved with bulk statements, so delete the rows the same way
+    # rather than letting the ORM unlink relationships it has cached
+    duplicate_ids = [duplicate.id for duplicate in duplicates]
+    db.exec(delete(Song).where(Song.id.in_(duplicate_ids)))
+    db.commit()
+    db.refresh(keep)
+    logger.info(f"Merged duplicate songs {duplicate_ids} into {keep.id}")
+    return file_paths
@@ -0,0 +1,175 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import Session, select, func, delete
+
+from app.backend.config import settings
+from app.backend.models.models import FingerprintEntry, Song
+
+logger = logging.getLogger(__name__)
+
+# Chroma frames averaged into one fingerprint frame (48 x 256 / 22050 Hz = 0.56s), and the
+# hop between fingerprint frames (0.19s); the overlap makes codes tolerant of misalignment
+WINDOW_FRAMES = 48
+HOP_FRAMES = 16
+# Fingerprint frames are 12-bit codes, one bit per pitch class, stored as uint16
+CODE_BITS = 12
+# Index hashes join this many consecutive codes (24 bits), selective enough for lookups
+CODES_PER_HASH = 2
+# Lookups use at most this many of a track's hashes, evenly spread, to bound the query size
+MAX_QUERY_HASHES = 2000
+# Alignment search range for verification, in fingerprint frames (about +-60s)
+MAX_SHIFT = 320
+
+
+class FingerprintAccumulator:
+    """Chroma frames in, compact fingerprint out; fed in consecutive blocks so it streams.
+
+    Each code holds the sign of how the contrast between neighbouring pitch
+    classes changes from one averaged chroma frame to the next (Haitsma-Kalker
+    style on chroma instead of energy bands), which survives re-encoding,
+    resampling and gain changes.
+    """
+
+    def __init__(self):
+        self.pending = np.zeros((12, 0), dtype=np.float32)
+        self.frames: List[np.ndarray] = []
+
+    def add(self, chroma: np.ndarray) -> None:
+        pending = np.concatenate([self.pending, chroma.astype(np.float32)], axis=1)
+        if pending.shape[1] < WINDOW_FRAMES:
+            self.pending = pending
+            return
+        count = 1 + (pending.shape[1] - WINDOW_FRAMES) // HOP_FRAMES
+        # Window sums as differences of a running sum
+        cumulative = np.concatenate([np.zeros((12, 1)), np.cumsum(pending, axis=1, dtype=np.float64)], axis=1)
+        starts = np.arange(count) * HOP_FRAMES
+        sums = cumulative[:, starts + WINDOW_FRAMES] - cumulative[:, starts]
+        self.frames.append((sums / WINDOW_FRAMES).T.astype(np.float32))
+        self.pending = pending[:, count * HOP_FRAMES:]
+
+    def encode(self) -> bytes:
+        frames = np.concatenate(self.frames) if self.frames else np.zeros((0, 12), dtype=np.float32)
+        if len(frames) < 2:
+            return b""
+        contrast = frames - np.roll(frames, -1, axis=1)
+        bits = np.diff(contrast, axis=0) > 0
+        codes = (bits * (1 << np.arange(CODE_BITS))).sum(axis=1)
+        return codes.astype("<u2").tobytes()
+
+
+def unpack_codes(data: Optional[bytes]) -> np.ndarray:
+    if not data:
+        return np.zeros(0, dtype=np.uint16)
+    return np.frombuffer(data, dtype="<u2")
+
+
+def fingerprint_hashes(codes: np.ndarray) -> np.ndarray:
+    """Distinct index hashes of a fingerprint, skipping runs of silence (all-zero codes)"""
+    if len(codes) < CODES_PER_HASH:
+        return np.zeros(0, dtype=np.int64)
+    hashes = np.zeros(len(codes) - CODES_PER_HASH + 1, dtype=np.int64)
+    for i in range(CODES_PER_HASH):
+        hashes = (hashes << CODE_BITS) | codes[i:len(hashes) + i].astype(np.int64)
+    return np.unique(hashes[hashes != 0])
+
+
+def bit_error_rate(a: np.ndarray, b: np.ndarray, min_overlap: float = 0.8) -> float:
+    """Fraction of differing bits at the best alignment of two fingerprints.
+
+    Only alignments where the overlap covers `min_overlap` of the shorter
+    fingerprint count; 0.5 is what unrelated audio scores.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return 1.0
+    # Bits as +-1, so a correlation over all pitch classes counts agreements minus disagreements
+    sa = (((a[:, None] >> np.arange(CODE_BITS)) & 1) * 2.0 - 1.0)
+    sb = (((b[:, None] >> np.arange(CODE_BITS)) & 1) * 2.0 - 1.0)
+    size = 1 << int(np.ceil(np.log2(len(a) + len(b))))
+    correlation = np.fft.irfft(
+        (np.fft.rfft(sa, size, axis=0) * np.conj(np.fft.rfft(sb, size, axis=0))).sum(axis=1), size
+    )
+    # correlation[shift] compares a[i + shift] with b[i]; negative shifts wrap to the end
+    shifts = np.arange(-min(len(b) - 1, MAX_SHIFT), min(len(a) - 1, MAX_SHIFT) + 1)
+    overlap = np.minimum(len(a) - np.maximum(shifts, 0), len(b) + np.minimum(shifts, 0))
+    valid = overlap >= min_overlap * min(len(a), len(b))
+    if not valid.any():
+        return 1.0
+    agreement = correlation[shifts[valid] % size] / (overlap[valid] * CODE_BITS)
+    return float((1.0 - agreement.max()) / 2)
+
+
+class FingerprintIndex:
+    """Inverted index from fingerprint hash to songs, kept in the database.
+
+    Lookups only touch the index rows of the query's hashes, then the few
+    candidate songs sharing enough of them are verified by bit error rate.
+    """
+
+    def __init__(self, max_bit_error_rate: float, min_hits: int):
+        self.max_bit_error_rate = max_bit_error_rate
+        self.min_hits = min_hits
+
+    def index_song(self, db: Session, song_id: int, fingerprint: Optional[bytes]) -> None:
+        """Replace a song's index rows, the caller commits"""
+        self.index_songs(db, [(song_id, fingerprint)])
+
+    def index_songs(self, db: Session, songs: Sequence[Tuple[int, Optional[bytes]]]) -> None:
+        ids = [song_id for song_id, _ in songs]
+        if not ids:
+            return
+        db.exec(delete(FingerprintEntry).where(FingerprintEntry.song_id.in_(ids)))
+        rows = [
+            {"hash": int(h), "song_id": song_id}
+            for song_id, fingerprint in songs
+            for h in fingerprint_hashes(unpack_codes(fingerprint))
+        ]
+        if rows:
+            db.execute(insert(FingerprintEntry), rows)
+
+    def remove_song(self, db: Session, song_id: int) -> None:
+        db.exec(delete(FingerprintEntry).where(FingerprintEntry.song_id == song_id))
+
+    def duplicates(self, db: Session, song: Song, limit: int = 20) -> List[Tuple[Song, float]]:
+        """Other songs with the same recording as `song`, with their bit error rate, closest first"""
+        codes = unpack_codes(song.fingerprint)
+        hashes = fingerprint_hashes(codes)
+        if len(hashes) == 0:
+            return []
+        if len(hashes) > MAX_QUERY_HASHES:
+            hashes = hashes[np.linspace(0, len(hashes) - 1, MAX_QUERY_HASHES).astype(np.int64)]
+
+        hits = func.count().label("hits")
+        candidates = db.exec(
+            select(FingerprintEntry.song_id, hits)
+            .where(FingerprintEntry.hash.in_([int(h) for h in hashes]), FingerprintEntry.song_id != song.id)
+            .group_by(FingerprintEntry.song_id)
+            .having(hits >= self.min_hits)
+            .order_by(hits.desc())
+            .limit(limit)
+        ).all()
+        if not candidates:
+            return []
+
+        found = db.exec(select(Song).where(Song.id.in_([song_id for song_id, _ in candidates]))).all()
+        matches = []
+        for other in found:
+            error_rate = bit_error_rate(codes, unpack_codes(other.fingerprint))
+            if error_rate <= self.max_bit_error_rate:
+                matches.append((other, error_rate))
+        return sorted(matches, key=lambda match: match[1])
+
+    def stats(self, db: Session) -> Dict:
+        entries, songs = db.exec(
+            select(func.count(), func.count(func.distinct(FingerprintEntry.song_id)))
+        ).one()
+        return {"entries": entries, "songs": songs}
+
+
+# Global instance
+fingerprint_index = FingerprintIndex(
+    max_bit_error_rate=settings.fingerprint_max_bit_error_rate,
+    min_hits=settings.fingerprint_min_hits,
+)
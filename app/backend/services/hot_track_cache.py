@@ -0,0 +1,159 @@
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CachedTrack:
+    mapping: mmap.mmap
+    view: memoryview
+    size: int
+    mtime_ns: int
+
+
+class HotTrackCache:
+    """In-process LRU of memory-mapped audio files, bounded by total mapped bytes.
+
+    A file is only mapped once it has been requested `admit_after` times, so one-off
+    plays don't push popular tracks out. Entries are keyed by resolved path and
+    dropped as soon as the file's size or mtime changes.
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int, admit_after: int = 2):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.admit_after = admit_after
+
+        self._entries: "OrderedDict[str, _CachedTrack]" = OrderedDict()
+        self._candidates: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, path: Path, stat_result: os.stat_result) -> Optional[memoryview]:
+        """Return a read-only view over the whole file, or None if it isn't hot (yet)"""
+        if self.max_bytes <= 0:
+            return None
+
+        key = str(Path(path).resolve())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.size == stat_result.st_size and entry.mtime_ns == stat_result.st_mtime_ns:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    # Hand out a separate view so eviction can't release it mid-response
+                    return entry.view[:]
+                # File changed on disk - the mapping is stale
+                self._drop(key)
+                self.invalidations += 1
+
+            self.misses += 1
+            if not self._should_admit(key, stat_result.st_size):
+                return None
+
+            entry = self._map(key, stat_result)
+            if entry is None:
+                return None
+
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest_key = next(iter(self._entries))
+                self._drop(oldest_key)
+                self.evictions += 1
+            return entry.view[:]
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            key = str(Path(path).resolve())
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._candidates.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _should_admit(self, key: str, size: int) -> bool:
+        if size == 0 or size > self.max_file_bytes or size > self.max_bytes:
+            return False
+
+        seen = self._candidates.pop(key, 0) + 1
+        if seen >= self.admit_after:
+            return True
+
+        # Bounded memory of recently requested files that aren't mapped yet
+        self._candidates[key] = seen
+        while len(self._candidates) > 1024:
+            self._candidates.popitem(last=False)
+        return False
+
+    def _map(self, key: str, stat_result: os.stat_result) -> Optional[_CachedTrack]:
+        try:
+            with open(key, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not memory-map {key}: {e}")
+            return None
+
+        if len(mapping) != stat_result.st_size:
+            # Changed between stat() and mmap(), serve from disk this time
+            mapping.close()
+            return None
+
+        return _CachedTrack(
+            mapping=mapping,
+            view=memoryview(mapping),
+            size=stat_result.st_size,
+            mtime_ns=stat_result.st_mtime_ns,
+        )
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        # Responses still streaming from this mapping hold slices of the view,
+        # the mapping is unmapped once the last of them is released
+        try:
+            entry.view.release()
+            entry.mapping.close()
+        except BufferError:
+            pass
+
+
+# Global instance
+hot_track_cache = HotTrackCache(
+    max_bytes=settings.hot_track_cache_max_bytes,
+    max_file_bytes=settings.hot_track_cache_max_file_bytes,
+    admit_after=settings.hot_track_cache_admit_after,
+)
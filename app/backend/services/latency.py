@@ -0,0 +1,41 @@
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+import numpy as np
+
+# Recent samples kept per tracker, percentiles describe this window
+LATENCY_WINDOW = 1024
+
+
+class LatencyTracker:
+    """Percentiles over the most recent call durations, plus lifetime counters"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+            if error:
+                self.errors += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            samples = np.array(self.samples)
+            count, errors = self.count, self.errors
+        if len(samples) == 0:
+            return {"count": count, "errors": errors}
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000
+        return {
+            "count": count,
+            "errors": errors,
+            "p50_ms": round(float(p50), 2),
+            "p90_ms": round(float(p90), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(samples.max()) * 1000, 2),
+        }
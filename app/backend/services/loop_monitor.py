@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Measures how long the event loop is blocked and names the culprit.
+
+    A heartbeat coroutine records lag (how late a sleep wakes up). A watchdog
+    thread notices when the heartbeat stalls past the threshold *while* the loop
+    is still blocked, and logs the route of the task holding the loop plus the
+    stack it is stuck in.
+    """
+
+    def __init__(self, threshold_ms: int, interval_ms: int):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+
+        self._routes: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+        self._reported_beat: Optional[float] = None
+
+        # Stats
+        self.samples = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.last_stall_route: Optional[str] = None
+
+    def track(self, route: str) -> None:
+        """Remember which route the current task is serving"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._routes[task] = route
+
+    async def run(self) -> None:
+        """Heartbeat coroutine, started from the app lifespan"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                self._last_beat = time.monotonic()
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, time.monotonic() - self._last_beat - self.interval)
+                self._record(lag)
+        finally:
+            self._stop.set()
+
+    def stats(self) -> Dict:
+        return {
+            "samples": self.samples,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "last_stall_route": self.last_stall_route,
+            "threshold_ms": self.threshold * 1000,
+        }
+
+    def _record(self, lag: float) -> None:
+        self.samples += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            self.stalls += 1
+            if self._reported_beat != self._last_beat:
+                # Finished before the watchdog caught it, we only know the duration
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat - self.interval
+            if blocked_for <= self.threshold or self._reported_beat == beat:
+                continue
+            self._reported_beat = beat
+
+            task = asyncio.current_task(self._loop) if self._loop is not None else None
+            route = self._routes.get(task, "unknown") if task is not None else "no task"
+            self.last_stall_route = route
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame, limit=8)) if frame is not None else ""
+            logger.warning(
+                f"Event loop blocked for over {blocked_for * 1000:.0f} ms by {route}\n{stack}"
+            )
+
+
+class LoopLagMiddleware:
+    """ASGI middleware tagging each request task with its route for the lag monitor"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            loop_lag_monitor.track(f"{scope['method']} {scope['path']}")
+        await self.app(scope, receive, send)
+
+
+# Global instance
+loop_lag_monitor = LoopLagMonitor(
+    threshold_ms=settings.loop_lag_threshold_ms,
+    interval_ms=settings.loop_lag_interval_ms,
+)
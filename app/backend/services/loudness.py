@@ -0,0 +1,137 @@
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+import scipy.signal
+import soxr
+
+# ITU-R BS.1770-4 / EBU R128 gating
+BLOCK_SECONDS = 0.4
+STEP_SECONDS = 0.1
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# Samples filtered per pass, bounds the temporary copies for long inputs
+CHUNK_SECONDS = 10.0
+
+
+def k_weighting_sos(sample_rate: int) -> np.ndarray:
+    """BS.1770 K-weighting (high shelf + RLB high-pass) as second-order sections for any rate"""
+    # Stage 1: high shelf modelling the head
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+        1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0,
+    ]
+
+    # Stage 2: RLB high-pass
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, high_pass])
+
+
+class LoudnessMeter:
+    """Integrated loudness (LUFS) and true peak (dBTP) over consecutive blocks of
+    native-rate audio shaped (samples, channels).
+
+    Only per-100ms energies are kept (10 floats a second), so it streams.
+    Channels are weighted equally, i.e. mono/stereo material.
+    """
+
+    def __init__(self, sample_rate: int, channels: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sos = k_weighting_sos(sample_rate)
+        self.filter_state = np.zeros((self.sos.shape[0], 2, channels))
+        self.step_samples = int(round(STEP_SECONDS * sample_rate))
+        self.step_energies: List[float] = []
+        self.partial_energy = 0.0
+        self.partial_samples = 0
+
+        # True peak: the sample peak of a 4x oversampled signal (2x is enough from 96kHz)
+        self.oversampling = 2 if sample_rate >= 96000 else 4
+        self.upsampler = soxr.ResampleStream(sample_rate, sample_rate * self.oversampling, channels, dtype="float32")
+        self.peak = 0.0
+
+    def add(self, samples: np.ndarray) -> None:
+        chunk = max(1, int(CHUNK_SECONDS * self.sample_rate))
+        for start in range(0, len(samples), chunk):
+            self._add_chunk(np.ascontiguousarray(samples[start:start + chunk], dtype=np.float32))
+
+    def result(self) -> Dict[str, Optional[float]]:
+        upsampled = self.upsampler.resample_chunk(np.zeros((0, self.channels), dtype=np.float32), last=True)
+        if len(upsampled):
+            self.peak = max(self.peak, float(np.max(np.abs(upsampled))))
+
+        return {
+            'loudness_lufs': self.integrated_loudness(),
+            'true_peak_dbtp': 20 * math.log10(self.peak) if self.peak > 0 else None,
+        }
+
+    def integrated_loudness(self) -> Optional[float]:
+        steps_per_block = int(round(BLOCK_SECONDS / STEP_SECONDS))
+        energies = np.asarray(self.step_energies)
+        if len(energies) < steps_per_block:
+            return None
+
+        # Mean square of every 400ms block, overlapping by 75%
+        window_sums = np.convolve(energies, np.ones(steps_per_block), mode="valid")
+        block_power = window_sums / (steps_per_block * self.step_samples)
+        with np.errstate(divide="ignore"):
+            block_loudness = -0.691 + 10 * np.log10(block_power)
+
+        gated = block_power[block_loudness > ABSOLUTE_GATE_LUFS]
+        if len(gated) == 0:
+            return None
+        relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+        gated = block_power[(block_loudness > ABSOLUTE_GATE_LUFS) & (block_loudness > relative_gate)]
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+    def _add_chunk(self, samples: np.ndarray) -> None:
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+
+        upsampled = self.upsampler.resample_chunk(samples)
+        if len(upsampled):
+            self.peak = max(self.peak, float(np.max(np.abs(upsampled))))
+
+        weighted, self.filter_state = scipy.signal.sosfilt(self.sos, samples, axis=0, zi=self.filter_state)
+        energy = np.square(weighted, dtype=np.float64).sum(axis=1)
+
+        # Complete the 100ms step left open by the previous chunk, then whole steps, then carry the rest
+        position = 0
+        if self.partial_samples:
+            take = min(self.step_samples - self.partial_samples, len(energy))
+            self.partial_energy += float(energy[:take].sum())
+            self.partial_samples += take
+            position = take
+            if self.partial_samples < self.step_samples:
+                return
+            self.step_energies.append(self.partial_energy)
+            self.partial_energy, self.partial_samples = 0.0, 0
+
+        whole = (len(energy) - position) // self.step_samples
+        if whole:
+            steps = energy[position:position + whole * self.step_samples].reshape(whole, self.step_samples)
+            self.step_energies.extend(steps.sum(axis=1).tolist())
+            position += whole * self.step_samples
+
+        self.partial_energy = float(energy[position:].sum())
+        self.partial_samples = len(energy) - position
+
+
+def normalization_gain(loudness_lufs: Optional[float], true_peak_dbtp: Optional[float],
+                       target_lufs: float, peak_ceiling_dbtp: float) -> Optional[float]:
+    """Gain bringing a track to target_lufs, reduced so its true peak stays under the ceiling"""
+    if loudness_lufs is None:
+        return None
+    gain = target_lufs - loudness_lufs
+    if true_peak_dbtp is not None:
+        gain = min(gain, peak_ceiling_dbtp - true_peak_dbtp)
+    return round(gain, 2)
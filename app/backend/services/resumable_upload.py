@@ -0,0 +1,251 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from pydantic import BaseModel
+
+from app.backend.config import settings
+from app.backend.services.blocking import run_blocking
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = Path("uploads/staging")
+STAGING_DIR.mkdir(parents=True, exist_ok=True)
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+
+SESSION_FILE = "session.json"
+
+
+class UploadSessionError(Exception):
+    """Raised when a resumable upload request doesn't fit its session"""
+
+
+class UploadSession(BaseModel):
+    upload_id: str
+    user_id: int
+    filename: str
+    total_size: int
+    chunk_size: int
+    created_at: float
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+
+    @property
+    def total_chunks(self) -> int:
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def chunk_length(self, index: int) -> int:
+        """Expected size of a chunk, only the last one may be shorter"""
+        if index == self.total_chunks - 1:
+            return self.total_size - index * self.chunk_size
+        return self.chunk_size
+
+
+class ResumableUploadService:
+    """Resumable uploads: each chunk is staged as its own file so retries and
+    out-of-order chunks are safe, then stitched together on finalize.
+
+    Layout: STAGING_DIR/<upload_id>/session.json + <index>.chunk
+
+    Finalizing and garbage collection both hold the session's lock(), so a
+    second `complete` or a sweep can't remove files a finalize is reading.
+    """
+
+    def __init__(self, staging_dir: Path, ttl_seconds: int):
+        self.staging_dir = staging_dir
+        self.ttl_seconds = ttl_seconds
+        self.locks_dir = staging_dir / ".locks"
+        self.locks_dir.mkdir(parents=True, exist_ok=True)
+
+    def create_session(self, user_id: int, filename: str, total_size: int, chunk_size: Optional[int] = None,
+                       title: Optional[str] = None, artist: Optional[str] = None,
+                       album: Optional[str] = None) -> UploadSession:
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise UploadSessionError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes")
+
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            user_id=user_id,
+            filename=filename,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            created_at=time.time(),
+            title=title,
+            artist=artist,
+            album=album,
+        )
+        session_dir = self._session_dir(session.upload_id)
+        session_dir.mkdir(parents=True)
+        (session_dir / SESSION_FILE).write_text(session.model_dump_json(), encoding="utf-8")
+        return session
+
+    def get_session(self, upload_id: str) -> Optional[UploadSession]:
+        # upload ids are hex, never let them address anything outside staging
+        if not upload_id.isalnum():
+            return None
+        try:
+            raw = (self._session_dir(upload_id) / SESSION_FILE).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        return UploadSession(**json.loads(raw))
+
+    async def write_chunk(self, session: UploadSession, index: int, body: AsyncIterator[bytes]) -> None:
+        """Stage one chunk. Re-sending a chunk replaces it"""
+        if not 0 <= index < session.total_chunks:
+            raise UploadSessionError(f"Chunk index must be between 0 and {session.total_chunks - 1}")
+
+        expected = session.chunk_length(index)
+        session_dir = self._session_dir(session.upload_id)
+        temp_path = session_dir / f"{index}.{uuid.uuid4().hex}.tmp"
+        received = 0
+        try:
+            async with aiofiles.open(temp_path, "wb") as f:
+                async for data in body:
+                    received += len(data)
+                    if received > expected:
+                        raise UploadSessionError(f"Chunk {index} is larger than {expected} bytes")
+                    await f.write(data)
+            if received != expected:
+                raise UploadSessionError(f"Chunk {index} must be exactly {expected} bytes, got {received}")
+
+            # Atomic so a half-written retry never replaces a good chunk
+            await aiofiles.os.replace(temp_path, self._chunk_path(session.upload_id, index))
+            # Keep the session alive for the garbage collector
+            await run_blocking(os.utime, session_dir)
+        except FileNotFoundError:
+            # Finalized or swept while this chunk arrived
+            raise UploadSessionError("Upload session expired or already completed")
+        finally:
+            if await aiofiles.os.path.exists(temp_path):
+                await aiofiles.os.remove(temp_path)
+
+    def received_chunks(self, session: UploadSession) -> List[int]:
+        session_dir = self._session_dir(session.upload_id)
+        return sorted(
+            int(path.stem) for path in session_dir.glob("*.chunk") if path.stem.isdigit()
+        )
+
+    def received_offset(self, session: UploadSession) -> int:
+        """Bytes received contiguously from the start of the file"""
+        received = set(self.received_chunks(session))
+        index = 0
+        while index in received:
+            index += 1
+        return min(index * session.chunk_size, session.total_size)
+
+    def missing_chunks(self, session: UploadSession) -> List[int]:
+        received = set(self.received_chunks(session))
+        return [index for index in range(session.total_chunks) if index not in received]
+
+    async def finalize(self, session: UploadSession, destination: Path) -> Tuple[int, str]:
+        """Assemble all chunks into destination. Returns (size, sha256 hex digest)"""
+        return await run_blocking(self._finalize_sync, session, destination)
+
+    def discard(self, upload_id: str) -> None:
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    @contextmanager
+    def lock(self, upload_id: str, blocking: bool = True) -> Iterator[bool]:
+        """Exclusive lock on a session, shared by every process using the staging dir.
+
+        Striped over the first two hex chars like the audio store's locks. Yields
+        False instead of waiting when `blocking` is off and the lock is taken.
+        """
+        with open(self.locks_dir / f"{upload_id[:2]}.lock", "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def collect_garbage(self) -> int:
+        """Remove sessions that haven't received a chunk within the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for session_dir in self.staging_dir.iterdir():
+            if not session_dir.name.isalnum():
+                continue
+            # A session being finalized is skipped, the next sweep gets it if it is still there
+            with self.lock(session_dir.name, blocking=False) as locked:
+                try:
+                    if locked and session_dir.is_dir() and session_dir.stat().st_mtime < cutoff:
+                        shutil.rmtree(session_dir, ignore_errors=True)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        if removed:
+            logger.info(f"Removed {removed} expired upload sessions")
+        return removed
+
+    async def run_garbage_collector(self, interval_seconds: int = 3600) -> None:
+        """Periodic sweep, started from the app lifespan"""
+        while True:
+            try:
+                await run_blocking(self.collect_garbage)
+            except Exception as e:
+                logger.error(f"Upload staging cleanup failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def _finalize_sync(self, session: UploadSession, destination: Path) -> Tuple[int, str]:
+        with self.lock(session.upload_id):
+            # Checked under the lock, a concurrent finalize or sweep may have removed it
+            if not (self._session_dir(session.upload_id) / SESSION_FILE).exists():
+                raise UploadSessionError("Upload session expired or already completed")
+            if self.missing_chunks(session):
+                raise UploadSessionError("Upload is incomplete")
+
+            try:
+                size, content_hash = self._assemble(session, destination)
+            except FileNotFoundError:
+                raise UploadSessionError("Upload session expired or already completed")
+            self.discard(session.upload_id)
+        return size, content_hash
+
+    def _assemble(self, session: UploadSession, destination: Path) -> Tuple[int, str]:
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(destination, "wb") as out:
+                for index in range(session.total_chunks):
+                    with open(self._chunk_path(session.upload_id, index), "rb") as chunk:
+                        while data := chunk.read(1024 * 1024):
+                            hasher.update(data)
+                            out.write(data)
+                            size += len(data)
+        except BaseException:
+            destination.unlink(missing_ok=True)
+            raise
+        return size, hasher.hexdigest()
+
+    def _session_dir(self, upload_id: str) -> Path:
+        return self.staging_dir / upload_id
+
+    def _chunk_path(self, upload_id: str, index: int) -> Path:
+        return self._session_dir(upload_id) / f"{index}.chunk"
+
+
+# Global instance
+resumable_upload_service = ResumableUploadService(
+    staging_dir=STAGING_DIR,
+    ttl_seconds=settings.resumable_upload_ttl_seconds,
+)
@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.backend.config import settings
+from app.backend.db import engine
+from app.backend.models.models import Song
+from app.backend.services.audio_processing import EMBEDDING_DIM
+
+logger = logging.getLogger(__name__)
+
+# Spherical k-means iterations when building the approximate index
+KMEANS_ITERATIONS = 10
+# Rows per block when assigning vectors to clusters
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def unpack_embedding(data: Optional[bytes]) -> Optional[np.ndarray]:
+    """Stored bytes back to a float32 vector, None if missing or from another embedding version"""
+    if not data or len(data) != EMBEDDING_DIM * 4:
+        return None
+    return np.frombuffer(data, dtype=np.float32)
+
+
+class ClusteredIndex:
+    """Approximate search: vectors grouped by nearest k-means centroid, a query
+    only scores the rows of its `probes` closest clusters (IVF)"""
+
+    def __init__(self, vectors: np.ndarray, probes: int):
+        self.probes = probes
+        n_clusters = max(1, int(np.sqrt(len(vectors))))
+        self.centroids = self._train(vectors, n_clusters)
+
+        assignments = np.concatenate([
+            np.argmax(vectors[start:start + ASSIGN_BLOCK_ROWS] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS)
+        ])
+        # Rows sorted by cluster, cluster c owns order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_clusters))])
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        scores = self.centroids @ query
+        probes = min(self.probes, len(scores))
+        nearest = np.argpartition(-scores, probes - 1)[:probes]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in nearest])
+
+    @staticmethod
+    def _train(vectors: np.ndarray, n_clusters: int) -> np.ndarray:
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), size=min(len(vectors), n_clusters * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(n_clusters):
+                members = sample[labels == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-9)
+        return centroids
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """One build of the index; replaced as a whole, never modified"""
+    song_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    vectors: np.ndarray = field(default_factory=lambda: np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+    positions: Dict[int, int] = field(default_factory=dict)
+    mean: np.ndarray = field(default_factory=lambda: np.zeros(EMBEDDING_DIM, dtype=np.float32))
+    scale: np.ndarray = field(default_factory=lambda: np.ones(EMBEDDING_DIM, dtype=np.float32))
+    clusters: Optional[ClusteredIndex] = None
+
+
+class SimilarityIndex:
+    """In-memory matrix of every song embedding for top-k cosine search.
+
+    Embeddings are standardised per dimension (their scales differ wildly) and
+    L2-normalised, so a single matrix-vector product scores the catalogue.
+    The index is rebuilt from the database in the background once it is older
+    than the TTL; catalogues past `ann_min_songs` also get a ClusteredIndex.
+    """
+
+    def __init__(self, ttl_seconds: int, ann_min_songs: int, ann_probes: int):
+        self.ttl_seconds = ttl_seconds
+        self.ann_min_songs = ann_min_songs
+        self.ann_probes = ann_probes
+        self.lock = threading.Lock()
+        self.rebuilding = False
+        self.built_at = float("-inf")
+        self.build_ms = 0.0
+        self.snapshot = IndexSnapshot()
+
+    def ensure_fresh(self) -> None:
+        """Build on first use; afterwards refresh stale indexes without blocking searches"""
+        if time.monotonic() - self.built_at < self.ttl_seconds:
+            return
+        if self.built_at == float("-inf"):
+            with self.lock:
+                if self.built_at == float("-inf"):
+                    self.rebuild()
+            return
+        with self.lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def rebuild(self) -> None:
+        started = time.perf_counter()
+        with Session(engine) as db:
+            rows = db.exec(select(Song.id, Song.embedding).where(Song.embedding != None)).all()
+
+        ids, vectors = [], []
+        for song_id, data in rows:
+            vector = unpack_embedding(data)
+            if vector is not None:
+                ids.append(song_id)
+                vectors.append(vector)
+
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        mean = matrix.mean(axis=0) if len(matrix) else np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        scale = matrix.std(axis=0) if len(matrix) > 1 else np.ones(EMBEDDING_DIM, dtype=np.float32)
+        scale = np.where(scale > 1e-6, scale, 1.0).astype(np.float32)
+        matrix = self._normalize(matrix, mean, scale)
+        clusters = ClusteredIndex(matrix, self.ann_probes) if len(matrix) >= self.ann_min_songs else None
+
+        # Published with one assignment, so a concurrent search sees either the old or the new build
+        self.snapshot = IndexSnapshot(
+            song_ids=np.asarray(ids, dtype=np.int64),
+            vectors=matrix,
+            positions={song_id: position for position, song_id in enumerate(ids)},
+            mean=mean,
+            scale=scale,
+            clusters=clusters,
+        )
+        self.built_at = time.monotonic()
+        self.build_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Similarity index built: {len(ids)} songs in {self.build_ms:.0f}ms"
+                    f"{' (clustered)' if clusters else ''}")
+
+    def similar(self, song: Song, limit: int) -> List[Tuple[int, float]]:
+        """(song_id, cosine similarity) of the closest songs, best first, excluding the song itself"""
+        snapshot = self.snapshot
+        vectors, song_ids, clusters = snapshot.vectors, snapshot.song_ids, snapshot.clusters
+        position = snapshot.positions.get(song.id)
+        if position is not None:
+            query = vectors[position]
+        else:
+            # Analysed after the last build, project it with the current statistics
+            vector = unpack_embedding(song.embedding)
+            if vector is None:
+                return []
+            query = self._normalize(vector[np.newaxis, :], snapshot.mean, snapshot.scale)[0]
+
+        candidates = clusters.candidates(query) if clusters is not None else None
+        scores = vectors @ query if candidates is None else vectors[candidates] @ query
+
+        count = min(limit + 1, len(scores))
+        if count == 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+
+        results = [(int(song_ids[row]), float(scores[i])) for i, row in zip(top, rows) if song_ids[row] != song.id]
+        return results[:limit]
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            "songs": len(snapshot.song_ids),
+            "clustered": snapshot.clusters is not None,
+            "build_ms": round(self.build_ms, 1),
+            "age_seconds": round(time.monotonic() - self.built_at, 1) if snapshot.song_ids.size else None,
+        }
+
+    def _rebuild_in_background(self) -> None:
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Similarity index rebuild failed: {e}")
+        finally:
+            self.rebuilding = False
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        standardized = ((matrix - mean) / scale).astype(np.float32)
+        norms = np.linalg.norm(standardized, axis=1, keepdims=True)
+        return standardized / np.maximum(norms, 1e-9)
+
+
+# Global instance
+similarity_index = SimilarityIndex(
+    ttl_seconds=settings.similarity_index_ttl_seconds,
+    ann_min_songs=settings.similarity_ann_min_songs,
+    ann_probes=settings.similarity_ann_probes,
+)
@@ -0,0 +1,234 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from mutagen import File as MutagenFile
+
+from app.backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = Path("uploads/renditions")
+
+# Sources that keep every rung of the ladder; lossy sources skip rungs at or above their own bitrate
+LOSSLESS_EXTENSIONS = {".wav", ".flac"}
+
+
+@dataclass(frozen=True)
+class Rendition:
+    codec: str # 'opus', 'aac'
+    kbps: int
+    extension: str
+    media_type: str
+    encoder_args: Tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        return f"{self.codec}-{self.kbps}"
+
+
+def _opus(kbps: int) -> Rendition:
+    return Rendition("opus", kbps, ".opus", "audio/ogg",
+                     ("-c:a", "libopus", "-b:a", f"{kbps}k", "-vbr", "on", "-ar", "48000", "-f", "ogg"))
+
+
+def _aac(kbps: int) -> Rendition:
+    # faststart puts the index up front, so playback starts before the file is fully fetched
+    return Rendition("aac", kbps, ".m4a", "audio/mp4",
+                     ("-c:a", "aac", "-b:a", f"{kbps}k", "-movflags", "+faststart", "-f", "mp4"))
+
+
+# Bitrate ladder per codec, lowest first
+LADDER: Dict[str, List[Rendition]] = {
+    "opus": [_opus(48), _opus(96), _opus(160)],
+    "aac": [_aac(64), _aac(128), _aac(256)],
+}
+
+RENDITIONS = {rendition.name: rendition for rungs in LADDER.values() for rendition in rungs}
+
+# Ladder position of each quality level, 'original' streams the uploaded file
+QUALITIES = {"low": 0, "medium": 1, "high": 2}
+ORIGINAL = "original"
+
+# Segmented delivery: fMP4 HLS cut from the AAC renditions (every HLS player decodes AAC)
+HLS_CODEC = "aac"
+HLS_PLAYLIST = "index.m3u8"
+HLS_INIT_SEGMENT = "init.mp4"
+HLS_FILE_PATTERN = re.compile(r"^(index\.m3u8|init\.mp4|seg_\d{5}\.m4s)$")
+
+# Written once every rendition a source gets exists, renditions are only served after that
+LADDER_COMPLETE = ".complete"
+
+
+class Transcoder:
+    """Renditions of stored audio at several codecs and bitrates, made with ffmpeg.
+
+    Renditions are keyed by the audio's content hash, so songs sharing a file
+    share its renditions too. Layout: <root>/<first two hex chars>/<sha256>/<codec>-<kbps><ext>,
+    and the HLS segments of each AAC rendition in <...>/<sha256>/hls/<codec>-<kbps>/.
+    Renditions are only served once the whole ladder is done, so the bytes
+    behind a quality never change during playback.
+    """
+
+    def __init__(self, root: Path, ffmpeg_path: str, enabled: bool, timeout: int, segment_seconds: int):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ffmpeg = shutil.which(ffmpeg_path)
+        self.timeout = timeout
+        self.segment_seconds = segment_seconds
+        self.enabled = enabled and self.ffmpeg is not None
+        if enabled and self.ffmpeg is None:
+            logger.warning(f"ffmpeg not found at {ffmpeg_path!r}, audio is only streamed in its original format")
+
+    def directory(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / content_hash
+
+    def path(self, content_hash: str, rendition: Rendition) -> Path:
+        return self.directory(content_hash) / f"{rendition.name}{rendition.extension}"
+
+    def hls_dir(self, content_hash: str, rendition: Rendition) -> Path:
+        return self.directory(content_hash) / "hls" / rendition.name
+
+    def has_renditions(self, content_hash: str) -> bool:
+        return (self.directory(content_hash) / LADDER_COMPLETE).exists()
+
+    def transcode(self, source_path: str, content_hash: str) -> List[str]:
+        """Encode every rendition this source deserves that doesn't exist yet. Returns their names"""
+        source_kbps = self._lossy_kbps(source_path)
+        created = []
+        for rungs in LADDER.values():
+            for position, rendition in enumerate(rungs):
+                # Re-encoding a 128k MP3 at 256k only costs space; the lowest rung is always made
+                if position > 0 and source_kbps is not None and rendition.kbps >= source_kbps:
+                    continue
+                target = self.path(content_hash, rendition)
+                if target.exists():
+                    continue
+                self._encode(source_path, target, rendition)
+                created.append(rendition.name)
+
+        if self.segment_seconds:
+            for rendition in LADDER[HLS_CODEC]:
+                source = self.path(content_hash, rendition)
+                target = self.hls_dir(content_hash, rendition)
+                if source.exists() and not target.exists():
+                    self._segment(source, target)
+                    created.append(f"hls/{rendition.name}")
+
+        (self.directory(content_hash) / LADDER_COMPLETE).touch()
+        return created
+
+    def hls_variants(self, content_hash: str) -> List[Rendition]:
+        return [r for r in LADDER[HLS_CODEC] if (self.hls_dir(content_hash, r) / HLS_PLAYLIST).exists()]
+
+    def master_playlist(self, content_hash: str) -> Optional[str]:
+        """HLS multivariant playlist over the segmented renditions, None until there are any"""
+        variants = self.hls_variants(content_hash)
+        if not variants:
+            return None
+        lines = ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-INDEPENDENT-SEGMENTS"]
+        for rendition in variants:
+            # Peak bandwidth, with some headroom for the fMP4 framing
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={rendition.kbps * 1100},CODECS="mp4a.40.2"')
+            lines.append(f"{rendition.name}/{HLS_PLAYLIST}")
+        return "\n".join(lines) + "\n"
+
+    def hls_file(self, content_hash: str, rendition_name: str, file_name: str) -> Optional[Path]:
+        """A media playlist or segment, None for anything that isn't one"""
+        rendition = RENDITIONS.get(rendition_name)
+        if rendition is None or rendition.codec != HLS_CODEC or not HLS_FILE_PATTERN.match(file_name):
+            return None
+        path = self.hls_dir(content_hash, rendition) / file_name
+        return path if path.exists() else None
+
+    def select(self, content_hash: Optional[str], quality: Optional[str], accept: str) -> Optional[Tuple[Path, Rendition]]:
+        """Rendition for an explicit `quality`, or None if there is none to serve.
+
+        Opus goes to clients naming Ogg in Accept, AAC to everyone else. Rungs
+        skipped for a low-bitrate source fall back to the next lower one.
+        Nothing is served until the ladder is complete.
+        """
+        if not content_hash or quality is None or quality == ORIGINAL or not self.has_renditions(content_hash):
+            return None
+        accept = (accept or "").lower()
+        wants_opus = "audio/ogg" in accept or "codecs=opus" in accept
+
+        rungs = LADDER["opus" if wants_opus else "aac"]
+        for rendition in reversed(rungs[:QUALITIES[quality] + 1]):
+            path = self.path(content_hash, rendition)
+            if path.exists():
+                return path, rendition
+        return None
+
+    def delete(self, content_hash: str) -> None:
+        shutil.rmtree(self.directory(content_hash), ignore_errors=True)
+
+    def _encode(self, source_path: str, target: Path, rendition: Rendition) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.parent / f".{uuid.uuid4().hex}.tmp"
+        command = [
+            self.ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", source_path,
+            # Audio only: cover art in MP3/M4A files shows up as a video stream
+            "-map", "0:a:0", "-vn", "-map_metadata", "-1",
+            *rendition.encoder_args, str(temp),
+        ]
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=self.timeout)
+            os.replace(temp, target)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"ffmpeg failed for {rendition.name}: {e.stderr.decode(errors='replace').strip()}") from e
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def _segment(self, source: Path, target: Path) -> None:
+        """Cut a rendition into fixed-length fMP4 segments plus a VOD playlist (no re-encode)"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.parent / f".{uuid.uuid4().hex}.tmp"
+        temp.mkdir()
+        command = [
+            self.ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", str(source), "-map", "0:a:0", "-c", "copy",
+            "-f", "hls", "-hls_time", str(self.segment_seconds), "-hls_playlist_type", "vod",
+            "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", HLS_INIT_SEGMENT,
+            "-hls_segment_filename", str(temp / "seg_%05d.m4s"), str(temp / HLS_PLAYLIST),
+        ]
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=self.timeout)
+            # Playlist and segments appear together, a reader never sees a half-cut rendition
+            os.replace(temp, target)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"ffmpeg failed to segment {source.name}: {e.stderr.decode(errors='replace').strip()}") from e
+        except OSError:
+            # Another worker segmented the same audio first
+            if not target.exists():
+                raise
+        finally:
+            shutil.rmtree(temp, ignore_errors=True)
+
+    @staticmethod
+    def _lossy_kbps(source_path: str) -> Optional[int]:
+        if Path(source_path).suffix.lower() in LOSSLESS_EXTENSIONS:
+            return None
+        try:
+            audio = MutagenFile(source_path)
+            bitrate = getattr(audio.info, "bitrate", 0) if audio is not None else 0
+        except Exception:
+            return None
+        return bitrate // 1000 if bitrate else None
+
+
+# Global instance
+transcoder = Transcoder(
+    RENDITION_DIR,
+    ffmpeg_path=settings.ffmpeg_path,
+    enabled=settings.transcode_enabled,
+    timeout=settings.analysis_job_timeout_seconds,
+    segment_seconds=settings.hls_segment_seconds,
+)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    value: Any
+    stored_at: float
+    expires_at: float
+
+
+class AsyncTTLCache:
+    """Bounded LRU of coroutine results that expire after `ttl` seconds.
+
+    Concurrent misses on the same key share one call to the loader
+    (singleflight). An entry past its TTL but within `stale_ttl` more seconds is
+    still returned straight away while a single background call refreshes it
+    (stale-while-revalidate). Failed loads are never cached: the error goes to
+    everyone waiting on that load, and a failed refresh keeps the stale value.
+    Values are shared between callers, so they must not be mutated.
+
+    `ttl_of`, if given, computes each value's own lifetime in seconds (for
+    values that carry their expiry); `ttl` is then only the on/off switch.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float = 0.0,
+                 ttl_of: Optional[Callable[[Any], float]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.ttl_of = ttl_of
+
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._refreshes: Set[asyncio.Task] = set()
+
+        # Counters
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.evictions = 0
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return await loader()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if now < entry.expires_at + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self.refreshes += 1
+                    task = self._load(key, loader)
+                    # Keep a reference until it finishes, nobody awaits a refresh
+                    self._refreshes.add(task)
+                    task.add_done_callback(self._refreshes.discard)
+                    task.add_done_callback(self._log_refresh_error)
+                return entry.value
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._load(key, loader)
+        else:
+            self.coalesced += 1
+        # A caller that goes away mustn't cancel the load others are waiting on
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """The cached value if it is still fresh, without loading or counting a lookup"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None and time.monotonic() < entry.expires_at else None
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since the cached value was loaded, None if there is none"""
+        entry = self._entries.get(key)
+        return time.monotonic() - entry.stored_at if entry is not None else None
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.ensure_future(self._run(key, loader))
+        # Mark the error retrieved even when every waiter was cancelled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def _run(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        except BaseException:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        ttl = self.ttl_of(value) if self.ttl_of is not None else self.ttl
+        self._entries[key] = _Entry(value, now, now + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background cache refresh failed: {task.exception()}")
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Tuple
+
+import aiofiles
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Read uploads 1MB at a time so memory per upload stays flat
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload is larger than its size limit"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"Upload exceeds {max_size} bytes")
+        self.max_size = max_size
+
+
+async def save_upload_stream(
+        upload: UploadFile,
+        destination: Path,
+        max_size: int,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Tuple[int, str]:
+    """Copy an upload to disk chunk by chunk, enforcing max_size as it goes.
+
+    FastAPI has already spooled the multipart body by the time the handler runs,
+    so this only bounds the copy; RequestBodyLimitMiddleware is what stops an
+    oversized request early. Returns (size in bytes, sha256 hex digest). The
+    partial file is removed if the upload is too large or anything else goes wrong.
+    """
+    # Multipart parsing already knows the size, reject without copying
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLarge(max_size)
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(destination, "wb") as f:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                hasher.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+
+    return size, hasher.hexdigest()
+
+
+class RequestBodyLimitMiddleware:
+    """ASGI middleware answering 413 to request bodies over a per-path limit.
+
+    A declared Content-Length over the limit is refused before the body is read.
+    A body without one is counted as it arrives and cut off once it passes the
+    limit, so multipart parsing never spools more than that to disk.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            await self._reject(scope, receive, send, limit)
+            return
+
+        received = 0
+        rejected = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    if not response_started:
+                        await self._reject(scope, receive, send, limit)
+                    # The app sees a client that went away and stops parsing
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, limit: int) -> None:
+        response = JSONResponse({"detail": f"Request body too large (max {limit} bytes)"}, status_code=413)
+        await response(scope, receive, send)
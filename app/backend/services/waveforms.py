@@ -0,0 +1,135 @@
+import logging
+import os
+import struct
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WAVEFORM_DIR = Path("uploads/waveforms")
+
+# Points (min/max pairs) stored per track, smallest first; each level is 4x the previous
+WAVEFORM_LEVELS = (256, 1024, 4096)
+
+# File layout: magic, format version, level count, then per level a uint32 point
+# count, then each level's int8 min/max pairs interleaved (min0, max0, min1, ...)
+MAGIC = b"WFPK"
+FORMAT_VERSION = 1
+
+
+class PeakAccumulator:
+    """Min/max peaks at the finest level, fed with consecutive blocks of samples.
+
+    The expected total length fixes the bucket size up front so a track can be
+    streamed through block by block; samples past the estimate land in the
+    last bucket.
+    """
+
+    def __init__(self, expected_samples: int, points: int = WAVEFORM_LEVELS[-1]):
+        self.points = points
+        self.bucket_size = max(1, -(-expected_samples // points))
+        self.minimum = np.full(points, np.inf, dtype=np.float32)
+        self.maximum = np.full(points, -np.inf, dtype=np.float32)
+        self.position = 0
+
+    def add(self, samples: np.ndarray) -> None:
+        if len(samples) == 0:
+            return
+        first_bucket = self.position // self.bucket_size
+        # Offsets in this block where a new bucket starts
+        boundaries = np.arange(first_bucket + 1, self.points) * self.bucket_size - self.position
+        boundaries = boundaries[(boundaries > 0) & (boundaries < len(samples))]
+        starts = np.concatenate([[0], boundaries]).astype(np.int64)
+        buckets = np.minimum(first_bucket + np.arange(len(starts)), self.points - 1)
+
+        np.minimum.at(self.minimum, buckets, np.minimum.reduceat(samples, starts))
+        np.maximum.at(self.maximum, buckets, np.maximum.reduceat(samples, starts))
+        self.position += len(samples)
+
+    def encode(self) -> bytes:
+        """All levels in the on-disk format"""
+        # Buckets past the end of a short track stay silent
+        minimum = np.where(np.isfinite(self.minimum), self.minimum, 0.0)
+        maximum = np.where(np.isfinite(self.maximum), self.maximum, 0.0)
+
+        levels = []
+        for points in WAVEFORM_LEVELS:
+            group = self.points // points
+            level_min = minimum.reshape(points, group).min(axis=1)
+            level_max = maximum.reshape(points, group).max(axis=1)
+            levels.append(np.stack([_to_int8(level_min), _to_int8(level_max)], axis=1).ravel())
+
+        header = MAGIC + struct.pack("<BB", FORMAT_VERSION, len(levels))
+        header += b"".join(struct.pack("<I", len(level) // 2) for level in levels)
+        return header + b"".join(level.tobytes() for level in levels)
+
+
+def _to_int8(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(values * 127), -128, 127).astype(np.int8)
+
+
+def decode_levels(data: bytes) -> List[np.ndarray]:
+    """On-disk bytes to one (points, 2) int8 array per level"""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a waveform file")
+    version, count = struct.unpack_from("<BB", data, 4)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported waveform format {version}")
+    sizes = struct.unpack_from(f"<{count}I", data, 6)
+    offset = 6 + 4 * count
+    levels = []
+    for points in sizes:
+        levels.append(np.frombuffer(data, dtype=np.int8, count=points * 2, offset=offset).reshape(points, 2))
+        offset += points * 2
+    return levels
+
+
+class WaveformStore:
+    """Waveform peak files stored by audio content hash, next to the audio store"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / f"{content_hash}.peaks"
+
+    def exists(self, content_hash: str) -> bool:
+        return self.path(content_hash).exists()
+
+    def save(self, content_hash: str, data: bytes) -> None:
+        target = self.path(content_hash)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.parent / f".{uuid.uuid4().hex}.tmp"
+        temp.write_bytes(data)
+        os.replace(temp, target)
+
+    def delete(self, content_hash: str) -> None:
+        self.path(content_hash).unlink(missing_ok=True)
+
+    def peaks(self, content_hash: str, points: int) -> Optional[Tuple[np.ndarray, int]]:
+        """int8 min/max pairs at `points` resolution (capped at the finest level),
+        built from the smallest stored level that has enough points"""
+        try:
+            levels = decode_levels(self.path(content_hash).read_bytes())
+        except FileNotFoundError:
+            return None
+
+        level = next((lvl for lvl in levels if len(lvl) >= points), levels[-1])
+        if len(level) <= points:
+            return level, len(level)
+
+        # Merge neighbouring buckets down to exactly `points`
+        starts = np.linspace(0, len(level), points + 1).astype(np.int64)[:-1]
+        merged = np.stack([
+            np.minimum.reduceat(level[:, 0], starts),
+            np.maximum.reduceat(level[:, 1], starts),
+        ], axis=1)
+        return merged, points
+
+
+# Global instance
+waveform_store = WaveformStore(WAVEFORM_DIR)
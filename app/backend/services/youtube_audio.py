@@ -1,54 +1,296 @@
 import yt_dlp
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-import tempfile
-import os
-from typing import Optional, Dict
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import urlparse, parse_qs
 import logging
 
-from app.backend.services.youtube_service import YouTubeService
+from sqlalchemy import update, union
+from sqlmodel import Session, select
+
+from app.backend.config import settings
+from app.backend.db import engine
+from app.backend.models.models import LikedSongLink, PlaylistSongLink, Song
+from app.backend.services.blocking import run_blocking
+from app.backend.services.latency import LatencyTracker
+from app.backend.services.ttl_cache import AsyncTTLCache
 
 logger = logging.getLogger(__name__)
 
+YDL_OPTIONS = {
+    'format': 'bestaudio/best',
+    'noplaylist': True,
+    'extractaudio' : True,
+    'audioformat': 'mp3',
+    'quiet': True,
+    'no_warnings': True,
+    'socket_timeout': settings.youtube_extract_socket_timeout_seconds,
+}
+
+# Retry-After when there is no latency history yet
+DEFAULT_RETRY_AFTER_SECONDS = 5
+
+# One extractor per worker process, reused so its extractor instances and caches persist between calls
+_extractor: Optional[yt_dlp.YoutubeDL] = None
+
+
+def _init_extractor_process() -> None:
+    global _extractor
+    # Connections inherited through fork belong to the parent, never reuse them
+    engine.dispose(close=False)
+    _extractor = yt_dlp.YoutubeDL(YDL_OPTIONS)
+
+
+def extract_audio_url(youtube_id: str) -> Optional[str]:
+    """Direct URL of the best audio format (runs in an extractor process)"""
+    global _extractor
+    if _extractor is None:
+        _extractor = yt_dlp.YoutubeDL(YDL_OPTIONS)
+    try:
+        info = _extractor.extract_info(f"https://www.youtube.com/watch?v={youtube_id}", download=False)
+
+        # Get the best audio format
+        formats = info.get('formats', [])
+        audio_formats = [f for f in formats if f.get('acodec') != 'none']
+
+        if audio_formats:
+            # Sort by quality and get the best one
+            best_audio = max(audio_formats, key=lambda x: x.get('abr', 0) or 0)
+            return best_audio.get('url')
+        return None
+    except Exception as e:
+        logger.error(f"Failed to extract audio url for {youtube_id}: {e}")
+        return None
+
+
+def _timed_extract(youtube_id: str) -> Tuple[Optional[str], float]:
+    """extract_audio_url plus the seconds it took, queue wait excluded"""
+    started = time.perf_counter()
+    url = extract_audio_url(youtube_id)
+    return url, time.perf_counter() - started
+
+
+class ExtractionBusy(Exception):
+    """Every extractor process is busy and the queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"YouTube extraction queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def url_expiry(url: Optional[str]) -> Optional[float]:
+    """Unix time a googlevideo stream URL stops working, from its `expire` parameter"""
+    if not url:
+        return None
+    try:
+        return float(parse_qs(urlparse(url).query)["expire"][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class ResolvedUrl:
+    url: str
+    expires_at: float # unix time
+
+
 class YouTubeAudioService:
-    def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=3)
-
-    async def get_audio_url(self, youtube_id: str) -> Optional[str]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self.extract_audio_url,
-            youtube_id
+    """Resolves YouTube videos to direct audio stream URLs with yt_dlp.
+
+    Resolution takes seconds, and the URLs expire after a few hours, so they are
+    cached until shortly before their `expire` time. A background sweep
+    re-resolves URLs of tracks in playlists and liked songs before they expire,
+    and a client whose URL got a 403 asks for a forced refresh.
+
+    Extraction runs on a pool of worker processes, since it is CPU-heavy and
+    holds the GIL. At most `workers + max_queue` extractions are accepted at
+    once, beyond that callers get ExtractionBusy straight away.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = self._new_pool()
+        self.in_flight = 0
+        # Time in the worker, and what callers see (queue wait included)
+        self.extraction_latency = LatencyTracker()
+        self.request_latency = LatencyTracker()
+        self.margin = settings.youtube_audio_url_expiry_margin_seconds
+        self.cache = AsyncTTLCache(
+            settings.youtube_audio_url_cache_max_entries,
+            ttl=settings.youtube_audio_url_default_ttl_seconds,
+            ttl_of=lambda resolved: resolved.expires_at - time.time() - self.margin,
         )
 
-    def extract_audio_url(self, youtube_id: str) -> Optional[str]:
+        # Stats
+        self.extractions = 0
+        self.failures = 0
+        self.rejected = 0
+        self.forced_refreshes = 0
+        self.background_refreshes = 0
+
+    async def get_audio_url(self, youtube_id: str, refresh: bool = False) -> Optional[str]:
+        """A stream URL valid for at least the expiry margin, or None if the video can't be resolved.
+
+        `refresh` drops the cached URL first (the client was refused with it),
+        unless that URL was only just resolved. Raises ExtractionBusy when it
+        would have to extract and the queue is full.
+        """
+        if refresh:
+            age = self.cache.age(youtube_id)
+            if age is None or age >= settings.youtube_audio_url_min_refresh_seconds:
+                self.forced_refreshes += 1
+                self.cache.invalidate(youtube_id)
         try:
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'noplaylist': True,
-                'extractaudio' : True,
-                'audioformat': 'mp3',
-                'quiet': True,
-                'no_warnings': True,
-            }
-
-            url = f"https://www.youtube.com/watch?v={youtube_id}"
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-
-                # Get the best audio format
-                formats = info.get('formats', [])
-                audio_formats = [f for f in formats if f.get('acodec') != 'none']
-
-                if audio_formats:
-                    # Sort by quality and get the best one
-                    best_audio = max(audio_formats, key=lambda x: x.get('abr', 0) or 0)
-                    return best_audio.get('url')
+            resolved = await self.cache.get(youtube_id, lambda: self._resolve(youtube_id))
+        except LookupError:
             return None
+        return resolved.url
+
+    async def run_refresher(self, interval_seconds: int) -> None:
+        """Periodic sweep, started from the app lifespan"""
+        while True:
+            try:
+                await self.refresh_saved_urls(interval_seconds)
+            except Exception as e:
+                logger.error(f"YouTube audio URL refresh failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    async def refresh_saved_urls(self, window_seconds: int) -> int:
+        """Re-resolve stored URLs of playlist and liked tracks that expire within the next sweep.
+
+        Returns the number of videos refreshed, at most the configured batch size.
+        """
+        deadline = time.time() + window_seconds + self.margin
+        due = []
+        for youtube_id, url in await run_blocking(self._saved_tracks):
+            expires_at = url_expiry(url)
+            if expires_at is not None and expires_at > deadline:
+                continue
+            cached = self.cache.peek(youtube_id)
+            if cached is not None and cached.expires_at > deadline:
+                # Resolved on demand since, the row just hasn't caught up
+                await run_blocking(self._save_url, youtube_id, cached.url)
+                continue
+            due.append(youtube_id)
+
+        # Soonest expiry first, so a capped sweep handles the most urgent ones
+        due = due[:settings.youtube_audio_url_refresh_batch]
+        # One at a time, so the extraction threads stay free for users waiting on a play
+        refreshed = 0
+        for youtube_id in due:
+            if self.in_flight >= self.workers:
+                # Users are waiting on plays, the rest can wait for the next sweep
+                break
+            self.cache.invalidate(youtube_id)
+            try:
+                await self.get_audio_url(youtube_id)
+            except ExtractionBusy:
+                break
+            refreshed += 1
+        self.background_refreshes += refreshed
+        if refreshed:
+            logger.info(f"Refreshed {refreshed} YouTube audio URLs")
+        return refreshed
+
+    def stats(self) -> Dict:
+        return {
+            "extractions": self.extractions,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "forced_refreshes": self.forced_refreshes,
+            "background_refreshes": self.background_refreshes,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "queue_capacity": self.max_queue,
+            "extraction_latency": self.extraction_latency.stats(),
+            "request_latency": self.request_latency.stats(),
+            "cache": self.cache.stats(),
+        }
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely free: a full pool finishes one extraction per p50 / workers"""
+        p50_ms = self.extraction_latency.stats().get("p50_ms")
+        if p50_ms is None:
+            return DEFAULT_RETRY_AFTER_SECONDS
+        return max(1, math.ceil(p50_ms / 1000 / self.workers))
+
+    async def _extract(self, youtube_id: str) -> Optional[str]:
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise ExtractionBusy(self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        self.in_flight += 1
+        self.extractions += 1
+        started = time.perf_counter()
+        url = None
+        try:
+            url, seconds = await loop.run_in_executor(executor, _timed_extract, youtube_id)
+            self.extraction_latency.record(seconds, error=url is None)
+        except BrokenProcessPool:
+            # A worker process died, the first caller to notice replaces the pool
+            if executor is self.executor:
+                logger.error("YouTube extraction process pool broke, starting a new one")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_pool()
+        finally:
+            self.in_flight -= 1
+            self.request_latency.record(time.perf_counter() - started, error=url is None)
+        return url
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_extractor_process)
+
+    async def _resolve(self, youtube_id: str) -> ResolvedUrl:
+        url = await self._extract(youtube_id)
+        if not url:
+            # Raised rather than returned, so the cache doesn't keep the failure
+            self.failures += 1
+            raise LookupError(youtube_id)
+
+        expires_at = url_expiry(url) or time.time() + settings.youtube_audio_url_default_ttl_seconds
+        try:
+            await run_blocking(self._save_url, youtube_id, url)
         except Exception as e:
-            logger.error(f"Failed to extract audio url for {youtube_id}: {e}")
-            return None
+            logger.error(f"Failed to store audio url for {youtube_id}: {e}")
+        return ResolvedUrl(url, expires_at)
+
+    @staticmethod
+    def _saved_tracks() -> List[Tuple[str, Optional[str]]]:
+        """(youtube_id, stored URL) of YouTube songs in any playlist or liked songs, soonest expiry first"""
+        linked = union(select(PlaylistSongLink.song_id), select(LikedSongLink.song_id)).subquery()
+        with Session(engine) as db:
+            rows = db.exec(
+                select(Song.youtube_id, Song.youtube_audio_url)
+                .where(Song.youtube_id != None, Song.id.in_(select(linked.c.song_id)))
+                .distinct()
+            ).all()
+        return sorted(((row[0], row[1]) for row in rows), key=lambda row: url_expiry(row[1]) or 0)
+
+    @staticmethod
+    def _save_url(youtube_id: str, url: str) -> None:
+        with Session(engine) as db:
+            db.execute(
+                update(Song)
+                .where(Song.youtube_id == youtube_id, Song.youtube_audio_url.is_distinct_from(url))
+                .values(youtube_audio_url=url)
+            )
+            db.commit()
+
+
 # Global instance
-youtube_audio_service = YouTubeAudioService()
\ No newline at end of file
+youtube_audio_service = YouTubeAudioService(
+    workers=settings.youtube_extract_workers,
+    max_queue=settings.youtube_extract_queue_size,
+)
+
@@ -0,0 +1,483 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+import aiohttp
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.backend.config import settings
+from app.backend.services.audio_streaming import RangeNotSatisfiable, build_file_response, parse_range_header
+from app.backend.services.blocking import run_blocking
+from app.backend.services.hot_track_cache import hot_track_cache
+from app.backend.services.youtube_audio import youtube_audio_service
+
+logger = logging.getLogger(__name__)
+
+RELAY_DIR = Path("uploads/relay")
+# Video ids name cache directories, so nothing else gets through
+YOUTUBE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+DATA_FILE = "audio.bin"
+META_FILE = "meta.json"
+
+# Upstream statuses that mean the stream URL expired or is bound to another client
+URL_REFUSED_STATUSES = {403, 410}
+
+# Relayed bytes are the same for every listener of a video, but the set of videos is user-driven
+RELAY_CACHE_CONTROL = "public, max-age=86400"
+
+Resolver = Callable[..., Awaitable[Optional[str]]]
+
+
+class UpstreamError(Exception):
+    """The upstream stream couldn't be fetched"""
+
+
+@dataclass
+class _CachedAudio:
+    size: int
+    media_type: str
+    blocks: Set[int] = field(default_factory=set)
+
+
+class RelayCache:
+    """Bounded on-disk cache of relayed audio, in fixed-size blocks.
+
+    Each video gets <root>/<youtube_id>/ holding a sparse data file the size of
+    the stream and a metadata file listing which blocks are present. Blocks are
+    written into place as they are fetched, so once a track is complete it is a
+    plain file that can be served like a stored upload. Whole videos are evicted
+    least recently used first when the cached bytes exceed `max_bytes`, except
+    videos pinned by a response still being sent.
+    """
+
+    def __init__(self, root: Path, block_size: int, max_bytes: int):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[str, _CachedAudio]" = OrderedDict()
+        self._pins: "Counter[str]" = Counter()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+        # Counters
+        self.blocks_written = 0
+        self.evictions = 0
+        self._load()
+
+    def data_path(self, youtube_id: str) -> Path:
+        return self.root / youtube_id / DATA_FILE
+
+    def lookup(self, youtube_id: str) -> Optional[_CachedAudio]:
+        with self._lock:
+            entry = self._entries.get(youtube_id)
+            if entry is not None:
+                self._entries.move_to_end(youtube_id)
+            return entry
+
+    def pin(self, youtube_id: str) -> None:
+        """Keep the video from being evicted until unpin(), for a read in flight"""
+        with self._lock:
+            self._pins[youtube_id] += 1
+
+    def unpin(self, youtube_id: str) -> None:
+        with self._lock:
+            self._pins[youtube_id] -= 1
+            if self._pins[youtube_id] <= 0:
+                del self._pins[youtube_id]
+
+    def block_count(self, size: int) -> int:
+        return -(-size // self.block_size)
+
+    def is_complete(self, entry: _CachedAudio) -> bool:
+        return len(entry.blocks) == self.block_count(entry.size)
+
+    def create(self, youtube_id: str, size: int, media_type: str) -> _CachedAudio:
+        """Start caching a video, replacing what was cached if the stream changed"""
+        with self._lock:
+            entry = self._entries.get(youtube_id)
+            if entry is not None and entry.size == size:
+                return entry
+            if entry is not None:
+                self._drop(youtube_id)
+            directory = self.root / youtube_id
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(directory / DATA_FILE, "wb") as f:
+                # Sparse: disk is only used by the blocks actually written
+                f.truncate(size)
+            entry = _CachedAudio(size, media_type)
+            self._write_meta(youtube_id, entry)
+            self._entries[youtube_id] = entry
+            return entry
+
+    def read(self, youtube_id: str, offset: int, count: int) -> bytes:
+        with open(self.data_path(youtube_id), "rb") as f:
+            return os.pread(f.fileno(), count, offset)
+
+    def write_block(self, youtube_id: str, index: int, data: bytes) -> None:
+        with self._lock:
+            entry = self._entries.get(youtube_id)
+            if entry is None or index in entry.blocks:
+                return
+            with open(self.data_path(youtube_id), "r+b") as f:
+                os.pwrite(f.fileno(), data, index * self.block_size)
+            # Only listed once its bytes are in place
+            entry.blocks.add(index)
+            self._write_meta(youtube_id, entry)
+            self.total_bytes += len(data)
+            self.blocks_written += 1
+            self._evict(keep=youtube_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "videos": len(self._entries),
+                "complete": sum(self.is_complete(entry) for entry in self._entries.values()),
+                "pinned": len(self._pins),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "blocks_written": self.blocks_written,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self, keep: str) -> None:
+        # Over budget while everything is pinned: the next write tries again
+        while self.total_bytes > self.max_bytes:
+            oldest = next(
+                (youtube_id for youtube_id in self._entries if youtube_id != keep and youtube_id not in self._pins),
+                None,
+            )
+            if oldest is None:
+                return
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, youtube_id: str) -> None:
+        entry = self._entries.pop(youtube_id)
+        self.total_bytes -= self._cached_bytes(entry)
+        shutil.rmtree(self.root / youtube_id, ignore_errors=True)
+
+    def _cached_bytes(self, entry: _CachedAudio) -> int:
+        last = self.block_count(entry.size) - 1
+        return sum(
+            entry.size - last * self.block_size if index == last else self.block_size
+            for index in entry.blocks
+        )
+
+    def _write_meta(self, youtube_id: str, entry: _CachedAudio) -> None:
+        directory = self.root / youtube_id
+        temp = directory / f".{uuid.uuid4().hex}.tmp"
+        temp.write_text(json.dumps({
+            "size": entry.size,
+            "media_type": entry.media_type,
+            "block_size": self.block_size,
+            "blocks": sorted(entry.blocks),
+        }))
+        os.replace(temp, directory / META_FILE)
+
+    def _load(self) -> None:
+        """Pick up what earlier runs cached, least recently written first"""
+        found = []
+        for meta_path in self.root.glob(f"*/{META_FILE}"):
+            try:
+                meta = json.loads(meta_path.read_text())
+                if meta["block_size"] != self.block_size or not self.data_path(meta_path.parent.name).exists():
+                    raise ValueError("stale layout")
+                entry = _CachedAudio(meta["size"], meta["media_type"], set(meta["blocks"]))
+            except (OSError, ValueError, KeyError):
+                shutil.rmtree(meta_path.parent, ignore_errors=True)
+                continue
+            found.append((meta_path.stat().st_mtime, meta_path.parent.name, entry))
+        for _, youtube_id, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[youtube_id] = entry
+            self.total_bytes += self._cached_bytes(entry)
+        self._evict(keep="")
+
+
+class YouTubeRelay:
+    """Proxies YouTube audio through the backend with Range support.
+
+    Clients get a stable URL on our origin instead of an expiring, IP-bound
+    googlevideo URL. Bytes are fetched upstream in aligned blocks and kept in a
+    RelayCache; fully cached tracks are served from disk like any stored file.
+    A refused upstream URL is re-resolved once per fetch.
+    """
+
+    def __init__(self, cache: RelayCache, resolver: Resolver, fetch_blocks: int, read_timeout: float):
+        self.cache = cache
+        # (youtube_id, refresh=False) -> stream URL, swappable for a local stand-in
+        self.resolver = resolver
+        self.fetch_blocks = fetch_blocks
+        self.read_timeout = read_timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        # Counters
+        self.disk_bytes = 0
+        self.upstream_bytes = 0
+        self.upstream_requests = 0
+        self.url_refreshes = 0
+
+    async def start(self) -> None:
+        if self.session is not None and not self.session.closed:
+            return
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.youtube_http_pool_size, ttl_dns_cache=300),
+            # No total timeout, a long track legitimately takes a while; a stalled read doesn't
+            timeout=aiohttp.ClientTimeout(
+                total=None, connect=settings.youtube_http_connect_timeout_seconds, sock_read=self.read_timeout
+            ),
+        )
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def stats(self) -> Dict:
+        return {
+            "disk_bytes": self.disk_bytes,
+            "upstream_bytes": self.upstream_bytes,
+            "upstream_requests": self.upstream_requests,
+            "url_refreshes": self.url_refreshes,
+            "cache": self.cache.stats(),
+        }
+
+    async def response(self, youtube_id: str, request_headers: Mapping[str, str]) -> Response:
+        """Response for a relay request. Raises LookupError when the video can't be resolved.
+
+        The video stays pinned in the cache until the response has been sent, so
+        eviction can't remove the files it reads from.
+        """
+        if not YOUTUBE_ID_PATTERN.match(youtube_id):
+            raise LookupError(youtube_id)
+        self.cache.pin(youtube_id)
+        try:
+            response = await self._response(youtube_id, request_headers)
+        except BaseException:
+            self.cache.unpin(youtube_id)
+            raise
+        return _PinnedResponse(response, lambda: self.cache.unpin(youtube_id))
+
+    async def _response(self, youtube_id: str, request_headers: Mapping[str, str]) -> Response:
+        entry = self.cache.lookup(youtube_id)
+        if entry is None:
+            entry = await self._probe(youtube_id)
+
+        if self.cache.is_complete(entry):
+            # Served exactly like /stream: validators, ranges, sendfile, hot cache
+            return build_file_response(
+                request_headers,
+                self.cache.data_path(youtube_id),
+                media_type=entry.media_type,
+                cache_control=RELAY_CACHE_CONTROL,
+                headers={"X-Relay-Cache": "hit"},
+                hot_cache=hot_track_cache,
+            )
+
+        headers = {"Accept-Ranges": "bytes", "Cache-Control": RELAY_CACHE_CONTROL, "X-Relay-Cache": "partial"}
+        try:
+            byte_ranges = parse_range_header(request_headers.get("range"), entry.size)
+        except RangeNotSatisfiable as e:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{e.file_size}"})
+
+        # Multipart answers to multi-range requests only exist for complete tracks, the full body is valid too
+        if byte_ranges and len(byte_ranges) == 1:
+            start, end = byte_ranges[0]
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+        else:
+            start, end = 0, entry.size - 1
+            status_code = 200
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            self._stream(youtube_id, entry, start, end),
+            status_code=status_code,
+            media_type=entry.media_type,
+            headers=headers,
+        )
+
+    async def _probe(self, youtube_id: str) -> _CachedAudio:
+        """Fetch the first block to learn the stream's size and type, and cache it"""
+        block_size = self.cache.block_size
+        async with self._upstream(youtube_id, 0, block_size - 1) as response:
+            size = _total_size(response)
+            media_type = response.headers.get("Content-Type", "application/octet-stream").split(";")[0]
+            data = await _read_up_to(response.content, block_size)
+        self.upstream_bytes += len(data)
+        entry = await run_blocking(self.cache.create, youtube_id, size, media_type)
+        if len(data) == min(block_size, size):
+            await run_blocking(self.cache.write_block, youtube_id, 0, data)
+        return entry
+
+    async def _stream(self, youtube_id: str, entry: _CachedAudio, start: int, end: int) -> AsyncIterator[bytes]:
+        block_size = self.cache.block_size
+        first, last = start // block_size, end // block_size
+        for run_first, run_last, cached in self._runs(entry, first, last):
+            run_start = max(start, run_first * block_size)
+            run_end = min(end, (run_last + 1) * block_size - 1)
+            if cached:
+                offset = run_start
+                while offset <= run_end:
+                    count = min(block_size, run_end - offset + 1)
+                    data = await run_blocking(self.cache.read, youtube_id, offset, count)
+                    self.disk_bytes += len(data)
+                    offset += count
+                    yield data
+            else:
+                async for data in self._fetch_run(youtube_id, entry, run_first, run_last, run_start, run_end):
+                    yield data
+
+    def _runs(self, entry: _CachedAudio, first: int, last: int) -> List[Tuple[int, int, bool]]:
+        """Consecutive block runs as (first, last, cached), uncached runs capped at fetch_blocks"""
+        runs = []
+        for index in range(first, last + 1):
+            cached = index in entry.blocks
+            if runs and runs[-1][2] == cached and (cached or index - runs[-1][0] < self.fetch_blocks):
+                runs[-1] = (runs[-1][0], index, cached)
+            else:
+                runs.append((index, index, cached))
+        return runs
+
+    async def _fetch_run(self, youtube_id: str, entry: _CachedAudio, run_first: int, run_last: int,
+                         start: int, end: int) -> AsyncIterator[bytes]:
+        """Fetch whole blocks upstream, cache each as it completes and yield the requested part"""
+        block_size = self.cache.block_size
+        fetch_start = run_first * block_size
+        fetch_end = min(entry.size, (run_last + 1) * block_size) - 1
+        async with self._upstream(youtube_id, fetch_start, fetch_end) as response:
+            if _total_size(response) != entry.size:
+                raise UpstreamError(f"Stream of {youtube_id} changed size upstream")
+            # A server ignoring Range sends everything from byte 0
+            position = 0 if response.status == 200 else fetch_start
+            block_index = run_first
+            block = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                chunk_start = position
+                position += len(chunk)
+                self.upstream_bytes += len(chunk)
+                if position <= fetch_start:
+                    continue
+                chunk = chunk[max(0, fetch_start - chunk_start):fetch_end - chunk_start + 1]
+                chunk_start = max(chunk_start, fetch_start)
+
+                # The requested part of this chunk goes straight out
+                low, high = max(start, chunk_start), min(end, chunk_start + len(chunk) - 1)
+                if low <= high:
+                    yield chunk[low - chunk_start:high - chunk_start + 1]
+
+                block += chunk
+                while len(block) >= block_size:
+                    await run_blocking(self.cache.write_block, youtube_id, block_index, bytes(block[:block_size]))
+                    del block[:block_size]
+                    block_index += 1
+                if position > fetch_end:
+                    break
+
+            if min(position, fetch_end + 1) <= end:
+                # Headers promised more than upstream delivered, abort instead of hanging the client
+                raise UpstreamError(f"Upstream stream of {youtube_id} ended early at byte {position}")
+            if block and block_index * block_size + len(block) == entry.size:
+                # The short final block of the stream
+                await run_blocking(self.cache.write_block, youtube_id, block_index, bytes(block))
+
+    def _upstream(self, youtube_id: str, start: int, end: int) -> "_UpstreamRange":
+        return _UpstreamRange(self, youtube_id, start, end)
+
+    async def _open(self, youtube_id: str, start: int, end: int) -> aiohttp.ClientResponse:
+        await self.start()
+        for refresh in (False, True):
+            if refresh:
+                self.url_refreshes += 1
+            # Resolved URLs are cached by the resolver, asking again costs nothing
+            url = await self.resolver(youtube_id, refresh=refresh)
+            if url is None:
+                raise LookupError(youtube_id)
+
+            self.upstream_requests += 1
+            response = await self.session.get(url, headers={"Range": f"bytes={start}-{end}"})
+            if response.status in (200, 206):
+                return response
+            response.release()
+            if response.status not in URL_REFUSED_STATUSES:
+                break
+        raise UpstreamError(f"Upstream refused {youtube_id}: {response.status}")
+
+
+class _PinnedResponse(Response):
+    """Sends `response`, then unpins its video however sending ended"""
+
+    def __init__(self, response: Response, unpin: Callable[[], None]):
+        self.response = response
+        self.unpin = unpin
+        self.status_code = response.status_code
+        self.raw_headers = response.raw_headers
+        self.background = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.response(scope, receive, send)
+        finally:
+            self.unpin()
+        if self.background is not None:
+            await self.background()
+
+
+class _UpstreamRange:
+    """async with: an upstream response for a byte range, released afterwards"""
+
+    def __init__(self, relay: YouTubeRelay, youtube_id: str, start: int, end: int):
+        self.args = relay, youtube_id, start, end
+        self.response: Optional[aiohttp.ClientResponse] = None
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        relay, youtube_id, start, end = self.args
+        self.response = await relay._open(youtube_id, start, end)
+        return self.response
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.response.release()
+
+
+async def _read_up_to(content: aiohttp.StreamReader, count: int) -> bytes:
+    data = bytearray()
+    while len(data) < count:
+        chunk = await content.read(count - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def _total_size(response: aiohttp.ClientResponse) -> int:
+    if response.status == 206:
+        content_range = response.headers.get("Content-Range", "")
+        total = content_range.rpartition("/")[2]
+        if total.isdigit():
+            return int(total)
+        raise UpstreamError(f"Unusable Content-Range {content_range!r}")
+    if response.content_length is None:
+        raise UpstreamError("Upstream sent no length")
+    return response.content_length
+
+
+# Global instance
+youtube_relay = YouTubeRelay(
+    RelayCache(
+        RELAY_DIR,
+        block_size=settings.youtube_relay_block_bytes,
+        max_bytes=settings.youtube_relay_cache_max_bytes,
+    ),
+    resolver=youtube_audio_service.get_audio_url,
+    fetch_blocks=settings.youtube_relay_fetch_blocks,
+    read_timeout=settings.youtube_relay_read_timeout_seconds,
+)
@@ -1,9 +1,12 @@
 import aiohttp
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional, Tuple
 import logging
 import re
 
 from app.backend.config import settings
+from app.backend.services.latency import LatencyTracker
+from app.backend.services.ttl_cache import AsyncTTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -14,16 +17,106 @@ class YouTubeService:
             self.api_key = None
         else:
             self.api_key = settings.youtube_api_key
-            self.base_url = "https://www.googleapis.com/youtube/v3"
+        self.base_url = settings.youtube_api_base_url.rstrip("/")
+
+        # One pooled client for the application's lifetime, see start()/close()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.latency: Dict[str, LatencyTracker] = {}
+        self.connections_created = 0
+        self.connections_reused = 0
+
+        # Popular searches and trending charts are asked for by many users at once
+        self.search_cache = AsyncTTLCache(
+            settings.youtube_cache_max_entries,
+            ttl=settings.youtube_search_cache_ttl_seconds,
+            stale_ttl=settings.youtube_cache_stale_seconds,
+        )
+        self.trending_cache = AsyncTTLCache(
+            settings.youtube_cache_max_entries,
+            ttl=settings.youtube_trending_cache_ttl_seconds,
+            stale_ttl=settings.youtube_cache_stale_seconds,
+        )
 
     def _is_available(self) -> bool:
         return self.api_key is not None
 
+    async def start(self) -> None:
+        """Open the shared client (called from the app lifespan, or lazily on first use)"""
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=settings.youtube_http_pool_size,
+            limit_per_host=settings.youtube_http_pool_size,
+            keepalive_timeout=settings.youtube_http_keepalive_seconds,
+            ttl_dns_cache=settings.youtube_http_dns_ttl_seconds,
+        )
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._on_connection_created)
+        trace.on_connection_reuseconn.append(self._on_connection_reused)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self._timeout(),
+            trace_configs=[trace],
+        )
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def stats(self) -> Dict:
+        return {
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "endpoints": {endpoint: tracker.stats() for endpoint, tracker in self.latency.items()},
+            "search_cache": self.search_cache.stats(),
+            "trending_cache": self.trending_cache.stats(),
+        }
+
+    async def _get(self, endpoint: str, params: Dict, timeout: Optional[float] = None) -> Tuple[int, Optional[Dict], str]:
+        """GET an API endpoint on the shared client: (status, JSON body if 200, error text otherwise)"""
+        await self.start()
+        tracker = self.latency.setdefault(endpoint, LatencyTracker())
+        # Without an override the session's default timeout applies
+        options = {"timeout": self._timeout(timeout)} if timeout is not None else {}
+        started = time.perf_counter()
+        try:
+            async with self.session.get(f"{self.base_url}/{endpoint}", params=params, **options) as response:
+                if response.status == 200:
+                    result = response.status, await response.json(), ""
+                else:
+                    result = response.status, None, await response.text()
+        except BaseException:
+            tracker.record(time.perf_counter() - started, error=True)
+            raise
+        tracker.record(time.perf_counter() - started, error=result[0] != 200)
+        return result
+
+    @staticmethod
+    def _timeout(total: Optional[float] = None) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=total if total is not None else settings.youtube_http_timeout_seconds,
+            connect=settings.youtube_http_connect_timeout_seconds,
+        )
+
+    async def _on_connection_created(self, session, context, params) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, context, params) -> None:
+        self.connections_reused += 1
+
     async def search_music(self, query: str, max_results: int=20) -> List[Dict]:
         """Search for music videos on YouTube"""
         if not self._is_available():
             raise ValueError("YouTube API key not set/configured")
 
+        # Search is case and whitespace insensitive, so those variants share an entry
+        query = " ".join(query.lower().split())
+        return await self.search_cache.get(
+            ("search", query, max_results), lambda: self._search_music(query, max_results)
+        )
+
+    async def _search_music(self, query: str, max_results: int) -> List[Dict]:
         # Add "music" to query for better music results
         search_query = f"{query} music"
 
@@ -36,37 +129,46 @@ class YouTubeService:
             "key" : self.api_key,
             "order" : "relevance"
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url}/search", params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    video_ids = [item["id"]["videoId"] for item in data["items"]]
-                    return await self.get_video_details(video_ids)
-                else:
-                    error_text = await response.text()
-                    logger.error(f"YouTube search failed: {response.status} - {error_text}")
-                    raise Exception(f"YouTube search failed: {response.status}")
+        status, data, error_text = await self._get("search", params)
+        if status == 200:
+            video_ids = [item["id"]["videoId"] for item in data["items"]]
+            return await self._video_details(video_ids)
+        else:
+            logger.error(f"YouTube search failed: {status} - {error_text}")
+            raise Exception(f"YouTube search failed: {status}")
 
 
     async def get_video_details(self, video_ids: List[str]) -> List[Dict]:
+        try:
+            return await self._video_details(video_ids)
+        except Exception as e:
+            logger.error(str(e))
+            return []
+
+    async def _video_details(self, video_ids: List[str]) -> List[Dict]:
+        """Raises on failure, so a failed lookup is never cached as an empty result"""
         params = {
             "part" : "snippet,contentDetails,statistics",
             "id" : ",".join(video_ids),
             "key" : self.api_key,
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url}/videos", params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return self.format_videos(data["items"])
-                else:
-                    return []
+        status, data, error_text = await self._get("videos", params)
+        if status == 200:
+            return self.format_videos(data["items"])
+        else:
+            raise Exception(f"YouTube video details failed: {status} - {error_text}")
 
     async def get_trending_music(self, region_code: str = "US") -> List[Dict]:
         """GET TRENDING MUSIC VIDEOS"""
-        print(f"API KEY EXISTS: {bool(self.api_key)}")
-        print(f"API KEY FOUND: {len(self.api_key) if self.api_key else 0}")
+        region_code = region_code.strip().upper()
+        try:
+            return await self.trending_cache.get(("trending", region_code), lambda: self._trending_music(region_code))
+        except Exception as e:
+            logger.error(str(e))
+            return []
+
+    async def _trending_music(self, region_code: str) -> List[Dict]:
         params = {
             "part" : "snippet,contentDetails,statistics",
             "chart" : "mostPopular",
@@ -76,17 +178,11 @@ class YouTubeService:
             "key" : self.api_key,
         }
 
-        print(f"Request URL: {self.base_url}/videos")
-        print(f"Request params: {params}")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url}/videos", params=params) as response:
-                print(f"Response status: {response.status}")
-                if response.status == 200:
-                    data = await response.json()
-                    return self.format_videos(data["items"])
-                else:
-                    return []
+        status, data, error_text = await self._get("videos", params)
+        if status == 200:
+            return self.format_videos(data["items"])
+        else:
+            raise Exception(f"YouTube trending failed: {status} - {error_text}")
 
     def format_videos(self, videos: List[Dict]) -> List[Dict]:
         formatted_videos = []
@@ -1,6 +1,9 @@
 from typing import Optional, Dict
 from sqlmodel import Session, select
+from app.backend.config import settings
 from app.backend.models.models import Song, User
+from app.backend.services.loudness import normalization_gain
+from app.backend.services.youtube_audio import url_expiry
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,8 +27,8 @@ class YouTubeSongService:
             existing_song = db.exec(stmt).first()
 
             if existing_song:
-                # Update audio URL if provided and not already set
-                if audio_url and not existing_song.youtube_audio_url:
+                # Update audio URL if provided and it outlives the stored one
+                if audio_url and (url_expiry(audio_url) or 0) > (url_expiry(existing_song.youtube_audio_url) or 0):
                     existing_song.youtube_audio_url = audio_url
                     db.add(existing_song)
                     db.commit()
@@ -46,7 +49,12 @@ class YouTubeSongService:
                 channel_name = youtube_track.get('channel_name'),
                 duration = youtube_track.get('duration', 0),
                 source = "youtube",
-                uploaded_by = user.id
+                uploaded_by = user.id,
+                # Streams are never decoded here, assume YouTube's usual loudness for the player gain
+                replay_gain_db = normalization_gain(
+                    settings.youtube_assumed_lufs, None,
+                    settings.loudness_target_lufs, settings.loudness_peak_ceiling_dbtp,
+                ),
             )
 
             db.add(new_song)
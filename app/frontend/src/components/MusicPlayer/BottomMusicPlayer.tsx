@@ -44,10 +44,11 @@ export default function BottomMusicPlayer() {
         return false
     }
 
-    const fetchFreshAudioUrl = async (song: any): Promise<string | null> => {
+    // refresh: the current URL was refused, make the server resolve a new one instead of its cached copy
+    const fetchFreshAudioUrl = async (song: any, refresh: boolean = false): Promise<string | null> => {
         try {
             console.log('Fetching fresh YouTube audio URL for: ', song.youtube_id);
-            const response = await fetch(`http://localhost:8002/api/discover/youtube/audio/${song.youtube_id}`, {
+            const response = await fetch(`http://localhost:8002/api/discover/youtube/audio/${song.youtube_id}${refresh ? '?refresh=true' : ''}`, {
                 headers: {
                     'Authorization' : `Bearer ${localStorage.getItem('token')}`
                 }
@@ -199,7 +200,7 @@ export default function BottomMusicPlayer() {
                 console.log('Attempting to refresh expired YouTube URL...');
                 setRetryCount(prev => prev + 1);
 
-                const freshURL = await fetchFreshAudioUrl(currentSong);
+                const freshURL = await fetchFreshAudioUrl(currentSong, true);
                 if (freshURL) {
                     console.log('Got fresh URL, updating and retrying....')
                     updateCurrentSongAudioUrl?.(freshURL)
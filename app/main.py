@@ -1,13 +1,30 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from sqlmodel import Session
 
 from app.backend.config import settings
 
 from app.backend.routes.auth import router as auth_router
-from app.backend.routes import users, songs, playlists, discover, discover_test, liked_songs
-from app.backend.db import init_db
+from app.backend.routes import users, songs, uploads, playlists, discover, discover_test, liked_songs
+from app.backend.db import init_db, get_db
+from app.backend.models.models import User
+from app.backend.services.analysis_queue import analysis_worker, queue_stats
+from app.backend.services.artwork import artwork_service
+from app.backend.services.audio_processing import audio_service
+from app.backend.services.blocking import blocking_executor
+from app.backend.services.dependencies import get_current_user
+from app.backend.services.fingerprints import fingerprint_index
+from app.backend.services.hot_track_cache import hot_track_cache
+from app.backend.services.loop_monitor import loop_lag_monitor, LoopLagMiddleware
+from app.backend.services.resumable_upload import resumable_upload_service
+from app.backend.services.similarity import similarity_index
+from app.backend.services.upload_storage import RequestBodyLimitMiddleware
+from app.backend.services.youtube_audio import youtube_audio_service
+from app.backend.services.youtube_relay import youtube_relay
+from app.backend.services.youtube_service import youtube_service
 
 # Configure logging
 logging.basicConfig(
@@ -28,9 +45,37 @@ async def lifespan(app: FastAPI):
         logger.error(f"Database initialization failed: {e}")
         raise
 
+    # Shared HTTP client for the YouTube Data API
+    await youtube_service.start()
+
+    # Background maintenance
+    upload_gc_task = asyncio.create_task(resumable_upload_service.run_garbage_collector())
+    loop_monitor_task = asyncio.create_task(loop_lag_monitor.run())
+    analysis_task = None
+    if settings.analysis_worker_enabled:
+        # Every API process asks, only one per host gets to run jobs
+        analysis_task = asyncio.create_task(analysis_worker.run_exclusive())
+    url_refresh_task = None
+    if settings.youtube_audio_url_refresh_interval_seconds > 0:
+        url_refresh_task = asyncio.create_task(
+            youtube_audio_service.run_refresher(settings.youtube_audio_url_refresh_interval_seconds)
+        )
+
     yield
 
     # Shutdown
+    upload_gc_task.cancel()
+    loop_monitor_task.cancel()
+    if analysis_task:
+        analysis_task.cancel()
+    if url_refresh_task:
+        url_refresh_task.cancel()
+    await youtube_service.close()
+    await youtube_relay.close()
+    hot_track_cache.clear()
+    artwork_service.shutdown()
+    youtube_audio_service.shutdown()
+    blocking_executor.shutdown()
     logger.info("Application ended successfully")
 
 app = FastAPI(
@@ -38,6 +83,9 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Oversized uploads are refused before FastAPI spools them to disk (added before CORS so the 413 carries its headers)
+app.add_middleware(RequestBodyLimitMiddleware, limits={"/api/songs/upload": songs.MAX_UPLOAD_BODY_SIZE})
+
 # SETUP CORS
 origins = [
     "http://localhost:3000",
@@ -56,9 +104,13 @@ app.add_middleware(
     allow_headers=["*"],        # "Content-Type", "Authorization"
 )
 
+# Tags request tasks so event loop stalls can be traced back to a route
+app.add_middleware(LoopLagMiddleware)
+
 # Register Modules
 app.include_router(auth_router)
 app.include_router(users.router)
+app.include_router(uploads.router)
 app.include_router(songs.router)
 app.include_router(playlists.router)
 app.include_router(liked_songs.router)
@@ -78,4 +130,22 @@ def health_check():
         "environment":settings.environment,
         "youtube_api_key_exists": bool(settings.youtube_api_key),
         "debug_mode": settings.debug,
-    }
\ No newline at end of file
+    }
+
+# Internal cache, queue and event loop stats: off unless enabled, and never anonymous
+def metrics(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    analysis_queue = queue_stats(db)
+    return {
+        "hot_track_cache": hot_track_cache.stats(),
+        "event_loop": loop_lag_monitor.stats(),
+        "analysis_queue": {**analysis_queue, "worker": analysis_worker.stats()},
+        "similarity_index": similarity_index.stats(),
+        "analysis_cache": audio_service.cache.stats(db),
+        "fingerprint_index": fingerprint_index.stats(db),
+        "youtube_api": youtube_service.stats(),
+        "youtube_audio": youtube_audio_service.stats(),
+        "youtube_relay": youtube_relay.stats(),
+    }
+
+if settings.debug_metrics_enabled:
+    app.get("/debug/metrics")(metrics)